@@ -0,0 +1,151 @@
+import os
+import time
+
+import pygame
+
+
+class AssetCache:
+    """Общий для всего процесса кэш изображений.
+
+    Ключ записи - путь к файлу и режим преобразования:
+    "alpha" - convert_alpha(), "opaque" - convert(), "raw" - без преобразования.
+    Каждая запись помечается областью (scope), в которой её запросили,
+    например "level1". При выгрузке уровня release(scope) освобождает всё,
+    что больше не нужно ни одной другой области.
+
+    Статистика hits/misses считает каждый запрос один раз; печатает ее
+    benchmark() этого модуля.
+    """
+
+    def __init__(self):
+        self._surfaces = {}
+        self._owners = {}
+        self.current_scope = "global"
+        self.hits = 0
+        self.misses = 0
+
+    def set_scope(self, scope):
+        """Задает область, к которой привязываются следующие загрузки"""
+        self.current_scope = scope
+
+    def _find(self, key, scope):
+        owners = self._owners.get(key)
+        if owners is None:
+            return None
+        owners.add(scope or self.current_scope)
+        return self._surfaces[key]
+
+    def _lookup(self, key, scope):
+        """Поиск записи по запросу пользователя кэша - с учетом в статистике"""
+        surface = self._find(key, scope)
+        if surface is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return surface
+
+    def _store(self, key, surface, scope):
+        self._surfaces[key] = surface
+        self._owners[key] = {scope or self.current_scope}
+        return surface
+
+    def _load_file(self, path, mode):
+        surface = pygame.image.load(path)
+        if mode == "alpha":
+            surface = surface.convert_alpha()
+        elif mode == "opaque":
+            surface = surface.convert()
+        return surface
+
+    def _load_source(self, path, mode, scope):
+        """Исходное изображение для масштабирования: часть чужого запроса,
+        в статистике не учитывается"""
+        key = (path, mode)
+        surface = self._find(key, scope)
+        if surface is None:
+            surface = self._store(key, self._load_file(path, mode), scope)
+        return surface
+
+    def load_image(self, path, mode="alpha", scope=None):
+        """Загружает изображение один раз на процесс"""
+        key = (path, mode)
+        surface = self._lookup(key, scope)
+        if surface is not None:
+            return surface
+        return self._store(key, self._load_file(path, mode), scope)
+
+    def load_scaled(self, path, size, mode="alpha", scope=None):
+        """Загружает изображение, уже масштабированное до size"""
+        size = (int(size[0]), int(size[1]))
+        key = (path, mode, size)
+        surface = self._lookup(key, scope)
+        if surface is not None:
+            return surface
+
+        source = self._load_source(path, mode, scope)
+        return self._store(key, pygame.transform.scale(source, size), scope)
+
+    def load_scaled_to_height(self, path, height, mode="alpha", scope=None):
+        """Масштабирует изображение до высоты height с сохранением пропорций"""
+        source = self._load_source(path, mode, scope)
+        width = int(height * source.get_width() / source.get_height())
+        return self.load_scaled(path, (width, height), mode, scope)
+
+    def get_or_build(self, key, builder, scope=None):
+        """Возвращает производную поверхность, строя её при первом запросе"""
+        surface = self._lookup(key, scope)
+        if surface is not None:
+            return surface
+        return self._store(key, builder(), scope)
+
+    def release(self, scope):
+        """Освобождает записи области scope, не используемые другими областями"""
+        released = 0
+        for key in list(self._owners):
+            owners = self._owners[key]
+            owners.discard(scope)
+            if not owners:
+                del self._owners[key]
+                del self._surfaces[key]
+                released += 1
+        if self.current_scope == scope:
+            self.current_scope = "global"
+        return released
+
+    def clear(self):
+        """Полностью очищает кэш"""
+        self._surfaces.clear()
+        self._owners.clear()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+
+ASSET_CACHE = AssetCache()
+
+
+def benchmark(directory=os.path.join("assets", "items")):
+    """Загружает изображения каталога дважды и печатает статистику кэша"""
+    from headless import init_headless
+
+    init_headless()
+    pygame.display.set_mode((1, 1))
+    cache = AssetCache()
+    paths = [os.path.join(root, name)
+             for root, _, names in os.walk(directory)
+             for name in sorted(names) if name.endswith(".png")]
+
+    for title in ("первая загрузка", "повторная загрузка"):
+        start = time.perf_counter()
+        for path in paths:
+            cache.load_scaled(path, (64, 64), scope="benchmark")
+        elapsed = time.perf_counter() - start
+        print(f"{title}: {len(paths)} изображений за {elapsed * 1000:.2f} мс "
+              f"(попаданий {cache.hits}, промахов {cache.misses})")
+
+    released = cache.release("benchmark")
+    print(f"Освобождено {released} записей, осталось {len(cache)}")
+
+
+if __name__ == "__main__":
+    benchmark()
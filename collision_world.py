@@ -0,0 +1,59 @@
+import pygame
+
+from spatial_grid import SpatialGrid
+
+COLLISION_CELL_SIZE = 128
+
+
+class CollisionWorld:
+    """Платформы и предметы уровня в пространственных хэшах.
+
+    Неподвижные платформы раскладываются по ячейкам один раз, подвижные
+    переносятся между ячейками только при смене ячейки (update_moving).
+    Запросы возвращают объекты, пересекающие прямоугольник, в порядке
+    добавления - так же, как при прежнем линейном обходе списков.
+    """
+
+    def __init__(self, world_width, world_height, cell_size=COLLISION_CELL_SIZE):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.cell_size = cell_size
+        self.platforms = SpatialGrid(world_width, world_height, cell_size)
+        self.moving_platforms = []
+        self.items = {}
+
+    def add_platforms(self, platforms):
+        for platform in platforms:
+            self.platforms.insert(platform)
+
+    def add_moving_platforms(self, platforms):
+        for platform in platforms:
+            self.platforms.insert(platform)
+            self.moving_platforms.append(platform)
+
+    def add_items(self, kind, items):
+        """Добавляет собираемые предметы одного вида (ключи, зелья)"""
+        grid = self.items.get(kind)
+        if grid is None:
+            grid = SpatialGrid(self.world_width, self.world_height, self.cell_size)
+            self.items[kind] = grid
+        for item in items:
+            grid.insert(item)
+
+    def update_moving(self):
+        """Переносит сдвинувшиеся подвижные платформы в новые ячейки"""
+        for platform in self.moving_platforms:
+            self.platforms.move(platform)
+
+    def platforms_in(self, rect):
+        """Платформы, пересекающие rect"""
+        rect = pygame.Rect(rect)
+        return [platform for platform in self.platforms.query(rect) if rect.colliderect(platform.rect)]
+
+    def items_in(self, kind, rect):
+        """Предметы вида kind, пересекающие rect"""
+        grid = self.items.get(kind)
+        if grid is None:
+            return []
+        rect = pygame.Rect(rect)
+        return [item for item in grid.query(rect) if rect.colliderect(item.rect)]
@@ -0,0 +1,46 @@
+import pygame
+
+from asset_cache import ASSET_CACHE
+
+# Слои размытого свечения: на сколько пикселей слой больше предмета и его яркость
+GLOW_SIZES = [40, 30, 20, 10]
+GLOW_ALPHAS = [30, 50, 80, 120]
+GLOW_MARGIN = max(GLOW_SIZES)
+
+GLOW_RED = (255, 0, 0)
+GLOW_GREEN = (0, 255, 0)
+
+
+def build_glow(width, height, color):
+    """Собирает все слои свечения предмета width x height в одну поверхность"""
+    glow = pygame.Surface((width + GLOW_MARGIN, height + GLOW_MARGIN), pygame.SRCALPHA)
+
+    for size, alpha in zip(GLOW_SIZES, GLOW_ALPHAS):
+        layer = pygame.Surface((width + size, height + size), pygame.SRCALPHA)
+
+        # Создаем градиентное свечение
+        for i in range(size // 2):
+            current_alpha = max(0, alpha - (i * alpha // (size // 2)))
+            inner_rect = pygame.Rect(i, i, width + size - 2*i, height + size - 2*i)
+            if inner_rect.width > 0 and inner_rect.height > 0:
+                pygame.draw.ellipse(layer, (*color, current_alpha), inner_rect)
+
+        offset = (GLOW_MARGIN - size) // 2
+        glow.blit(layer, (offset, offset))
+
+    return glow
+
+
+def get_glow_sprite(width, height, color):
+    """Готовый ореол свечения; строится один раз на размер и цвет.
+
+    Ореол рисуется со смещением -GLOW_MARGIN // 2 относительно предмета.
+    """
+    return ASSET_CACHE.get_or_build(("glow", width, height, tuple(color)),
+                                    lambda: build_glow(width, height, color),
+                                    scope="global")
+
+
+def get_prop_sprite(key, builder):
+    """Общий кэш готовых спрайтов декораций, собранных из нескольких слоев"""
+    return ASSET_CACHE.get_or_build(("prop",) + tuple(key), builder, scope="global")
@@ -0,0 +1,166 @@
+import os
+from collections import OrderedDict
+
+import pygame
+
+FONT_PATH = os.path.join("assets", "fonts", "visitor2.otf")
+TEXT_CACHE_MAX_BYTES = 4 * 1024 * 1024  # 4 МБ отрисованного текста
+
+_fonts = {}
+
+
+def get_font(size, path=FONT_PATH, fallback_size=None):
+    """Возвращает шрифт по (path, size); файл шрифта разбирается один раз.
+
+    Если шрифт не загружается, используется системный шрифт размера
+    fallback_size (по умолчанию того же размера).
+    """
+    key = (path, size)
+    font = _fonts.get(key)
+    if font is None:
+        try:
+            font = pygame.font.Font(path, size)
+        except Exception:
+            font = pygame.font.Font(None, fallback_size or size)
+        _fonts[key] = font
+    return font
+
+
+class TextCache:
+    """LRU-кэш отрисованных строк с ограничением по занимаемой памяти.
+
+    Ключ - (строка, размер, цвет), поэтому статичные надписи вроде
+    "Ключи: 2/3" отрисовываются заново только при изменении значения.
+    Возвращаемые поверхности общие: их нельзя изменять (set_alpha и т.п.).
+    """
+
+    def __init__(self, max_bytes=TEXT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def render(self, text, size, color, antialias=True, path=FONT_PATH, fallback_size=None):
+        key = (text, size, tuple(color), antialias, path)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = get_font(size, path, fallback_size).render(text, antialias, color)
+        self._surfaces[key] = surface
+        self.used_bytes += self._surface_bytes(surface)
+
+        # Вытесняем давно не использованные строки
+        while self.used_bytes > self.max_bytes and len(self._surfaces) > 1:
+            _, old_surface = self._surfaces.popitem(last=False)
+            self.used_bytes -= self._surface_bytes(old_surface)
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+        self.used_bytes = 0
+
+    @staticmethod
+    def _surface_bytes(surface):
+        return surface.get_pitch() * surface.get_height()
+
+
+TEXT_CACHE = TextCache()
+
+
+def render_text(text, size, color, antialias=True, path=FONT_PATH, fallback_size=None):
+    """Отрисовывает строку через общий кэш текста"""
+    return TEXT_CACHE.render(text, size, color, antialias, path, fallback_size)
+
+
+class GlyphAtlas:
+    """Растровый атлас глифов одного шрифта и цвета.
+
+    Каждый символ растеризуется FreeType один раз и копируется в общую
+    поверхность; строка рисуется одним вызовом Surface.blits по
+    прямоугольникам глифов. Подходит для пиксельного visitor2, у которого
+    ширина строки равна сумме ширин символов.
+    """
+
+    def __init__(self, font, color, antialias=True):
+        self.font = font
+        self.color = tuple(color)
+        self.antialias = antialias
+        self.line_height = font.get_height()
+        self.image = pygame.Surface((256, self.line_height), pygame.SRCALPHA)
+        self.glyphs = {}
+        self._cursor_x = 0
+
+    def _add_glyph(self, char):
+        glyph = self.font.render(char, self.antialias, self.color)
+        width = glyph.get_width()
+
+        # Расширяем атлас, если глиф не помещается
+        if self._cursor_x + width > self.image.get_width():
+            new_width = max(self.image.get_width() * 2, self._cursor_x + width)
+            image = pygame.Surface((new_width, self.line_height), pygame.SRCALPHA)
+            image.blit(self.image, (0, 0))
+            self.image = image
+
+        self.image.blit(glyph, (self._cursor_x, 0))
+        entry = (pygame.Rect(self._cursor_x, 0, width, glyph.get_height()), width)
+        self._cursor_x += width
+        self.glyphs[char] = entry
+        return entry
+
+    def get_glyph(self, char):
+        entry = self.glyphs.get(char)
+        if entry is None:
+            entry = self._add_glyph(char)
+        return entry
+
+    def size(self, text):
+        """Размер строки, как у font.size"""
+        width = 0
+        for char in text:
+            width += self.get_glyph(char)[1]
+        return width, self.line_height
+
+    def draw(self, target, text, pos, alpha=None):
+        """Рисует строку на target; возвращает занятый прямоугольник"""
+        # Сначала добавляем недостающие глифы: атлас может при этом пересоздаться
+        glyphs = [self.get_glyph(char) for char in text]
+
+        x, y = pos
+        start_x = x
+        blits = []
+        image = self.image
+        for char, (rect, advance) in zip(text, glyphs):
+            if not char.isspace():
+                blits.append((image, (x, y), rect))
+            x += advance
+
+        if alpha is not None and alpha < 255:
+            self.image.set_alpha(int(alpha))
+            target.blits(blits, doreturn=False)
+            self.image.set_alpha(255)
+        else:
+            target.blits(blits, doreturn=False)
+        return pygame.Rect(start_x, y, x - start_x, self.line_height)
+
+    def draw_centered(self, target, text, center, alpha=None):
+        """Рисует строку с центром в точке center"""
+        width, height = self.size(text)
+        return self.draw(target, text, (center[0] - width // 2, center[1] - height // 2), alpha)
+
+
+_glyph_atlases = {}
+
+
+def get_glyph_atlas(size, color, path=FONT_PATH, fallback_size=None):
+    """Атлас глифов для (path, size, color), общий для всей игры"""
+    key = (path, size, tuple(color))
+    atlas = _glyph_atlases.get(key)
+    if atlas is None:
+        atlas = GlyphAtlas(get_font(size, path, fallback_size), color)
+        _glyph_atlases[key] = atlas
+    return atlas
@@ -1,6 +1,6 @@
 import pygame
 import socket
-import pickle
+import queue
 import threading
 import sys
 import os
@@ -9,10 +9,35 @@ import random
 import json
 import pygame.font
 import pygame.mixer  # Добавляем импорт для звука
+from asset_cache import ASSET_CACHE
+from sprite_atlas import get_atlas_frames, fit_frame, scale_to_height
+from fonts import get_font, render_text, get_glyph_atlas
+from text_layout import TextLayout
+from effects import get_glow_sprite, get_prop_sprite, GLOW_MARGIN, GLOW_RED, GLOW_GREEN
+from static_layer import StaticLayerCache
+from collision_world import CollisionWorld
+from render_queue import (RenderQueue, LAYER_GROUND, LAYER_PLATFORMS, LAYER_ITEMS, LAYER_PROPS,
+                          LAYER_SIGNS, LAYER_CHARACTERS)
+from renderer import DirtyRectRenderer, RENDER_MODE, RENDER_MODE_DIRTY, RENDER_FPS
+from headless import init_headless, KeyboardInput
+from transport import create_udp_socket, HOST_PORT, CLIENT_PORT
+from timestep import FixedStepScheduler, lerp, interpolate_position
+from parallax import ParallaxBackground
+from lighting import LightingSystem, LIGHT_MAP_SCALE, LAMP_LIGHT_RADIUS, LAMP_LIGHT_COLOR, SIGN_LIGHT_RADIUS
+from transitions import VictoryScreen
+from protocol import encode_message, decode_message
+from snapshot import SnapshotSender, SnapshotReceiver, new_session
+from net_scheduler import NetworkScheduler, SYNC_INTERVAL
+from remote_buffer import SnapshotBuffer, INTERPOLATION_DELAY
+from reliable import ReliableChannel
 
 # Инициализация Pygame
 pygame.init()
-pygame.mixer.init()  # Инициализируем звуковую подсистему
+# Без звукового устройства (сервер сборки) игра работает без звука
+try:
+    pygame.mixer.init()  # Инициализируем звуковую подсистему
+except pygame.error as e:
+    print(f"Ошибка инициализации звука: {e}")
 
 # Загрузка звуков
 try:
@@ -61,6 +86,7 @@ DIRT_LIGHT = (75, 60, 45)
 PLATFORM_HEIGHT = 50  
 SHADOW_HEIGHT = 400  
 SHADOW_ALPHA = 200  
+PARALLAX_FACTORS = (0.1, 0.3, 0.5, 0.7)  # От дальнего слоя фона к ближнему
 
 # Константы для диалогов
 DIALOG_PADDING = 40
@@ -85,10 +111,44 @@ SWITCH_COLOR = (255, 215, 0)
 DOOR_COLOR = (160, 82, 45)  
 COLLECTIBLE_COLOR = (255, 20, 147) 
 
+# Тайлы платформ: блоки 16x16 из mainlev_build.png рисуются как 32x32
+PLATFORM_BLOCKS_PATH = os.path.join("assets", "tiles", "mainlev_build.png")
+PLATFORM_BLOCK_SIZE = 16
+PLATFORM_TILE_SIZE = 32
+
+# Текстуры декораций
+DECORATIONS_DIR = os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations")
+DECORATION_TEXTURES = {
+    "grass1": "grass_1.png",
+    "grass2": "grass_2.png",
+    "grass3": "grass_3.png",
+    "rock1": "rock_1.png",
+    "rock2": "rock_2.png",
+    "rock3": "rock_3.png",
+    "fence": "fence_1.png",
+    "fence2": "fence_2.png"
+}
+
+class FrameSet:
+    """Кадры анимации и их отраженные по горизонтали копии.
+    
+    Отраженные кадры строятся при первом обращении и разделяются
+    всеми SpriteSheet, созданными на этом наборе.
+    """
+    def __init__(self, frames):
+        self.frames = frames
+        self._mirrored_frames = None
+
+    def get_mirrored_frames(self):
+        if self._mirrored_frames is None:
+            self._mirrored_frames = [pygame.transform.flip(frame, True, False) for frame in self.frames]
+        return self._mirrored_frames
+
 class SpriteSheet:
     def __init__(self, frames, animation_speed, width, height):
-        self.frames = frames  
-        self.frames_count = len(frames)
+        self.frame_set = frames if isinstance(frames, FrameSet) else FrameSet(frames)
+        self.frames = self.frame_set.frames  
+        self.frames_count = len(self.frames)
         self.target_width = width
         self.target_height = height
         self.current_frame = 0
@@ -96,7 +156,7 @@ class SpriteSheet:
         self.last_update = time.time()
         self.animation_speed = animation_speed
 
-    def get_current_frame(self):
+    def get_current_frame(self, mirrored=False):
         current_time = time.time()
         delta_time = current_time - self.last_update
         self.last_update = current_time
@@ -109,6 +169,8 @@ class SpriteSheet:
             self.current_frame = (self.current_frame + 1) % self.frames_count
             self.frame_progress = 0.0
             
+        if mirrored:
+            return self.frame_set.get_mirrored_frames()[self.current_frame]
         return self.frames[self.current_frame]
 
     def reset_animation(self):
@@ -116,94 +178,116 @@ class SpriteSheet:
         self.frame_progress = 0.0
         self.last_update = time.time()
 
-def load_sprite(character_name, state="idle"):
-    # Настройки количества кадров для каждого спрайта
-    sprite_config = {
-        "alice": {
-            "idle": {"frames": 18, "speed": ALICE_ANIMATION_SPEED, "size": (ALICE_WIDTH, ALICE_HEIGHT)},
-            "walk": {"frames": 24, "speed": ALICE_ANIMATION_SPEED, "size": (ALICE_WIDTH, ALICE_HEIGHT)}
-        },
-        "rabbit": {
-            "idle": {"frames": 2, "speed": RABBIT_IDLE_ANIMATION_SPEED, "size": (RABBIT_WIDTH, RABBIT_HEIGHT)},
-            "walk": {"frames": 4, "speed": RABBIT_WALK_ANIMATION_SPEED, "size": (RABBIT_WIDTH, RABBIT_HEIGHT)}  # Обновлено до 4 кадров
-        }
+# Настройки количества кадров для каждого спрайта
+SPRITE_CONFIG = {
+    "alice": {
+        "idle": {"frames": 18, "speed": ALICE_ANIMATION_SPEED, "size": (ALICE_WIDTH, ALICE_HEIGHT)},
+        "walk": {"frames": 24, "speed": ALICE_ANIMATION_SPEED, "size": (ALICE_WIDTH, ALICE_HEIGHT)}
+    },
+    "rabbit": {
+        "idle": {"frames": 2, "speed": RABBIT_IDLE_ANIMATION_SPEED, "size": (RABBIT_WIDTH, RABBIT_HEIGHT)},
+        "walk": {"frames": 4, "speed": RABBIT_WALK_ANIMATION_SPEED, "size": (RABBIT_WIDTH, RABBIT_HEIGHT)}  # Обновлено до 4 кадров
     }
+}
 
+def load_sprite_frames(character_name, state):
+    """Загружает и масштабирует кадры спрайта из отдельных файлов"""
+    config = SPRITE_CONFIG[character_name][state]
     base_path = os.path.join("assets", "characters", character_name)
-    try:
-        config = sprite_config[character_name][state]
-        frames = []
-        
-        # Загружаем каждый кадр отдельно
-        for i in range(1, config["frames"] + 1):
-            # Пробуем разные форматы файлов
-            possible_filenames = [
-                f"{character_name}_{state} ({i}).png",
-                f"{character_name}_{state} ({i}).jpg"
-            ]
-            
-            frame_path = None
-            for filename in possible_filenames:
-                temp_path = os.path.join(base_path, filename)
-                if os.path.exists(temp_path):
-                    frame_path = temp_path
-                    break
-            
-            if not frame_path:
-                print(f"Файл не найден для кадра {i} в {character_name}/{state}")
-                continue
-                
-            # Загружаем и масштабируем кадр
-            try:
-                frame = pygame.image.load(frame_path).convert_alpha()
-            except pygame.error as e:
-                print(f"Ошибка загрузки {frame_path}: {e}")
-                continue
-            
-            # Определяем размеры для масштабирования с сохранением пропорций
-            source_width = frame.get_width()
-            source_height = frame.get_height()
-            source_ratio = source_width / source_height
-            target_ratio = config["size"][0] / config["size"][1]
-            
-            if source_ratio > target_ratio:
-                new_width = config["size"][0]
-                new_height = int(new_width / source_ratio)
-            else:
-                new_height = config["size"][1]
-                new_width = int(new_height * source_ratio)
-            
-            # Масштабируем спрайт
-            scaled = pygame.transform.smoothscale(frame, (new_width, new_height))
+    frames = []
+    
+    # Загружаем каждый кадр отдельно
+    for i in range(1, config["frames"] + 1):
+        # Пробуем разные форматы файлов
+        possible_filenames = [
+            f"{character_name}_{state} ({i}).png",
+            f"{character_name}_{state} ({i}).jpg"
+        ]
+        
+        frame_path = None
+        for filename in possible_filenames:
+            temp_path = os.path.join(base_path, filename)
+            if os.path.exists(temp_path):
+                frame_path = temp_path
+                break
+        
+        if not frame_path:
+            print(f"Файл не найден для кадра {i} в {character_name}/{state}")
+            continue
             
-            # Создаем финальную поверхность
-            final = pygame.Surface(config["size"], pygame.SRCALPHA)
+        # Загружаем и масштабируем кадр
+        try:
+            frame = pygame.image.load(frame_path).convert_alpha()
+        except pygame.error as e:
+            print(f"Ошибка загрузки {frame_path}: {e}")
+            continue
+        
+        frames.append(fit_frame(frame, config["size"]))
+    
+    return frames
+
+# Наборы кадров общие для всех игроков с одним персонажем
+_frame_sets = {}
+
+def load_sprite(character_name, state="idle"):
+    try:
+        config = SPRITE_CONFIG[character_name][state]
+        
+        frame_set = _frame_sets.get((character_name, state))
+        if frame_set is None:
+            # Кадры берем из заранее собранного атласа, если он есть
+            frames = get_atlas_frames(f"{character_name}/{state}", size=config["size"])
+            if not frames:
+                frames = load_sprite_frames(character_name, state)
             
-            # Центрируем спрайт
-            x = (config["size"][0] - new_width) // 2
-            y = (config["size"][1] - new_height) // 2
+            if not frames:
+                raise FileNotFoundError(f"Не найдено кадров для {character_name}/{state}")
             
-            final.blit(scaled, (x, y))
-            frames.append(final)
-        
-        if not frames:
-            raise FileNotFoundError(f"Не найдено кадров для {character_name}/{state}")
+            frame_set = _frame_sets[(character_name, state)] = FrameSet(frames)
             
-        return SpriteSheet(frames, config["speed"], config["size"][0], config["size"][1])
+        return SpriteSheet(frame_set, config["speed"], config["size"][0], config["size"][1])
     except Exception as e:
         print(f"Ошибка при загрузке спрайтов {character_name}/{state}: {str(e)}")
         # Создаем заглушку при ошибке
-        surface = pygame.Surface(sprite_config[character_name][state]["size"], pygame.SRCALPHA)
+        surface = pygame.Surface(SPRITE_CONFIG[character_name][state]["size"], pygame.SRCALPHA)
         color = (255, 0, 0) if character_name == "alice" else (0, 0, 255)
         pygame.draw.rect(surface, color, surface.get_rect())
         return SpriteSheet([surface], 0.1, surface.get_width(), surface.get_height())
 
+# Анимации ключей: шаблон имени кадра и количество кадров
+KEY_ANIMATIONS = {
+    "key2": ("Key 2 - GOLD - {:04d}.png", 12),
+    "key5": ("Key 5 - GOLD - frame{:04d}.png", 18),
+    "key15": ("Key 15 - GOLD - frame{:04d}.png", 48)
+}
+KEY_HEIGHT = 32
+
+def load_key_frames(key_type):
+    """Загружает кадры анимации ключа из отдельных файлов"""
+    if key_type not in KEY_ANIMATIONS:
+        return []
+    
+    filename_pattern, frames_count = KEY_ANIMATIONS[key_type]
+    frames = []
+    for i in range(frames_count):
+        frame_path = os.path.join("assets", "items", filename_pattern.format(i))
+        frame = pygame.image.load(frame_path).convert_alpha()
+        # Сохраняем пропорции при масштабировании
+        frames.append(scale_to_height(frame, KEY_HEIGHT))
+    return frames
+
 class Camera:
     def __init__(self, width, height):
         self.width = width
         self.height = height
+        # scroll_x/scroll_y - положение для отрисовки (между двумя шагами
+        # симуляции), sim_scroll_x/sim_scroll_y - положение после шага
         self.scroll_x = 0
         self.scroll_y = 0
+        self.sim_scroll_x = 0
+        self.sim_scroll_y = 0
+        self.prev_scroll_x = 0
+        self.prev_scroll_y = 0
         self.target_scroll_x = 0
         self.target_scroll_y = 0
         self.lerp_speed = 0.08  
@@ -216,8 +300,8 @@ class Camera:
         screen_center_y = self.height // 2
 
         # Определяем целевую позицию с учетом мертвой зоны
-        current_view_x = target_x - self.scroll_x
-        current_view_y = target_y - self.scroll_y
+        current_view_x = target_x - self.sim_scroll_x
+        current_view_y = target_y - self.sim_scroll_y
 
         # Проверяем, вышел ли персонаж за пределы мертвой зоны
         if abs(current_view_x - screen_center_x) > self.deadzone_x:
@@ -233,12 +317,22 @@ class Camera:
                 self.target_scroll_y = target_y - (screen_center_y - self.deadzone_y)
 
         # Плавная интерполяция к целевой позиции
-        self.scroll_x += (self.target_scroll_x - self.scroll_x) * self.lerp_speed
-        self.scroll_y += (self.target_scroll_y - self.scroll_y) * self.lerp_speed
+        self.sim_scroll_x += (self.target_scroll_x - self.sim_scroll_x) * self.lerp_speed
+        self.sim_scroll_y += (self.target_scroll_y - self.sim_scroll_y) * self.lerp_speed
         
         # Ограничение камеры границами мира
-        self.scroll_x = max(0, min(self.scroll_x, WORLD_WIDTH - self.width))
-        self.scroll_y = max(0, min(self.scroll_y, WORLD_HEIGHT - self.height))
+        self.sim_scroll_x = max(0, min(self.sim_scroll_x, WORLD_WIDTH - self.width))
+        self.sim_scroll_y = max(0, min(self.sim_scroll_y, WORLD_HEIGHT - self.height))
+
+    def save_state(self):
+        """Запоминает положение перед шагом симуляции"""
+        self.prev_scroll_x = self.sim_scroll_x
+        self.prev_scroll_y = self.sim_scroll_y
+
+    def interpolate(self, alpha):
+        """Положение для отрисовки между двумя последними шагами"""
+        self.scroll_x = lerp(self.prev_scroll_x, self.sim_scroll_x, alpha)
+        self.scroll_y = lerp(self.prev_scroll_y, self.sim_scroll_y, alpha)
 
     def apply(self, x, y):
         # Округляем значения для избежания дрожания спрайтов
@@ -262,8 +356,11 @@ class Player:
         }
         self.current_state = "idle"
         self.last_state = "idle"
-        self.last_update_time = time.time()
         self.state_changed = False
+        # Положение на прошлом шаге симуляции и положение для отрисовки
+        self.prev_x, self.prev_y = x, y
+        self.render_x, self.render_y = x, y
+        self.world = None  # CollisionWorld уровня
         
         # Настройки в зависимости от персонажа
         if character_name == "alice":
@@ -274,18 +371,15 @@ class Player:
             self.jump_force = RABBIT_JUMP_FORCE
 
     def move(self, direction):
-        current_time = time.time()
-        if current_time - self.last_update_time > 1/60:
-            old_x = self.x
-            new_x = self.x + direction * self.move_speed
-            
-            
-            if hasattr(self, '_platforms'):
-                new_x = self.check_horizontal_collisions(self._platforms, new_x)
-            
-            self.x = new_x
-            self.last_update_time = current_time
-            
+        """Горизонтальное движение за один шаг симуляции"""
+        new_x = self.x + direction * self.move_speed
+        
+        if self.world is not None:
+            # Кандидаты - платформы на всем пути персонажа за шаг
+            swept_rect = self.get_rect().union(self.get_rect(x=new_x))
+            new_x = self.check_horizontal_collisions(self.world.platforms_in(swept_rect), new_x)
+        
+        self.x = new_x
         
         if direction != 0:
             self.facing_right = direction > 0
@@ -311,14 +405,15 @@ class Player:
     def update(self, platforms=None):
         self.vel_y += GRAVITY
         old_y = self.y
-        old_x = self.x
-        
         
         self.y += self.vel_y
-
-      
-        player_rect = pygame.Rect(self.x, self.y, self.width - self.offset, self.height - self.offset)
         
+        # Из мира столкновений берем платформы на пути персонажа за шаг
+        if platforms is None and self.world is not None:
+            platforms = self.world.platforms_in(self.get_rect().union(self.get_rect(y=old_y)))
+        
+        if platforms:
+            self.resolve_vertical_collisions(platforms, old_y)
         
         platform_y = WORLD_HEIGHT - PLATFORM_HEIGHT
         if self.y > platform_y - self.height + self.offset:
@@ -327,51 +422,111 @@ class Player:
                 self.vel_y = 0
                 self.is_jumping = False
 
+    def resolve_vertical_collisions(self, platforms, old_y):
+        """Непрерывная проверка по вертикали: путь old_y -> y за шаг.
+
+        Вместо пересечения в конечной точке ищется первая платформа, которую
+        персонаж встречает на пути (наименьшее время столкновения), поэтому
+        при большой скорости тонкие платформы не проскакиваются. Допуск
+        в 5 пикселей сохранен.
+        """
+        if self.vel_y == 0:
+            return
         
-        if platforms:
-            for platform in platforms:
-                platform_rect = platform.rect
-                player_rect = pygame.Rect(self.x, self.y, self.width - self.offset, self.height - self.offset)
-                
-                
-                if player_rect.colliderect(platform_rect):
-                   
-                    if (old_y + self.height - self.offset <= platform.y + 5 and 
-                        self.vel_y > 0 and 
-                        self.y + self.height - self.offset > platform.y):
-                        self.y = platform.y - self.height + self.offset
-                        self.vel_y = 0
-                        self.is_jumping = False
-                        break
-                    
-                    elif (old_y >= platform.y + platform.height - 5 and 
-                          self.vel_y < 0 and 
-                          self.y < platform.y + platform.height):
-                        self.y = platform.y + platform.height
-                        self.vel_y = 0
-                        break
+        height = self.height - self.offset
+        left = self.x
+        right = self.x + self.width - self.offset
+        hit = None
+        hit_time = None
+        
+        for platform in platforms:
+            if right <= platform.x or left >= platform.x + platform.width:
+                continue
+            
+            if self.vel_y > 0:
+                # Низ персонажа пересекает верх платформы
+                if (old_y + height <= platform.y + 5 and
+                    self.y + height > platform.y):
+                    impact_time = (platform.y - old_y - height) / self.vel_y
+                else:
+                    continue
+            else:
+                # Голова персонажа пересекает низ платформы
+                bottom = platform.y + platform.height
+                if old_y >= bottom - 5 and self.y < bottom:
+                    impact_time = (bottom - old_y) / self.vel_y
+                else:
+                    continue
+            
+            if hit_time is None or impact_time < hit_time:
+                hit, hit_time = platform, impact_time
+        
+        if hit is None:
+            return
+        
+        if self.vel_y > 0:
+            self.y = hit.y - self.height + self.offset
+            self.is_jumping = False
+        else:
+            self.y = hit.y + hit.height
+        self.vel_y = 0
+
+    def get_pose(self):
+        """Поза для сети: при ее изменении состояние отправляется второму игроку"""
+        return (self.x, self.y, self.facing_right, self.moving, self.current_state)
+
+    def get_rect(self, x=None, y=None):
+        """Прямоугольник столкновений персонажа (можно в другой точке)"""
+        return pygame.Rect(self.x if x is None else x, self.y if y is None else y,
+                           self.width - self.offset, self.height - self.offset)
 
     def check_horizontal_collisions(self, platforms, new_x):
-        
+        """Непрерывная проверка по горизонтали: путь x -> new_x за шаг"""
         if not platforms:
             return new_x
-            
-        player_rect = pygame.Rect(new_x, self.y, self.width - self.offset, self.height - self.offset)
+        
+        width = self.width - self.offset
+        player_rect = self.get_rect()
+        new_rect = self.get_rect(x=new_x)
+        dx = new_x - self.x
+        result = new_x
+        hit_time = None
+        inside = None
         
         for platform in platforms:
             if player_rect.colliderect(platform.rect):
-                
-                if self.x < platform.x:
-                    return platform.x - (self.width - self.offset)
-               
-                else:
-                    return platform.x + platform.width
+                if inside is None and new_rect.colliderect(platform.rect):
+                    inside = platform
+                continue
+            
+            if (self.y + self.height - self.offset <= platform.y or
+                self.y >= platform.y + platform.height):
+                continue
+            
+            if dx > 0 and self.x + width <= platform.x < new_x + width:
+                impact_time = (platform.x - self.x - width) / dx
+                stop_x = platform.x - width
+            elif dx < 0 and new_x < platform.x + platform.width <= self.x:
+                impact_time = (platform.x + platform.width - self.x) / dx
+                stop_x = platform.x + platform.width
+            else:
+                continue
+            
+            if hit_time is None or impact_time < hit_time:
+                hit_time, result = impact_time, stop_x
+        
+        # Персонаж уже внутри платформы и стены на пути нет - выталкиваем
+        # к ближней стороне, как раньше
+        if hit_time is None and inside is not None:
+            if self.x < inside.x:
+                return inside.x - width
+            return inside.x + inside.width
         
-        return new_x
+        return result
 
     def check_collectibles(self, collectibles):
         """Проверяет сбор предметов"""
-        player_rect = pygame.Rect(self.x, self.y, self.width - self.offset, self.height - self.offset)
+        player_rect = self.get_rect()
         collected_items = []
         
         for collectible in collectibles:
@@ -385,7 +540,7 @@ class Player:
 
     def check_platform_triggers(self, platforms):
         
-        player_rect = pygame.Rect(self.x, self.y, self.width - self.offset, self.height - self.offset)
+        player_rect = self.get_rect()
         triggered_platforms = []
         
         for platform in platforms:
@@ -396,33 +551,49 @@ class Player:
         
         return triggered_platforms
 
+    def save_state(self):
+        """Запоминает положение перед шагом симуляции"""
+        self.prev_x, self.prev_y = self.x, self.y
+
+    def interpolate(self, alpha):
+        """Положение для отрисовки между двумя последними шагами"""
+        self.render_x, self.render_y = interpolate_position(self.prev_x, self.prev_y, self.x, self.y, alpha)
+
     def draw(self, screen, camera):
-        screen_x, screen_y = camera.apply(self.x, self.y)
+        screen_x, screen_y = camera.apply(self.render_x, self.render_y)
         if -self.width <= screen_x <= SCREEN_WIDTH and -self.height <= screen_y <= SCREEN_HEIGHT:
-            sprite = self.sprites[self.current_state].get_current_frame()
-            if not self.facing_right:
-                sprite = pygame.transform.flip(sprite, True, False)
+            sprite = self.sprites[self.current_state].get_current_frame(mirrored=not self.facing_right)
             screen.blit(sprite, (screen_x, screen_y))
 
+    def get_sprites(self, camera):
+        """Спрайты для очереди отрисовки: (поверхность, мировые координаты)"""
+        sprite = self.sprites[self.current_state].get_current_frame(mirrored=not self.facing_right)
+        return [(sprite, (self.render_x, self.render_y))]
+
+    def get_screen_rect(self, camera):
+        """Область экрана, занятая персонажем"""
+        return pygame.Rect(camera.apply(self.render_x, self.render_y), (self.width, self.height))
+
 class DialogSystem:
     def __init__(self):
         pygame.font.init()
-        self.font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), FONT_SIZE)
+        self.font = get_font(FONT_SIZE)
+        self.layout = TextLayout(self.font)
+        # Печатаемый текст рисуется из атласа глифов
+        self.text_glyphs = get_glyph_atlas(FONT_SIZE, TEXT_COLOR)
         
         
-        self.dialog_bg = pygame.image.load(os.path.join("assets", "gui", "dialog_box.png"))
-        self.dialog_bg = pygame.transform.scale(self.dialog_bg, (DIALOG_WIDTH, DIALOG_HEIGHT))
+        self.dialog_bg = ASSET_CACHE.load_scaled(os.path.join("assets", "gui", "dialog_box.png"),
+                                                 (DIALOG_WIDTH, DIALOG_HEIGHT), mode="raw")
         
         
         try:
-            self.alice_portrait = pygame.image.load(os.path.join("assets", "characters", "alice", "alice_dialog.png")).convert_alpha()
-            self.alice_portrait = pygame.transform.scale(self.alice_portrait, (128, 128))
+            self.alice_portrait = ASSET_CACHE.load_scaled(os.path.join("assets", "characters", "alice", "alice_dialog.png"), (128, 128))
         except:
             self.alice_portrait = None
             
         try:
-            self.rabbit_portrait = pygame.image.load(os.path.join("assets", "characters", "rabbit", "rabbit_dialog.png")).convert_alpha()
-            self.rabbit_portrait = pygame.transform.scale(self.rabbit_portrait, (128, 128))
+            self.rabbit_portrait = ASSET_CACHE.load_scaled(os.path.join("assets", "characters", "rabbit", "rabbit_dialog.png"), (128, 128))
         except:
             self.rabbit_portrait = None
         
@@ -448,6 +619,7 @@ class DialogSystem:
         self.dialog_completed = False  
         self.exit_hint_timer = 0  
         self.show_exit_hint = False  
+        self._drawn_state = None
 
     def start_dialog(self, dialog_id, character_name):
         
@@ -501,34 +673,25 @@ class DialogSystem:
 
     def wrap_text(self, text, max_width):
         
-        words = text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            test_surface = self.font.render(test_line, True, TEXT_COLOR)
-            if test_surface.get_width() <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-                else:
-                    
-                    lines.append(word)
-        
-        if current_line:
-            lines.append(' '.join(current_line))
-        
-        return lines
+        return self.layout.wrap(text, max_width)
+
+    def get_dirty_rects(self):
+        """Области диалога и подсказки, если их содержимое изменилось с прошлого вызова"""
+        state = (self.is_active, self.dialog_completed, self.show_exit_hint, self.current_speaker,
+                 self.target_text, len(self.current_text), int(self.text_alpha), self.selected_choice)
+        if state == self._drawn_state:
+            return []
+        self._drawn_state = state
+        dialog_rect = pygame.Rect((SCREEN_WIDTH - DIALOG_WIDTH) // 2, 20, DIALOG_WIDTH, DIALOG_HEIGHT)
+        hint_rect = pygame.Rect(0, SCREEN_HEIGHT // 2 - 5, SCREEN_WIDTH, FONT_SIZE + 20)
+        return [dialog_rect, hint_rect]
 
     def draw(self, screen, character_name):
         
         
         if self.show_exit_hint:
             hint_text = "Теперь нужно найти выход!"
-            hint_surface = self.font.render(hint_text, True, DIALOG_PROMPT_COLOR)
+            hint_surface = render_text(hint_text, FONT_SIZE, DIALOG_PROMPT_COLOR)
             hint_x = (SCREEN_WIDTH - hint_surface.get_width()) // 2
             hint_y = SCREEN_HEIGHT // 2
             
@@ -565,7 +728,7 @@ class DialogSystem:
         else:
             
             speaker_text = "Алиса" if self.current_speaker == "alice" else "Кролик"
-            speaker_surface = self.font.render(speaker_text, True, (255, 255, 100))
+            speaker_surface = render_text(speaker_text, FONT_SIZE, (255, 255, 100))
             screen.blit(speaker_surface, (dialog_x + DIALOG_PADDING, dialog_y + DIALOG_PADDING))
             text_start_x = dialog_x + DIALOG_PADDING
 
@@ -584,9 +747,7 @@ class DialogSystem:
             if text_y + FONT_SIZE > dialog_y + DIALOG_HEIGHT - DIALOG_PADDING:
                 break  
                 
-            text_surface = self.font.render(line, True, TEXT_COLOR)
-            text_surface.set_alpha(self.text_alpha)
-            screen.blit(text_surface, (text_start_x, text_y))
+            self.text_glyphs.draw(screen, line, (text_start_x, text_y), alpha=self.text_alpha)
             text_y += FONT_SIZE + 3
 
         
@@ -612,7 +773,7 @@ class DialogSystem:
                 choice_lines = self.wrap_text(choice_text, max_choice_width)
                 
                 if choice_lines:
-                    choice_surface = self.font.render(choice_lines[0], True, color)
+                    choice_surface = render_text(choice_lines[0], FONT_SIZE, color)
                     screen.blit(choice_surface, (text_start_x + indent, choice_y))
 
     def handle_input(self, event, character_name):
@@ -647,6 +808,8 @@ class Platform:
         self.character_access = character_access  
         self.is_active = True  
         self.rect = pygame.Rect(x, y, width, height)
+        # Положение для отрисовки; у подвижных платформ сглаживается между шагами
+        self.render_x, self.render_y = x, y
         
         
         self.load_textures()
@@ -655,17 +818,26 @@ class Platform:
         
         try:
             
-            self.block_texture = pygame.image.load(os.path.join("assets", "tiles", "mainlev_build.png")).convert_alpha()
-            self.terrain_texture = pygame.image.load(os.path.join("assets", "tiles", "terrain.png")).convert_alpha()
+            self.block_texture = ASSET_CACHE.load_image(PLATFORM_BLOCKS_PATH)
+            self.terrain_texture = ASSET_CACHE.load_image(os.path.join("assets", "tiles", "terrain.png"))
             
-            # Создаем поверхность для платформы с текстурой
-            self.surface = self.create_textured_platform()
+            # Одинаковые платформы используют одну готовую поверхность
+            key = ("platform", self.width, self.height, self.platform_type)
+            self.surface = ASSET_CACHE.get_or_build(key, self.create_textured_platform)
         except:
             # Если не удалось загрузить текстуры, используем цветные прямоугольники
             self.block_texture = None
             self.terrain_texture = None
             self.surface = None
 
+    def get_tile(self, row):
+        """Блок текстуры, увеличенный до размера тайла; масштабируется один раз"""
+        def build():
+            block_rect = pygame.Rect(0, row * PLATFORM_BLOCK_SIZE, PLATFORM_BLOCK_SIZE, PLATFORM_BLOCK_SIZE)
+            block_sprite = self.block_texture.subsurface(block_rect)
+            return pygame.transform.scale(block_sprite, (PLATFORM_TILE_SIZE, PLATFORM_TILE_SIZE))
+        return ASSET_CACHE.get_or_build(("platform_tile", PLATFORM_BLOCKS_PATH, row), build)
+
     def create_textured_platform(self):
         
         if not self.block_texture:
@@ -673,24 +845,15 @@ class Platform:
             
         surface = pygame.Surface((self.width, self.height + 20), pygame.SRCALPHA)  
         
+        # Верхний блок - для самой платформы, нижний - для "подошвы" под ней
+        top_tile = self.get_tile(0)
+        bottom_tile = self.get_tile(1)
         
-        block_size = 16
-        tile_size = 32  
-        
-        
-        for x in range(0, self.width, tile_size):
-            for y in range(0, self.height + 20, tile_size):
-                
-                if y < self.height:
-                    
-                    block_rect = pygame.Rect(0, 0, block_size, block_size)
-                else:
-                    
-                    block_rect = pygame.Rect(0, block_size, block_size, block_size)
-                
-                block_sprite = self.block_texture.subsurface(block_rect)
-                scaled_block = pygame.transform.scale(block_sprite, (tile_size, tile_size))
-                surface.blit(scaled_block, (x, y))
+        blits = []
+        for x in range(0, self.width, PLATFORM_TILE_SIZE):
+            for y in range(0, self.height + 20, PLATFORM_TILE_SIZE):
+                blits.append((top_tile if y < self.height else bottom_tile, (x, y)))
+        surface.blits(blits, doreturn=False)
         
         
         if self.platform_type == "alice_only":
@@ -708,6 +871,17 @@ class Platform:
         
         return surface
 
+    def get_sprites(self, camera):
+        """Спрайты для очереди отрисовки; None - платформа рисуется через draw"""
+        if not self.surface or self.platform_type in ("alice_only", "rabbit_only"):
+            return None
+        return [(self.surface, (self.render_x, self.render_y - 20))]
+
+    def get_screen_rect(self, camera):
+        """Область экрана, занятая платформой вместе с текстурой над ней"""
+        screen_x, screen_y = camera.apply(self.render_x, self.render_y)
+        return pygame.Rect(screen_x, screen_y - 20, self.width, self.height + 20)
+
     def can_stand_on(self, character_name):
         
         if not self.is_active and self.platform_type == "door":
@@ -732,7 +906,7 @@ class Platform:
 
     def draw(self, screen, camera):
         
-        screen_x, screen_y = camera.apply(self.x, self.y)
+        screen_x, screen_y = camera.apply(self.render_x, self.render_y)
         if -self.width <= screen_x <= SCREEN_WIDTH and -self.height <= screen_y <= SCREEN_HEIGHT:
             
             
@@ -749,11 +923,7 @@ class Platform:
             
             
             if self.platform_type == "alice_only":
-                try:
-                    font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 18)
-                except:
-                    font = pygame.font.Font(None, 20)
-                text = font.render("A", True, (255, 255, 255))
+                text = render_text("A", 18, (255, 255, 255), fallback_size=20)
                 text_rect = text.get_rect(center=(screen_x + self.width//2, screen_y + self.height//2))
                 
                 
@@ -761,11 +931,7 @@ class Platform:
                 pygame.draw.rect(screen, (0, 0, 0, 128), bg_rect)
                 screen.blit(text, text_rect)
             elif self.platform_type == "rabbit_only":
-                try:
-                    font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 18)
-                except:
-                    font = pygame.font.Font(None, 20)
-                text = font.render("R", True, (255, 255, 255))
+                text = render_text("R", 18, (255, 255, 255), fallback_size=20)
                 text_rect = text.get_rect(center=(screen_x + self.width//2, screen_y + self.height//2))
                 
                 
@@ -773,11 +939,7 @@ class Platform:
                 pygame.draw.rect(screen, (0, 0, 0, 128), bg_rect)
                 screen.blit(text, text_rect)
             elif self.platform_type == "switch":
-                try:
-                    font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 14)
-                except:
-                    font = pygame.font.Font(None, 16)
-                text = font.render("SW", True, (0, 0, 0))
+                text = render_text("SW", 14, (0, 0, 0), fallback_size=16)
                 text_rect = text.get_rect(center=(screen_x + self.width//2, screen_y + self.height//2))
                 screen.blit(text, text_rect)
             elif self.platform_type == "moving":
@@ -810,11 +972,7 @@ class Collectible:
             pygame.draw.circle(screen, (255, 255, 255), (screen_x + 10, screen_y + 10), 10, 2)
             
             
-            try:
-                font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 14)
-            except:
-                font = pygame.font.Font(None, 16)
-            text = font.render("K", True, (255, 255, 255))
+            text = render_text("K", 14, (255, 255, 255), fallback_size=16)
             screen.blit(text, (screen_x + 6, screen_y + 4))
 
 class AnimatedKey:
@@ -833,42 +991,9 @@ class AnimatedKey:
     def load_animation(self):
 
         try:
-            if self.key_type == "key2":
-                
-                for i in range(12):  
-                    frame_path = os.path.join("assets", "items", f"Key 2 - GOLD - {i:04d}.png")
-                    frame = pygame.image.load(frame_path).convert_alpha()
-                    
-                    original_size = frame.get_size()
-                    aspect_ratio = original_size[0] / original_size[1]
-                    new_height = 32
-                    new_width = int(new_height * aspect_ratio)
-                    frame = pygame.transform.scale(frame, (new_width, new_height))
-                    self.animation_frames.append(frame)
-            elif self.key_type == "key5":
-                
-                for i in range(18):  
-                    frame_path = os.path.join("assets", "items", f"Key 5 - GOLD - frame{i:04d}.png")
-                    frame = pygame.image.load(frame_path).convert_alpha()
-                    # Сохраняем пропорции при масштабировании
-                    original_size = frame.get_size()
-                    aspect_ratio = original_size[0] / original_size[1]
-                    new_height = 32
-                    new_width = int(new_height * aspect_ratio)
-                    frame = pygame.transform.scale(frame, (new_width, new_height))
-                    self.animation_frames.append(frame)
-            elif self.key_type == "key15":
-                
-                for i in range(48):  
-                    frame_path = os.path.join("assets", "items", f"Key 15 - GOLD - frame{i:04d}.png")
-                    frame = pygame.image.load(frame_path).convert_alpha()
-                    
-                    original_size = frame.get_size()
-                    aspect_ratio = original_size[0] / original_size[1]
-                    new_height = 32
-                    new_width = int(new_height * aspect_ratio)
-                    frame = pygame.transform.scale(frame, (new_width, new_height))
-                    self.animation_frames.append(frame)
+            self.animation_frames = get_atlas_frames(f"key/{self.key_type}", height=KEY_HEIGHT)
+            if not self.animation_frames:
+                self.animation_frames = load_key_frames(self.key_type)
         except:
             
             fallback = pygame.Surface((32, 32), pygame.SRCALPHA)
@@ -904,6 +1029,17 @@ class AnimatedKey:
         if -sprite_width <= screen_x <= SCREEN_WIDTH and -sprite_height <= screen_y <= SCREEN_HEIGHT:
             screen.blit(current_sprite, (screen_x, screen_y))
 
+    def get_sprites(self, camera):
+        """Спрайты для очереди отрисовки: (поверхность, мировые координаты)"""
+        if self.collected or not self.animation_frames:
+            return []
+        return [(self.animation_frames[self.current_frame], (self.x, self.y))]
+
+    def get_screen_rect(self, camera):
+        """Область экрана, занятая текущим кадром ключа"""
+        size = self.animation_frames[self.current_frame].get_size() if self.animation_frames else self.rect.size
+        return pygame.Rect(camera.apply(self.x, self.y), size)
+
 class Potion:
     def __init__(self, x, y, potion_type="red"):
         self.x = x
@@ -917,21 +1053,17 @@ class Potion:
         
         try:
             if self.potion_type == "red":
-                self.texture = pygame.image.load(os.path.join("assets", "items", "Red Potion.png")).convert_alpha()
+                texture_path = os.path.join("assets", "items", "Red Potion.png")
             elif self.potion_type == "green":
-                self.texture = pygame.image.load(os.path.join("assets", "items", "Green Potion.png")).convert_alpha()
+                texture_path = os.path.join("assets", "items", "Green Potion.png")
             elif self.potion_type == "blue":
-                self.texture = pygame.image.load(os.path.join("assets", "items", "Blue Potion.png")).convert_alpha()
+                texture_path = os.path.join("assets", "items", "Blue Potion.png")
             
-
-            original_size = self.texture.get_size()
-            aspect_ratio = original_size[0] / original_size[1]
-            new_height = 32
-            new_width = int(new_height * aspect_ratio)
-            self.texture = pygame.transform.scale(self.texture, (new_width, new_height))
+            # Масштабированная текстура общая для всех зелий одного цвета
+            self.texture = ASSET_CACHE.load_scaled_to_height(texture_path, 32)
             
             
-            self.rect = pygame.Rect(self.x, self.y, new_width, new_height)
+            self.rect = pygame.Rect(self.x, self.y, self.texture.get_width(), self.texture.get_height())
         except:
             self.texture = None
 
@@ -958,6 +1090,19 @@ class Potion:
             color = (255, 0, 0) if self.potion_type == "red" else (0, 255, 0) if self.potion_type == "green" else (0, 0, 255)
             pygame.draw.rect(screen, color, (screen_x, screen_y, 24, 32))
 
+    def get_sprites(self, camera):
+        """Спрайты для очереди отрисовки; None - зелье рисуется через draw"""
+        if self.collected:
+            return []
+        if not self.texture:
+            return None
+        return [(self.texture, (self.x, self.y))]
+
+    def get_screen_rect(self, camera):
+        """Область экрана, занятая зельем"""
+        size = self.texture.get_size() if self.texture else self.rect.size
+        return pygame.Rect(camera.apply(self.x, self.y), size)
+
 class Lamp:
     def __init__(self, x, y):
         self.x = x
@@ -970,8 +1115,7 @@ class Lamp:
     def load_texture(self):
         
         try:
-            self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "lamp.png")).convert_alpha()
-            self.texture = pygame.transform.scale(self.texture, (self.width, self.height))
+            self.texture = ASSET_CACHE.load_scaled(os.path.join(DECORATIONS_DIR, "lamp.png"), (self.width, self.height))
         except:
             self.texture = None
 
@@ -987,6 +1131,10 @@ class Lamp:
                 pygame.draw.circle(screen, (255, 255, 0), (screen_x + 4, screen_y + 20), 12)  # Свет
                 pygame.draw.circle(screen, (255, 255, 255), (screen_x + 4, screen_y + 20), 8)  # Лампа
 
+    def get_light(self):
+        """Свет фонаря: (x, y, радиус, цвет) в мировых координатах"""
+        return (self.x + self.width // 2, self.y + 16, LAMP_LIGHT_RADIUS, LAMP_LIGHT_COLOR)
+
 class Decoration:
     def __init__(self, x, y, decoration_type="grass"):
         self.x = x
@@ -1000,25 +1148,9 @@ class Decoration:
     def load_texture(self):
         
         try:
-            if self.decoration_type == "grass1":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "grass_1.png")).convert_alpha()
-            elif self.decoration_type == "grass2":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "grass_2.png")).convert_alpha()
-            elif self.decoration_type == "grass3":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "grass_3.png")).convert_alpha()
-            elif self.decoration_type == "rock1":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "rock_1.png")).convert_alpha()
-            elif self.decoration_type == "rock2":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "rock_2.png")).convert_alpha()
-            elif self.decoration_type == "rock3":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "rock_3.png")).convert_alpha()
-            elif self.decoration_type == "fence":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "fence_1.png")).convert_alpha()
-            elif self.decoration_type == "fence2":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "fence_2.png")).convert_alpha()
-            
-            
-            self.texture = pygame.transform.scale(self.texture, (self.width, self.height))
+            self.texture = ASSET_CACHE.load_scaled(
+                os.path.join(DECORATIONS_DIR, DECORATION_TEXTURES[self.decoration_type]),
+                (self.width, self.height))
         except:
             self.texture = None
 
@@ -1046,6 +1178,15 @@ class MovingPlatform(Platform):
         self.movement_type = movement_type  
         self.direction = 1  
         self.move_distance = 100  
+        self.prev_x, self.prev_y = x, y
+
+    def save_state(self):
+        """Запоминает положение перед шагом симуляции"""
+        self.prev_x, self.prev_y = self.x, self.y
+
+    def interpolate(self, alpha):
+        """Положение для отрисовки между двумя последними шагами"""
+        self.render_x, self.render_y = interpolate_position(self.prev_x, self.prev_y, self.x, self.y, alpha)
 
     def activate(self):
         
@@ -1106,19 +1247,35 @@ class MovingPlatform(Platform):
             self.rect.y = self.y
 
 class Game:
-    def __init__(self, host, is_host):
+    def __init__(self, host, is_host, render_mode=RENDER_MODE, render_fps=RENDER_FPS,
+                 headless=False, transport=None, input_source=None, sync_interval=SYNC_INTERVAL,
+                 interpolation_delay=INTERPOLATION_DELAY, session=None):
+        # Без окна и звука: для тестов, замеров и запуска на серверах сборки
+        self.headless = headless
+        if headless:
+            init_headless()
+        self.input = input_source or KeyboardInput()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("P2P Game")
+        # Все ресурсы уровня привязываются к его области в кэше
+        self.asset_scope = "level1"
+        ASSET_CACHE.set_scope(self.asset_scope)
         self.clock = pygame.time.Clock()
         self.camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.renderer = DirtyRectRenderer(self.screen, render_mode)
+        self.ui_state = None
+        self.scheduler = FixedStepScheduler()
+        self.sim_tick = 0  # Номер шага симуляции - время в снимках состояния
+        self.render_fps = render_fps
         
         # Настройка звука
-        try:
-            pygame.mixer.music.load(BACKGROUND_MUSIC)
-            pygame.mixer.music.set_volume(0.5)  # Устанавливаем громкость фоновой музыки
-            pygame.mixer.music.play(-1)  # -1 означает бесконечное воспроизведение
-        except Exception as e:
-            print(f"Ошибка инициализации звука: {e}")
+        if not headless:
+            try:
+                pygame.mixer.music.load(BACKGROUND_MUSIC)
+                pygame.mixer.music.set_volume(0.5)  # Устанавливаем громкость фоновой музыки
+                pygame.mixer.music.play(-1)  # -1 означает бесконечное воспроизведение
+            except Exception as e:
+                print(f"Ошибка инициализации звука: {e}")
         
         # Флаг для контроля состояния сокета
         self.socket_active = True
@@ -1126,7 +1283,8 @@ class Game:
         # Создаем фон и платформу
         self.background = self.create_background()
         self.platform = self.create_platform()
-        self.shadow = self.create_shadow()
+        # Затемнение сверху и свет фонарей накладываются одним проходом
+        self.lighting = LightingSystem(SCREEN_WIDTH, SCREEN_HEIGHT, SHADOW_HEIGHT, SHADOW_ALPHA)
         
         # Проверяем и создаем файл диалогов, если он отсутствует
         self.ensure_dialog_file_exists()
@@ -1164,17 +1322,29 @@ class Game:
         self.is_shutting_down = False
         
         # Настройка сети
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        if is_host:
-            self.socket.bind((host, 5000))
-            self.other_address = (host, 5001)
+        if transport is None:
+            self.socket, self.other_address = create_udp_socket(host, is_host)
         else:
-            self.socket.bind((host, 5001))
-            self.other_address = (host, 5000)
-
-        # Устанавливаем таймаут для сокета
-        self.socket.settimeout(0.1)
-
+            # Подставной транспорт (без сети или в памяти) вместо UDP-сокета
+            self.socket = transport
+            self.other_address = (host, CLIENT_PORT if is_host else HOST_PORT)
+
+        # Состояние игрока уходит как разница с последним подтвержденным снимком
+        # Свой номер сеанса: пакеты прошлой игры на этом адресе не смешиваются с новыми
+        # (воспроизведение записи передает сеанс записанной игры)
+        self.session = new_session() if session is None else session
+        self.snapshot_sender = SnapshotSender(WORLD_WIDTH, WORLD_HEIGHT, self.session)
+        self.snapshot_receiver = SnapshotReceiver(WORLD_WIDTH, WORLD_HEIGHT, self.session)
+        # Частота отправки состояния не зависит от частоты кадров
+        self.net_scheduler = NetworkScheduler(sync_interval)
+        # Второй игрок показывается по буферу снимков с задержкой интерполяции
+        self.remote_buffer = SnapshotBuffer(interpolation_delay)
+        # События диалога и подбора предметов идут по надежному каналу в том же
+        # сеансе, что и снимки (при воспроизведении - в сеансе записи)
+        self.reliable = ReliableChannel(self.session)
+        
+        # Принятые сообщения ждут в очереди до ближайшего кадра
+        self.incoming = queue.Queue()
         # Запуск потока для приема данных
         self.receive_thread = threading.Thread(target=self.receive_data, daemon=False)  # Делаем поток не демоном
         self.receive_thread.start()
@@ -1202,16 +1372,43 @@ class Game:
         self.collected_potions = 0
         self.moving_platforms = self.create_moving_platforms()
         
+        # Неподвижные платформы и декорации рисуются готовыми чанками
+        self.ground_layer = StaticLayerCache(self.platforms)
+        self.props_layer = StaticLayerCache(self.lamps + self.decorations)
+        
+        # Столкновения и сбор предметов проверяются через пространственный хэш
+        self.world = CollisionWorld(WORLD_WIDTH, WORLD_HEIGHT)
+        self.world.add_platforms(self.platforms)
+        self.world.add_moving_platforms(self.moving_platforms)
+        self.world.add_items("keys", self.animated_keys)
+        self.world.add_items("potions", self.potions)
+        self.my_player.world = self.world
+        self.other_player.world = self.world
+        
+        # Остальные объекты мира рисуются через очередь с отсечением по сетке
+        self.render_queue = RenderQueue(WORLD_WIDTH, WORLD_HEIGHT)
+        for platform in self.moving_platforms:
+            self.render_queue.add(platform, LAYER_PLATFORMS)
+        for collectible in self.animated_keys + self.potions:
+            self.render_queue.add(collectible, LAYER_ITEMS)
+        for sign in self.signs:
+            self.render_queue.add(sign, LAYER_SIGNS)
+        
         # Состояние финала
         self.victory_achieved = False
         self.victory_timer = 0
         self.victory_duration = 5.0  # 5 секунд показа финального экрана
+        # Заставка победы готовится заранее, чтобы финал не создавал поверхности каждый кадр
+        self.victory_screen = VictoryScreen((SCREEN_WIDTH, SCREEN_HEIGHT), "Добро пожаловать в страну чудес!",
+                                            image=self.smile_image)
         
         # Если мы хост, инициируем первый диалог после небольшой задержки
         if is_host:
             self.initial_dialog_timer = 2.0  # 2 секунды задержки
         else:
             self.initial_dialog_timer = None
+        
+        ASSET_CACHE.set_scope("global")
 
     def ensure_dialog_file_exists(self):
         """Проверяет наличие файла диалогов и создает его, если отсутствует"""
@@ -1263,19 +1460,6 @@ class Game:
             except Exception as e:
                 print(f"Ошибка при создании файла диалогов: {e}")
 
-    def create_shadow(self):
-        """Создает градиент затемнения сверху"""
-        shadow = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        
-        # Создаем градиент от темного к прозрачному
-        for y in range(SHADOW_HEIGHT):
-            # Нелинейный градиент для более плавного перехода
-            progress = y / SHADOW_HEIGHT
-            alpha = int(SHADOW_ALPHA * (1 - progress * progress))
-            pygame.draw.line(shadow, (0, 0, 0, alpha), (0, y), (SCREEN_WIDTH, y))
-            
-        return shadow
-
     def create_platform(self):
         """Создает платформу для ходьбы"""
         platform = pygame.Surface((SCREEN_WIDTH, PLATFORM_HEIGHT))
@@ -1296,7 +1480,7 @@ class Game:
 
     def create_background(self):
         """Создает многослойный фон пещеры с параллаксом"""
-        backgrounds = {}
+        layers = []
         
         try:
             # Загружаем 4 слоя фона пещеры с правильными именами
@@ -1306,10 +1490,8 @@ class Game:
             bg4 = pygame.image.load(os.path.join("assets", "tiles", "background_caves  4.png")).convert_alpha()
             
             # Масштабируем фоны под размер экрана
-            backgrounds['layer1'] = pygame.transform.scale(bg1, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            backgrounds['layer2'] = pygame.transform.scale(bg2, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            backgrounds['layer3'] = pygame.transform.scale(bg3, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            backgrounds['layer4'] = pygame.transform.scale(bg4, (SCREEN_WIDTH, SCREEN_HEIGHT))
+            for bg in (bg1, bg2, bg3, bg4):
+                layers.append(pygame.transform.scale(bg, (SCREEN_WIDTH, SCREEN_HEIGHT)))
             
         except Exception as e:
             print(f"Ошибка загрузки фона: {e}")
@@ -1321,12 +1503,11 @@ class Game:
                 color = (color_value, color_value - 10, color_value - 5)
                 pygame.draw.line(background, color, (0, y), (SCREEN_WIDTH, y))
             
-            backgrounds['layer1'] = background
-            backgrounds['layer2'] = background.copy()
-            backgrounds['layer3'] = background.copy()
-            backgrounds['layer4'] = background.copy()
+            # Непрозрачные копии градиента перекрывают друг друга - виден только ближний слой
+            return ParallaxBackground([(background, PARALLAX_FACTORS[3])], (SCREEN_WIDTH, SCREEN_HEIGHT))
         
-        return backgrounds
+        # Слои идут от дальнего к ближнему
+        return ParallaxBackground(list(zip(layers, PARALLAX_FACTORS)), (SCREEN_WIDTH, SCREEN_HEIGHT))
 
     def create_platforms(self):
         """Создает платформы и препятствия для кооперативного прохождения"""
@@ -1505,48 +1686,11 @@ class Game:
         """Отрисовывает экран победы"""
         if not self.victory_achieved:
             return
-            
-        # Белый фон с плавным появлением
-        white_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        white_surface.fill((255, 255, 255))
-        white_alpha = min(255, int(self.victory_timer * 255))  # Плавное появление белого
-        white_surface.set_alpha(white_alpha)
-        screen.blit(white_surface, (0, 0))
-        
-        # Текст победы (черный, с анимацией печатания)
-        if self.victory_timer > 1:  # Текст появляется через секунду
-            try:
-                font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 48)
-            except:
-                font = pygame.font.Font(None, 48)
-            
-            full_text = "Добро пожаловать в страну чудес!"
-            # Анимация печатания текста
-            text_progress = min(1.0, (self.victory_timer - 1) * 0.5)  # Полное появление за 2 секунды
-            visible_chars = int(len(full_text) * text_progress)
-            current_text = full_text[:visible_chars]
-            
-            if current_text:  # Проверяем, что текст не пустой
-                text = font.render(current_text, True, (0, 0, 0))  # Черный текст
-                text_rect = text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
-                screen.blit(text, text_rect)
-        
-        # Улыбка появляется после завершения анимации текста
-        if self.victory_timer > 4 and self.smile_image:  # Улыбка появляется через 4 секунды
-            smile_alpha = min(255, int((self.victory_timer - 4) * 255))  # Плавное появление
-            
-            # Картинка на весь экран
-            scaled_image = pygame.transform.scale(self.smile_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            
-            # Создаем временную поверхность для правильного наложения прозрачности
-            temp_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            temp_surface.blit(scaled_image, (0, 0))
-            temp_surface.set_alpha(smile_alpha)
-            screen.blit(temp_surface, (0, 0))
+        self.victory_screen.draw(screen, self.victory_timer)
 
     def check_platform_activation(self):
         """Проверяет активацию подвижных платформ"""
-        triggered_platforms = self.my_player.check_platform_triggers(self.platforms)
+        triggered_platforms = self.my_player.check_platform_triggers(self.world.platforms_in(self.my_player.get_rect()))
         
         for platform in triggered_platforms:
             # Когда Алиса становится на платформу, активируем соответствующую подвижную платформу
@@ -1576,15 +1720,6 @@ class Game:
         # Если это конец диалога
         if next_dialog == "end":
             self.end_dialog()
-            # Отправляем сообщение о завершении диалога
-            try:
-                data = pickle.dumps({
-                    "type": "dialog_end",
-                    "dialog_state": self.dialog_state
-                })
-                self.socket.sendto(data, self.other_address)
-            except Exception as e:
-                print(f"Ошибка при отправке завершения диалога: {e}")
             return
 
         # Переход к следующему диалогу
@@ -1597,14 +1732,10 @@ class Game:
             self.dialog_state["is_active"] = True
             
             # Отправляем обновление состояния диалога
-            try:
-                data = pickle.dumps({
-                    "type": "dialog_update",
-                    "dialog_state": self.dialog_state
-                })
-                self.socket.sendto(data, self.other_address)
-            except Exception as e:
-                print(f"Ошибка при отправке обновления диалога: {e}")
+            self.send_reliable({
+                "type": "dialog_update",
+                "dialog_state": self.dialog_state
+            })
             
             # Запускаем новый диалог
             self.dialog_system.reset_state()
@@ -1624,89 +1755,167 @@ class Game:
                 if not data:
                     continue
                     
-                received_data = pickle.loads(data)
-                
-                # Обработка сообщений о подключении
-                if received_data.get("type") == "dialog_update":
-                    dialog_state = received_data.get("dialog_state")
-                    if dialog_state:
-                        self.dialog_state.update(dialog_state)
-                        if dialog_state.get("current_dialog_id"):
-                            self.dialog_system.start_dialog(
-                                dialog_state["current_dialog_id"],
-                                self.my_player.character_name
-                            )
-                
-                elif received_data.get("type") == "dialog_end":
-                    self.dialog_system.complete_dialog()
-                    self.dialog_state["is_active"] = False
-                    self.dialog_state["current_dialog_id"] = None
-                    self.dialog_state["current_speaker"] = None
-                    self.dialog_state["dialog_completed"] = True
-                
-                else:
-                    # Обработка обычных игровых данных
-                    if "player" in received_data:
-                        player_data = received_data["player"]
-                        self.other_player.x = player_data["x"]
-                        self.other_player.y = player_data["y"]
-                        self.other_player.facing_right = player_data["facing_right"]
-                        self.other_player.moving = player_data["moving"]
-                    
-                    if "collected_keys" in received_data:
-                        for key_index in received_data["collected_keys"]:
-                            if key_index < len(self.animated_keys):
-                                self.animated_keys[key_index].collected = True
-                    
-                    if "collected_potions" in received_data:
-                        for potion_index in received_data["collected_potions"]:
-                            if potion_index < len(self.potions):
-                                self.potions[potion_index].collected = True
-                    
-                    if "counters" in received_data:
-                        counters = received_data["counters"]
-                        if counters["keys"] > self.collected_keys:
-                            self.collected_keys = counters["keys"]
-                        if counters["potions"] > self.collected_potions:
-                            self.collected_potions = counters["potions"]
+                # Сообщения применяются в игровом цикле, между шагами симуляции
+                self.incoming.put(data)
                 
             except:
                 if not self.socket_active or self.is_shutting_down:
                     break
                 continue
 
+    def receive_messages(self):
+        """Забирает сообщения, принятые потоком приема с прошлого кадра"""
+        messages = []
+        while True:
+            try:
+                messages.append(self.incoming.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def handle_message(self, data):
+        """Применяет одно сообщение от другого игрока"""
+        try:
+            received_data = decode_message(data)
+            
+            # Обработка сообщений о подключении
+            if received_data.get("type") == "dialog_update":
+                dialog_state = received_data.get("dialog_state")
+                if dialog_state:
+                    self.dialog_state.update(dialog_state)
+                    if dialog_state.get("current_dialog_id"):
+                        self.dialog_system.start_dialog(
+                            dialog_state["current_dialog_id"],
+                            self.my_player.character_name
+                        )
+            
+            elif received_data.get("type") == "dialog_end":
+                self.dialog_system.complete_dialog()
+                self.dialog_state["is_active"] = False
+                self.dialog_state["current_dialog_id"] = None
+                self.dialog_state["current_speaker"] = None
+                self.dialog_state["dialog_completed"] = True
+            
+            elif received_data.get("type") == "pickup":
+                self.apply_pickup(received_data)
+            
+            elif received_data.get("type") == "reliable":
+                # События надежного канала применяются по порядку, ровно один раз
+                for payload in self.reliable.receive(received_data):
+                    self.handle_message(payload)
+                # Подтверждение уйдет со снимком состояния в этом же кадре,
+                # в том числе на повтор: прошлое подтверждение могло потеряться
+                self.net_scheduler.request_send()
+            
+            elif received_data.get("type") == "snapshot":
+                self.snapshot_sender.acknowledge(received_data["ack"], received_data["peer_session"])
+                self.reliable.acknowledge(received_data["reliable_ack"], received_data["peer_session"])
+                peer_session = self.snapshot_receiver.peer_session
+                game_state = self.snapshot_receiver.receive(received_data)
+                if self.snapshot_receiver.peer_session != peer_session:
+                    # Новая игра второго игрока: прежняя шкала времени снимков не годится
+                    self.remote_buffer.reset()
+                if game_state is not None:
+                    self.apply_game_state(game_state)
+            
+            else:
+                self.apply_game_state(received_data)
+        except Exception as e:
+            print(f"Ошибка обработки сообщения: {e}")
+
+    def apply_game_state(self, game_state):
+        """Применяет состояние второго игрока: позицию и собранные предметы"""
+        if "player" in game_state:
+            if "tick" in game_state:
+                # Позиция из снимка применяется с задержкой в update_remote_player
+                self.remote_buffer.push(game_state["tick"] * self.scheduler.step,
+                                        self.sim_tick * self.scheduler.step, game_state["player"])
+            else:
+                self.apply_remote_pose(game_state["player"])
+        
+        if "collected_keys" in game_state:
+            for key_index in game_state["collected_keys"]:
+                if key_index < len(self.animated_keys):
+                    self.animated_keys[key_index].collected = True
+        
+        if "collected_potions" in game_state:
+            for potion_index in game_state["collected_potions"]:
+                if potion_index < len(self.potions):
+                    self.potions[potion_index].collected = True
+        
+        if "counters" in game_state:
+            counters = game_state["counters"]
+            if counters["keys"] > self.collected_keys:
+                self.collected_keys = counters["keys"]
+            if counters["potions"] > self.collected_potions:
+                self.collected_potions = counters["potions"]
+
+    def apply_pickup(self, pickup):
+        """Второй игрок подобрал предмет"""
+        items = self.animated_keys if pickup["kind"] == "key" else self.potions
+        index = pickup["index"]
+        if index >= len(items) or items[index].collected:
+            return
+        items[index].collected = True
+        if pickup["kind"] == "key":
+            self.collected_keys += 1
+        else:
+            self.collected_potions += 1
+
+    def apply_remote_pose(self, player_data):
+        """Ставит второго игрока в позу из состояния"""
+        self.other_player.x = player_data["x"]
+        self.other_player.y = player_data["y"]
+        self.other_player.facing_right = player_data["facing_right"]
+        self.other_player.moving = player_data["moving"]
+
+    def update_remote_player(self):
+        """Шаг второго игрока: поза из буфера снимков на момент с задержкой"""
+        pose = self.remote_buffer.sample(self.sim_tick * self.scheduler.step)
+        if pose is None:
+            # Снимков еще не было - второй игрок просто падает на платформы
+            self.other_player.update()
+            return
+        self.apply_remote_pose(pose)
+
+    def send_reliable(self, message):
+        """Отправка события по надежному каналу: дойдет один раз и по порядку"""
+        try:
+            data = self.reliable.send(message)
+            if self.socket_active:
+                self.socket.sendto(data, self.other_address)
+        except Exception as e:
+            # Событие осталось в канале и уйдет повтором
+            print(f"Ошибка при отправке события: {e}")
+
+    def resend_reliable(self, dt):
+        """Повтор событий, не подтвержденных дольше таймаута"""
+        try:
+            for data in self.reliable.update(dt):
+                self.socket.sendto(data, self.other_address)
+        except socket.error:
+            self.socket_active = False
+        except Exception as e:
+            print(f"Ошибка повтора событий: {e}")
+
     def send_data(self):
         """Отправка данных другому игроку"""
         if not self.socket_active:  # Проверяем флаг перед отправкой
             return
             
         try:
-            # Собираем данные о собранных предметах
-            collected_keys_data = []
-            for i, key in enumerate(self.animated_keys):
-                if key.collected:
-                    collected_keys_data.append(i)
-            
-            collected_potions_data = []
-            for i, potion in enumerate(self.potions):
-                if potion.collected:
-                    collected_potions_data.append(i)
-            
-            data = pickle.dumps({
-                "type": "game_state",
+            game_state = {
                 "player": {
                     "x": self.my_player.x,
                     "y": self.my_player.y,
                     "facing_right": self.my_player.facing_right,
                     "moving": self.my_player.moving
-                },
-                "collected_keys": collected_keys_data,
-                "collected_potions": collected_potions_data,
-                "counters": {
-                    "keys": self.collected_keys,
-                    "potions": self.collected_potions
                 }
-            })
+            }
+            # В пакет попадают только поля, изменившиеся с подтвержденного снимка
+            message = self.snapshot_sender.build(game_state, self.snapshot_receiver.latest, self.sim_tick,
+                                                 self.snapshot_receiver.peer_session)
+            message["reliable_ack"] = self.reliable.ack_for(message["peer_session"])
+            data = encode_message(message)
             if self.socket_active:  # Дополнительная проверка перед отправкой
                 self.socket.sendto(data, self.other_address)
         except socket.error:
@@ -1745,15 +1954,40 @@ class Game:
                 self.receive_thread.join(timeout=2.0)  # Увеличиваем таймаут до 2 секунд
             except:
                 pass
+        
+        # Выгружаем ресурсы уровня
+        ASSET_CACHE.release(self.asset_scope)
 
-    def run(self):
+    def run(self, max_ticks=None, recorder=None):
+        """Игровой цикл; max_ticks - ограничение числа проходов (для прогонов без игрока),
+        recorder - ReplayRecorder для записи ввода каждого тика"""
         running = True
         last_time = time.time()
+        ticks = 0
         try:
             while running:
-                current_time = time.time()
-                dt = current_time - last_time
-                last_time = current_time
+                if max_ticks is not None and ticks >= max_ticks:
+                    break
+                ticks += 1
+                
+                if self.headless:
+                    # Без вывода кадров каждый проход цикла - ровно один шаг симуляции
+                    dt = self.scheduler.step
+                else:
+                    current_time = time.time()
+                    dt = current_time - last_time
+                    last_time = current_time
+                
+                # Ввод тика: события, клавиши, время кадра и сообщения сети
+                events = self.input.get_events()
+                keys = self.input.get_pressed()
+                dt = self.input.get_dt(dt)
+                messages = self.input.get_messages(self.receive_messages())
+                self.input.check_state(self)
+                if recorder is not None:
+                    recorder.record_tick(self, dt, keys, events, messages)
+                for data in messages:
+                    self.handle_message(data)
                 
                 # Обработка начального диалога для хоста
                 if self.is_host and self.initial_dialog_timer is not None:
@@ -1762,10 +1996,7 @@ class Game:
                         self.initial_dialog_timer = None
                         self.start_dialog("start")
 
-                # Получаем состояние клавиш
-                keys = pygame.key.get_pressed()
-
-                for event in pygame.event.get():
+                for event in events:
                     if event.type == pygame.QUIT:
                         running = False
                         self.is_shutting_down = True
@@ -1779,57 +2010,12 @@ class Game:
                 if not running:
                     break
 
-                # Проверяем, есть ли активный диалог, блокирующий движение
-                allow_movement = not self.dialog_system.is_active
-
-                # Обрабатываем нажатия клавиш
-                if allow_movement:
-                    if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-                        self.my_player.move(-1)
-                    elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-                        self.my_player.move(1)
-                    else:
-                        self.my_player.move(0)
-                else:
-                    self.my_player.move(0)
-
-                # Обновления игры...
-                self.my_player._platforms = self.platforms + self.moving_platforms
-                self.other_player._platforms = self.platforms + self.moving_platforms
-                
-                self.my_player.update(self.platforms + self.moving_platforms)
-                self.other_player.update(self.platforms + self.moving_platforms)
-                
-                for key in self.animated_keys:
-                    key.update(dt)
-                
-                for platform in self.moving_platforms:
-                    platform.update()
-                
-                for sign in self.signs:
-                    sign.update([self.my_player, self.other_player])
-                
-                collected = self.my_player.check_collectibles(self.animated_keys)
-                if collected:
-                    self.collected_keys += len(collected)
-                
-                collected = self.my_player.check_collectibles(self.potions)
-                if collected:
-                    self.collected_potions += len(collected)
-                
-                self.check_platform_activation()
-                self.check_victory_condition()
-                
-                if self.initial_dialog_timer is None:
-                    self.check_dialog_trigger()
-                
-                next_x = self.my_player.x
-                next_y = self.my_player.y
-                if keys[pygame.K_LEFT]:
-                    next_x -= self.my_player.move_speed * 5
-                elif keys[pygame.K_RIGHT]:
-                    next_x += self.my_player.move_speed * 5
-                self.camera.update(next_x, next_y)
+                # Мир обновляется фиксированными шагами независимо от частоты кадров
+                for _ in range(self.scheduler.advance(dt)):
+                    self.save_interpolation_state()
+                    self.update_world(keys, self.scheduler.step)
+                # Кадр рисуется между двумя последними шагами симуляции
+                self.interpolate(self.scheduler.alpha)
                 
                 self.dialog_system.update(dt)
                 
@@ -1839,42 +2025,20 @@ class Game:
                         running = False
                         break
             
-                if self.socket_active:
+                if self.socket_active and self.net_scheduler.should_send(dt, self.my_player.get_pose()):
                     self.send_data()
-            
-                # Отрисовка
-                self.draw_background_with_parallax(self.screen)
-                platform_y = SCREEN_HEIGHT - PLATFORM_HEIGHT
-                self.screen.blit(self.platform, (0, platform_y))
-                
-                for platform in self.platforms:
-                    platform.draw(self.screen, self.camera)
-                for platform in self.moving_platforms:
-                    platform.draw(self.screen, self.camera)
-                for collectible in self.animated_keys:
-                    collectible.draw(self.screen, self.camera)
-                for collectible in self.potions:
-                    collectible.draw(self.screen, self.camera)
-                for lamp in self.lamps:
-                    lamp.draw(self.screen, self.camera)
-                for decoration in self.decorations:
-                    decoration.draw(self.screen, self.camera)
-                for sign in self.signs:
-                    sign.draw(self.screen, self.camera)
-                
-                alice = self.my_player if self.my_player.character_name == "alice" else self.other_player
-                rabbit = self.other_player if self.my_player.character_name == "alice" else self.my_player
-                
-                rabbit.draw(self.screen, self.camera)
-                alice.draw(self.screen, self.camera)
-                
-                self.screen.blit(self.shadow, (0, 0))
-                self.dialog_system.draw(self.screen, self.my_player.character_name)
-                self.draw_ui(self.screen)
-                self.draw_victory_screen(self.screen)
-            
-                pygame.display.flip()
-                self.clock.tick(60)
+                if self.socket_active:
+                    self.resend_reliable(dt)
+            
+                # Отрисовка (без окна кадры не выводятся)
+                if not self.headless:
+                    self.renderer.begin_frame(self.get_view_state())
+                    if self.victory_achieved:
+                        self.renderer.invalidate()
+                    if self.renderer.mode == RENDER_MODE_DIRTY:
+                        self.renderer.mark_all(self.get_dirty_rects())
+                    self.renderer.render(self.draw_scene)
+                    self.clock.tick(self.render_fps)
         
         except Exception as e:
             print(f"Ошибка в игровом цикле: {e}")
@@ -1883,6 +2047,128 @@ class Game:
             self.close()
             return self.victory_achieved  # Возвращаем флаг победы
 
+    def update_world(self, keys, step):
+        """Один шаг симуляции мира длиной step секунд"""
+        self.sim_tick += 1
+        # Проверяем, есть ли активный диалог, блокирующий движение
+        allow_movement = not self.dialog_system.is_active
+
+        # Обрабатываем нажатия клавиш
+        if allow_movement:
+            if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+                self.my_player.move(-1)
+            elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+                self.my_player.move(1)
+            else:
+                self.my_player.move(0)
+        else:
+            self.my_player.move(0)
+
+        # Обновления игры...
+        self.my_player.update()
+        self.update_remote_player()
+        
+        for key in self.animated_keys:
+            key.update(step)
+        
+        for platform in self.moving_platforms:
+            platform.update()
+            self.render_queue.move(platform)
+        self.world.update_moving()
+        
+        for sign in self.signs:
+            sign.update([self.my_player, self.other_player])
+        
+        collected = self.my_player.check_collectibles(self.world.items_in("keys", self.my_player.get_rect()))
+        self.collected_keys += len(collected)
+        for key in collected:
+            self.send_reliable({"type": "pickup", "kind": "key", "index": self.animated_keys.index(key)})
+        
+        collected = self.my_player.check_collectibles(self.world.items_in("potions", self.my_player.get_rect()))
+        self.collected_potions += len(collected)
+        for potion in collected:
+            self.send_reliable({"type": "pickup", "kind": "potion", "index": self.potions.index(potion)})
+        
+        self.check_platform_activation()
+        self.check_victory_condition()
+        
+        if self.initial_dialog_timer is None:
+            self.check_dialog_trigger()
+        
+        next_x = self.my_player.x
+        next_y = self.my_player.y
+        if keys[pygame.K_LEFT]:
+            next_x -= self.my_player.move_speed * 5
+        elif keys[pygame.K_RIGHT]:
+            next_x += self.my_player.move_speed * 5
+        self.camera.update(next_x, next_y)
+
+    def save_interpolation_state(self):
+        """Запоминает положения перед шагом симуляции для сглаживания отрисовки"""
+        self.my_player.save_state()
+        self.other_player.save_state()
+        for platform in self.moving_platforms:
+            platform.save_state()
+        self.camera.save_state()
+
+    def interpolate(self, alpha):
+        """Положения для отрисовки между двумя последними шагами симуляции"""
+        self.my_player.interpolate(alpha)
+        self.other_player.interpolate(alpha)
+        for platform in self.moving_platforms:
+            platform.interpolate(alpha)
+        self.camera.interpolate(alpha)
+
+    def draw_scene(self, screen):
+        """Рисует весь кадр: фон, мир, персонажей и интерфейс"""
+        # Когда заставка победы закрыла экран, сцену под ней не рисуем
+        if self.victory_achieved and self.victory_screen.is_opaque(self.victory_timer):
+            self.draw_victory_screen(screen)
+            return
+        
+        self.draw_background_with_parallax(screen)
+        platform_y = SCREEN_HEIGHT - PLATFORM_HEIGHT
+        screen.blit(self.platform, (0, platform_y))
+        
+        self.render_queue.begin(self.camera)
+        self.render_queue.submit(self.ground_layer, LAYER_GROUND)
+        self.render_queue.submit(self.props_layer, LAYER_PROPS)
+        
+        alice = self.my_player if self.my_player.character_name == "alice" else self.other_player
+        rabbit = self.other_player if self.my_player.character_name == "alice" else self.my_player
+        
+        self.render_queue.submit(rabbit, LAYER_CHARACTERS)
+        self.render_queue.submit(alice, LAYER_CHARACTERS)
+        self.render_queue.draw(screen, self.camera)
+        
+        self.lighting.draw(screen, self.camera, self.get_lights())
+        self.dialog_system.draw(screen, self.my_player.character_name)
+        self.draw_ui(screen)
+        self.draw_victory_screen(screen)
+
+    def get_lights(self):
+        """Источники света: фонари и знаки"""
+        return [obj.get_light() for obj in self.lamps + self.signs]
+
+    def get_view_state(self):
+        """Смещение мира и слоев фона; при его изменении кадр перерисовывается целиком"""
+        return (self.camera.apply(0, 0),) + self.background.get_offsets(self.camera.scroll_x)
+
+    def get_dirty_rects(self):
+        """Области экрана, которые могли измениться с прошлого кадра"""
+        rects = [self.my_player.get_screen_rect(self.camera), self.other_player.get_screen_rect(self.camera)]
+        for obj in self.moving_platforms + self.animated_keys + self.potions + self.signs:
+            rects.append(obj.get_screen_rect(self.camera))
+        rects.extend(self.dialog_system.get_dirty_rects())
+        
+        # Интерфейс перерисовываем только при изменении счетчиков
+        ui_state = (self.dialog_system.dialog_completed, self.collected_keys, self.collected_potions)
+        if ui_state != self.ui_state:
+            self.ui_state = ui_state
+            rects.append(pygame.Rect(0, 0, SCREEN_WIDTH, 60))
+            rects.append(pygame.Rect(0, SCREEN_HEIGHT - 30, SCREEN_WIDTH, 30))
+        return rects
+
     def handle_input(self, event):
         """Обработка ввода для диалогов"""
         if not self.dialog_system.is_active:
@@ -1917,14 +2203,10 @@ class Game:
             self.dialog_state["current_speaker"] = "alice"
             
             # Отправляем сообщение о начале диалога
-            try:
-                data = pickle.dumps({
-                    "type": "dialog_update",
-                    "dialog_state": self.dialog_state
-                })
-                self.socket.sendto(data, self.other_address)
-            except Exception as e:
-                print(f"Ошибка при отправке начала диалога: {e}")
+            self.send_reliable({
+                "type": "dialog_update",
+                "dialog_state": self.dialog_state
+            })
 
     def end_dialog(self):
         """Завершение диалога"""
@@ -1936,14 +2218,10 @@ class Game:
         self.dialog_state["dialog_completed"] = True
         
         # Отправляем сообщение о завершении диалога
-        try:
-            data = pickle.dumps({
-                "type": "dialog_end",
-                "dialog_state": self.dialog_state
-            })
-            self.socket.sendto(data, self.other_address)
-        except Exception as e:
-            print(f"Ошибка при отправке завершения диалога: {e}")
+        self.send_reliable({
+            "type": "dialog_end",
+            "dialog_state": self.dialog_state
+        })
 
     def draw_ui(self, screen):
         """Отрисовка пользовательского интерфейса"""
@@ -1951,66 +2229,26 @@ class Game:
         if not self.dialog_system.dialog_completed:
             return
             
-        # Используем пиксельный шрифт
-        try:
-            pixel_font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 20)
-        except:
-            # Fallback на системный шрифт
-            pixel_font = pygame.font.Font(None, 20)
-        
+        # Надписи берутся из кэша и перерисовываются только при изменении значений
         # Показываем количество собранных ключей
-        keys_text = pixel_font.render(f"Ключи: {self.collected_keys}/3", True, (255, 255, 255))
+        keys_text = render_text(f"Ключи: {self.collected_keys}/3", 20, (255, 255, 255))
         screen.blit(keys_text, (10, 10))
         
         # Показываем количество собранных зелий
-        potions_text = pixel_font.render(f"Зелья: {self.collected_potions}/3", True, (255, 255, 255))
+        potions_text = render_text(f"Зелья: {self.collected_potions}/3", 20, (255, 255, 255))
         screen.blit(potions_text, (10, 35))
         
         # Показываем прогресс и подсказки
         if self.collected_keys == 3 and self.collected_potions == 3:
-            victory_text = pixel_font.render("Все предметы собраны! Найдите выход из сада!", True, (0, 255, 0))
+            victory_text = render_text("Все предметы собраны! Найдите выход из сада!", 20, (0, 255, 0))
             screen.blit(victory_text, (10, SCREEN_HEIGHT - 30))
         else:
-            hint_text = pixel_font.render("Соберите все предметы, чтобы активировать выход!", True, (255, 200, 0))
+            hint_text = render_text("Соберите все предметы, чтобы активировать выход!", 20, (255, 200, 0))
             screen.blit(hint_text, (10, SCREEN_HEIGHT - 30))
 
     def draw_background_with_parallax(self, screen):
         """Отрисовывает многослойный фон с эффектом параллакса"""
-        # Вычисляем смещение для параллакса
-        parallax_factor_1 = 0.1  # Самый дальний слой
-        parallax_factor_2 = 0.3
-        parallax_factor_3 = 0.5
-        parallax_factor_4 = 0.7  # Ближайший слой
-        
-        # Вычисляем смещения
-        offset_1 = int(self.camera.scroll_x * parallax_factor_1)
-        offset_2 = int(self.camera.scroll_x * parallax_factor_2)
-        offset_3 = int(self.camera.scroll_x * parallax_factor_3)
-        offset_4 = int(self.camera.scroll_x * parallax_factor_4)
-        
-        # Заполняем экран черным цветом как базовый фон
-        screen.fill((0, 0, 0))
-        
-        # Отрисовываем слои с параллаксом, если они доступны
-        if 'layer1' in self.background:
-            screen.blit(self.background['layer1'], (-offset_1, 0))
-            if offset_1 > 0:
-                screen.blit(self.background['layer1'], (SCREEN_WIDTH - offset_1, 0))
-        
-        if 'layer2' in self.background:
-            screen.blit(self.background['layer2'], (-offset_2, 0))
-            if offset_2 > 0:
-                screen.blit(self.background['layer2'], (SCREEN_WIDTH - offset_2, 0))
-        
-        if 'layer3' in self.background:
-            screen.blit(self.background['layer3'], (-offset_3, 0))
-            if offset_3 > 0:
-                screen.blit(self.background['layer3'], (SCREEN_WIDTH - offset_3, 0))
-        
-        if 'layer4' in self.background:
-            screen.blit(self.background['layer4'], (-offset_4, 0))
-            if offset_4 > 0:
-                screen.blit(self.background['layer4'], (SCREEN_WIDTH - offset_4, 0))
+        self.background.draw(screen, self.camera.scroll_x)
 
 class Flag:
     def __init__(self, x, y, flag_type="top"):
@@ -2023,22 +2261,9 @@ class Flag:
         self.load_texture()
 
     def load_texture(self):
-        """Загружает текстуру флага"""
+        """Загружает текстуру флага (общую для всех флагов одного типа)"""
         try:
-            # Используем текстуру лампы как основу для флага
-            self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "lamp.png")).convert_alpha()
-            self.texture = pygame.transform.scale(self.texture, (self.width, self.height))
-            
-            # Создаем флаг поверх лампы
-            flag_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
-            flag_surface.blit(self.texture, (0, 0))
-            
-            # Добавляем флаг
-            flag_color = (255, 0, 0) if self.flag_type == "top" else (0, 0, 255)
-            pygame.draw.rect(flag_surface, flag_color, (self.width//2, 5, 20, 15))
-            pygame.draw.polygon(flag_surface, flag_color, [(self.width//2 + 20, 5), (self.width//2 + 20, 12), (self.width//2 + 25, 10)])
-            
-            self.texture = flag_surface
+            self.texture = get_prop_sprite(("flag", self.flag_type, self.width, self.height), self.build_texture)
         except:
             # Fallback - простой флаг
             self.texture = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
@@ -2046,6 +2271,22 @@ class Flag:
             flag_color = (255, 0, 0) if self.flag_type == "top" else (0, 0, 255)
             pygame.draw.rect(self.texture, flag_color, (self.width//2, 5, 20, 15))
 
+    def build_texture(self):
+        """Собирает флаг поверх текстуры лампы"""
+        # Используем текстуру лампы как основу для флага
+        lamp_texture = ASSET_CACHE.load_scaled(os.path.join(DECORATIONS_DIR, "lamp.png"), (self.width, self.height))
+        
+        # Создаем флаг поверх лампы
+        flag_surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        flag_surface.blit(lamp_texture, (0, 0))
+        
+        # Добавляем флаг
+        flag_color = (255, 0, 0) if self.flag_type == "top" else (0, 0, 255)
+        pygame.draw.rect(flag_surface, flag_color, (self.width//2, 5, 20, 15))
+        pygame.draw.polygon(flag_surface, flag_color, [(self.width//2 + 20, 5), (self.width//2 + 20, 12), (self.width//2 + 25, 10)])
+        
+        return flag_surface
+
     def draw(self, screen, camera):
         """Отрисовка флага"""
         screen_x, screen_y = camera.apply(self.x, self.y)
@@ -2065,25 +2306,9 @@ class Decoration:
     def load_texture(self):
         """Загружает текстуру декорации"""
         try:
-            if self.decoration_type == "grass1":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "grass_1.png")).convert_alpha()
-            elif self.decoration_type == "grass2":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "grass_2.png")).convert_alpha()
-            elif self.decoration_type == "grass3":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "grass_3.png")).convert_alpha()
-            elif self.decoration_type == "rock1":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "rock_1.png")).convert_alpha()
-            elif self.decoration_type == "rock2":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "rock_2.png")).convert_alpha()
-            elif self.decoration_type == "rock3":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "rock_3.png")).convert_alpha()
-            elif self.decoration_type == "fence":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "fence_1.png")).convert_alpha()
-            elif self.decoration_type == "fence2":
-                self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "fence_2.png")).convert_alpha()
-            
-            # Масштабируем декорацию
-            self.texture = pygame.transform.scale(self.texture, (self.width, self.height))
+            self.texture = ASSET_CACHE.load_scaled(
+                os.path.join(DECORATIONS_DIR, DECORATION_TEXTURES[self.decoration_type]),
+                (self.width, self.height))
         except:
             self.texture = None
 
@@ -2140,8 +2365,7 @@ class Sign:
     def load_texture(self):
         """Загружает текстуру знака"""
         try:
-            self.texture = pygame.image.load(os.path.join("assets", "tiles", "oak_woods_v1.0", "decorations", "sign.png")).convert_alpha()
-            self.texture = pygame.transform.scale(self.texture, (self.width, self.height))
+            self.texture = ASSET_CACHE.load_scaled(os.path.join(DECORATIONS_DIR, "sign.png"), (self.width, self.height))
         except:
             # Fallback - простой знак
             self.texture = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
@@ -2150,6 +2374,10 @@ class Sign:
             # Табличка
             pygame.draw.rect(self.texture, (160, 82, 45), (4, 8, 24, 16))
             pygame.draw.rect(self.texture, (0, 0, 0), (4, 8, 24, 16), 2)
+        
+        # Оба варианта свечения готовим заранее, чтобы смена цвета не вызывала задержку
+        self.glow_off = get_glow_sprite(self.width, self.height, GLOW_RED)
+        self.glow_on = get_glow_sprite(self.width, self.height, GLOW_GREEN)
 
     def update(self, players):
         """Обновляет состояние знака в зависимости от близости игроков"""
@@ -2165,27 +2393,9 @@ class Sign:
         """Отрисовка знака с размытой подсветкой"""
         screen_x, screen_y = camera.apply(self.x, self.y)
         if -self.width <= screen_x <= SCREEN_WIDTH and -self.height <= screen_y <= SCREEN_HEIGHT:
-            # Создаем размытое свечение
-            glow_color = (0, 255, 0) if self.is_player_near else (255, 0, 0)
-            
-            # Создаем несколько слоев свечения для эффекта размытия
-            glow_sizes = [40, 30, 20, 10]
-            glow_alphas = [30, 50, 80, 120]
-            
-            for size, alpha in zip(glow_sizes, glow_alphas):
-                glow_surface = pygame.Surface((self.width + size, self.height + size), pygame.SRCALPHA)
-                glow_rect = pygame.Rect(0, 0, self.width + size, self.height + size)
-                
-                # Создаем градиентное свечение
-                for i in range(size // 2):
-                    current_alpha = max(0, alpha - (i * alpha // (size // 2)))
-                    current_color = (*glow_color, current_alpha)
-                    
-                    inner_rect = pygame.Rect(i, i, self.width + size - 2*i, self.height + size - 2*i)
-                    if inner_rect.width > 0 and inner_rect.height > 0:
-                        pygame.draw.ellipse(glow_surface, current_color, inner_rect)
-                
-                screen.blit(glow_surface, (screen_x - size//2, screen_y - size//2))
+            # Готовое размытое свечение: зеленое рядом с игроком, иначе красное
+            glow = self.glow_on if self.is_player_near else self.glow_off
+            screen.blit(glow, (screen_x - GLOW_MARGIN//2, screen_y - GLOW_MARGIN//2))
             
             # Отрисовываем сам знак
             if self.texture:
@@ -2196,6 +2406,28 @@ class Sign:
                 pygame.draw.rect(screen, (160, 82, 45), (screen_x + 4, screen_y + 8, 24, 16))
                 pygame.draw.rect(screen, (0, 0, 0), (screen_x + 4, screen_y + 8, 24, 16), 2)
 
+    def get_sprites(self, camera):
+        """Свечение и сам знак для очереди отрисовки; None - запасная отрисовка через draw"""
+        if not self.texture:
+            return None
+        glow = self.glow_on if self.is_player_near else self.glow_off
+        return [(glow, (self.x - GLOW_MARGIN//2, self.y - GLOW_MARGIN//2)), (self.texture, (self.x, self.y))]
+
+    def get_light(self):
+        """Подсветка знака: (x, y, радиус, цвет) в мировых координатах"""
+        color = GLOW_GREEN if self.is_player_near else GLOW_RED
+        return (self.x + self.width // 2, self.y + self.height // 2, SIGN_LIGHT_RADIUS, color)
+
+    def get_screen_rect(self, camera):
+        """Область экрана, занятая знаком вместе со свечением и подсветкой"""
+        screen_x, screen_y = camera.apply(self.x, self.y)
+        glow_rect = pygame.Rect(screen_x - GLOW_MARGIN//2, screen_y - GLOW_MARGIN//2,
+                                self.width + GLOW_MARGIN, self.height + GLOW_MARGIN)
+        light_rect = pygame.Rect(0, 0, SIGN_LIGHT_RADIUS * 2, SIGN_LIGHT_RADIUS * 2)
+        light_rect.center = (screen_x + self.width // 2, screen_y + self.height // 2)
+        # Запас на сглаживание при увеличении карты освещения
+        return glow_rect.union(light_rect.inflate(LIGHT_MAP_SCALE * 2, LIGHT_MAP_SCALE * 2))
+
 if __name__ == "__main__":
     if len(sys.argv) != 2:
         print("Использование: python game.py [host/client]")
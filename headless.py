@@ -0,0 +1,111 @@
+import os
+
+import pygame
+
+# Драйвер SDL без окна и звукового устройства
+HEADLESS_DRIVER = "dummy"
+
+
+def init_headless():
+    """Переключает pygame на пустые драйверы видео и звука SDL.
+
+    Игровые модули вызывают pygame.init() при импорте, поэтому уже
+    открытые подсистемы перезапускаются с драйвером "dummy". Окно не
+    создается, звук не воспроизводится, но поверхности и шрифты работают.
+    """
+    os.environ["SDL_VIDEODRIVER"] = HEADLESS_DRIVER
+    os.environ["SDL_AUDIODRIVER"] = HEADLESS_DRIVER
+
+    if not pygame.display.get_init() or pygame.display.get_driver() != HEADLESS_DRIVER:
+        pygame.display.quit()
+        pygame.display.init()
+
+    if pygame.mixer.get_init():
+        pygame.mixer.quit()
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        print(f"Ошибка инициализации звука без устройства: {e}")
+
+    if not pygame.font.get_init():
+        pygame.font.init()
+
+
+class PressedKeys:
+    """Замена pygame.key.get_pressed(): зажаты только указанные клавиши"""
+
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class InputSource:
+    """Источник ввода для игрового цикла.
+
+    Кроме событий и клавиш источник может подменить время кадра и
+    принятые сетевые сообщения - так работает воспроизведение записи.
+    """
+
+    def get_events(self):
+        return []
+
+    def get_pressed(self):
+        return PressedKeys()
+
+    def get_dt(self, dt):
+        return dt
+
+    def get_messages(self, messages):
+        return messages
+
+    def check_state(self, game):
+        """Вызывается в начале каждого тика, до применения ввода"""
+
+
+class KeyboardInput(InputSource):
+    """Ввод с клавиатуры через очередь событий pygame"""
+
+    def get_pressed(self):
+        return pygame.key.get_pressed()
+
+    def get_events(self):
+        return pygame.event.get()
+
+
+class ScriptedInput(InputSource):
+    """Заранее записанный ввод для прогонов без игрока.
+
+    script - список тиков; каждый тик - (зажатые клавиши, нажатия), где
+    нажатия превращаются в события KEYDOWN. Вместо списка можно передать
+    функцию tick -> (зажатые клавиши, нажатия). Когда сценарий кончается,
+    приходит событие QUIT, и игровой цикл завершается.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.tick = 0
+        self.current = PressedKeys()
+
+    def next_tick(self):
+        if callable(self.script):
+            frame = self.script(self.tick)
+        elif self.tick < len(self.script):
+            frame = self.script[self.tick]
+        else:
+            frame = None
+        self.tick += 1
+        return frame
+
+    def get_pressed(self):
+        return self.current
+
+    def get_events(self):
+        frame = self.next_tick()
+        if frame is None:
+            self.current = PressedKeys()
+            return [pygame.event.Event(pygame.QUIT)]
+        held, presses = frame
+        self.current = PressedKeys(held)
+        return [pygame.event.Event(pygame.KEYDOWN, key=key) for key in presses]
@@ -1,6 +1,6 @@
 import pygame
 import socket
-import pickle
+import queue
 import threading
 import sys
 import os
@@ -9,10 +9,32 @@ import random
 import json
 import pygame.font
 import pygame.mixer  # Добавляем импорт для звука
+from asset_cache import ASSET_CACHE
+from fonts import render_text
+from static_layer import StaticLayerCache
+from collision_world import CollisionWorld
+from render_queue import (RenderQueue, LAYER_GROUND, LAYER_PLATFORMS, LAYER_ITEMS, LAYER_PROPS,
+                          LAYER_SIGNS, LAYER_CHARACTERS)
+from renderer import DirtyRectRenderer, RENDER_MODE, RENDER_MODE_DIRTY, RENDER_FPS
+from headless import init_headless, KeyboardInput
+from transport import create_udp_socket, HOST_PORT, CLIENT_PORT
+from timestep import FixedStepScheduler
+from parallax import ParallaxBackground
+from lighting import LightingSystem
+from transitions import VictoryScreen
+from protocol import encode_message, decode_message
+from snapshot import SnapshotSender, SnapshotReceiver, new_session
+from net_scheduler import NetworkScheduler, SYNC_INTERVAL
+from remote_buffer import SnapshotBuffer, INTERPOLATION_DELAY
+from reliable import ReliableChannel
 
 # Инициализация Pygame
 pygame.init()
-pygame.mixer.init()  # Инициализируем звуковую подсистему
+# Без звукового устройства (сервер сборки) игра работает без звука
+try:
+    pygame.mixer.init()  # Инициализируем звуковую подсистему
+except pygame.error as e:
+    print(f"Ошибка инициализации звука: {e}")
 
 # Константы
 SCREEN_WIDTH = 800
@@ -46,6 +68,7 @@ DIRT_LIGHT = (75, 60, 45)
 PLATFORM_HEIGHT = 50  
 SHADOW_HEIGHT = 400  
 SHADOW_ALPHA = 200  
+PARALLAX_FACTORS = (0.1, 0.3, 0.5, 0.7)  # От дальнего слоя фона к ближнему
 
 # Константы для диалогов
 DIALOG_PADDING = 40
@@ -86,24 +109,40 @@ from game import (SpriteSheet, Camera, Player, DialogSystem, Platform,
                  AnimatedKey, Potion, Lamp, Decoration, MovingPlatform, Flag, Sign)
 
 class Game:
-    def __init__(self, host, is_host):
+    def __init__(self, host, is_host, render_mode=RENDER_MODE, render_fps=RENDER_FPS,
+                 headless=False, transport=None, input_source=None, sync_interval=SYNC_INTERVAL,
+                 interpolation_delay=INTERPOLATION_DELAY, session=None):
+        # Без окна и звука: для тестов, замеров и запуска на серверах сборки
+        self.headless = headless
+        if headless:
+            init_headless()
+        self.input = input_source or KeyboardInput()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("P2P Game - Level 2")
+        # Все ресурсы уровня привязываются к его области в кэше
+        self.asset_scope = "level2"
+        ASSET_CACHE.set_scope(self.asset_scope)
         self.clock = pygame.time.Clock()
         self.camera = Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.renderer = DirtyRectRenderer(self.screen, render_mode)
+        self.ui_state = None
+        self.scheduler = FixedStepScheduler()
+        self.sim_tick = 0  # Номер шага симуляции - время в снимках состояния
+        self.render_fps = render_fps
         
         # Настройка звука
-        try:
-            pygame.mixer.music.load(BACKGROUND_MUSIC)
-            pygame.mixer.music.set_volume(0.5)  # Устанавливаем громкость фоновой музыки
-            pygame.mixer.music.play(-1)  # -1 означает бесконечное воспроизведение
-            
-            if JUMP_SOUND:
-                JUMP_SOUND.set_volume(0.3)  # Устанавливаем громкость звука прыжка
-            if COLLECT_SOUND:
-                COLLECT_SOUND.set_volume(0.4)  # Устанавливаем громкость звука сбора предметов
-        except Exception as e:
-            print(f"Ошибка инициализации звука: {e}")
+        if not headless:
+            try:
+                pygame.mixer.music.load(BACKGROUND_MUSIC)
+                pygame.mixer.music.set_volume(0.5)  # Устанавливаем громкость фоновой музыки
+                pygame.mixer.music.play(-1)  # -1 означает бесконечное воспроизведение
+                
+                if JUMP_SOUND:
+                    JUMP_SOUND.set_volume(0.3)  # Устанавливаем громкость звука прыжка
+                if COLLECT_SOUND:
+                    COLLECT_SOUND.set_volume(0.4)  # Устанавливаем громкость звука сбора предметов
+            except Exception as e:
+                print(f"Ошибка инициализации звука: {e}")
         
         # Флаг для контроля состояния сокета
         self.socket_active = True
@@ -111,7 +150,8 @@ class Game:
         # Создаем фон и платформу
         self.background = self.create_background()
         self.platform = self.create_platform()
-        self.shadow = self.create_shadow()
+        # Затемнение сверху и свет фонарей накладываются одним проходом
+        self.lighting = LightingSystem(SCREEN_WIDTH, SCREEN_HEIGHT, SHADOW_HEIGHT, SHADOW_ALPHA)
         
         # Загружаем диалоги для второго уровня
         dialog_file = os.path.join("assets", "dialogs", "level2_dialog.json")
@@ -136,17 +176,29 @@ class Game:
         self.is_shutting_down = False
         
         # Настройка сети
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        if is_host:
-            self.socket.bind((host, 5000))
-            self.other_address = (host, 5001)
+        if transport is None:
+            self.socket, self.other_address = create_udp_socket(host, is_host)
         else:
-            self.socket.bind((host, 5001))
-            self.other_address = (host, 5000)
-
-        # Устанавливаем таймаут для сокета
-        self.socket.settimeout(0.1)
+            # Подставной транспорт (без сети или в памяти) вместо UDP-сокета
+            self.socket = transport
+            self.other_address = (host, CLIENT_PORT if is_host else HOST_PORT)
 
+        # Состояние игрока уходит как разница с последним подтвержденным снимком
+        # Свой номер сеанса: пакеты прошлой игры на этом адресе не смешиваются с новыми
+        # (воспроизведение записи передает сеанс записанной игры)
+        self.session = new_session() if session is None else session
+        self.snapshot_sender = SnapshotSender(WORLD_WIDTH, WORLD_HEIGHT, self.session)
+        self.snapshot_receiver = SnapshotReceiver(WORLD_WIDTH, WORLD_HEIGHT, self.session)
+        # Частота отправки состояния не зависит от частоты кадров
+        self.net_scheduler = NetworkScheduler(sync_interval)
+        # Второй игрок показывается по буферу снимков с задержкой интерполяции
+        self.remote_buffer = SnapshotBuffer(interpolation_delay)
+        # События диалога и подбора предметов идут по надежному каналу в том же
+        # сеансе, что и снимки (при воспроизведении - в сеансе записи)
+        self.reliable = ReliableChannel(self.session)
+        
+        # Принятые сообщения ждут в очереди до ближайшего кадра
+        self.incoming = queue.Queue()
         # Запуск потока для приема данных
         self.receive_thread = threading.Thread(target=self.receive_data, daemon=False)
         self.receive_thread.start()
@@ -175,29 +227,45 @@ class Game:
         self.collected_potions = 0
         self.moving_platforms = self.create_moving_platforms()
         
+        # Неподвижные платформы и декорации рисуются готовыми чанками
+        self.ground_layer = StaticLayerCache(self.platforms)
+        self.props_layer = StaticLayerCache(self.lamps + self.decorations)
+        
+        # Столкновения и сбор предметов проверяются через пространственный хэш
+        self.world = CollisionWorld(WORLD_WIDTH, WORLD_HEIGHT)
+        self.world.add_platforms(self.platforms)
+        self.world.add_moving_platforms(self.moving_platforms)
+        self.world.add_items("keys", self.animated_keys)
+        self.world.add_items("potions", self.potions)
+        self.my_player.world = self.world
+        self.other_player.world = self.world
+        
+        # Остальные объекты мира рисуются через очередь с отсечением по сетке
+        self.render_queue = RenderQueue(WORLD_WIDTH, WORLD_HEIGHT)
+        for platform in self.moving_platforms:
+            self.render_queue.add(platform, LAYER_PLATFORMS)
+        for collectible in self.animated_keys + self.potions:
+            self.render_queue.add(collectible, LAYER_ITEMS)
+        for sign in self.signs:
+            self.render_queue.add(sign, LAYER_SIGNS)
+        
         # Состояние финала
         self.victory_achieved = False
         self.victory_timer = 0
         self.victory_duration = 5.0
+        # Заставка победы готовится заранее, чтобы финал не создавал поверхности каждый кадр
+        self.victory_screen = VictoryScreen(
+            (SCREEN_WIDTH, SCREEN_HEIGHT),
+            "Это была курсовая работа по дисциплине КСиС. Светлана Владимировна, простите за дедлайн.",
+            wrap_width=SCREEN_WIDTH - 100)
         
         # Если мы хост, инициируем первый диалог после небольшой задержки
         if is_host:
             self.initial_dialog_timer = 2.0
         else:
             self.initial_dialog_timer = None
-
-    def create_shadow(self):
-        """Создает градиент затемнения сверху"""
-        shadow = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
         
-        # Создаем градиент от темного к прозрачному
-        for y in range(SHADOW_HEIGHT):
-            # Нелинейный градиент для более плавного перехода
-            progress = y / SHADOW_HEIGHT
-            alpha = int(SHADOW_ALPHA * (1 - progress * progress))
-            pygame.draw.line(shadow, (0, 0, 0, alpha), (0, y), (SCREEN_WIDTH, y))
-            
-        return shadow
+        ASSET_CACHE.set_scope("global")
 
     def create_platform(self):
         """Создает платформу для ходьбы"""
@@ -219,7 +287,7 @@ class Game:
 
     def create_background(self):
         """Создает многослойный фон с параллаксом"""
-        backgrounds = {}
+        layers = []
         
         try:
             # Загружаем 3 слоя фона
@@ -242,9 +310,8 @@ class Game:
                 return pygame.transform.scale(bg, (new_width, new_height))
             
             # Масштабируем фоны с сохранением пропорций
-            backgrounds['layer1'] = scale_bg_preserve_ratio(bg1)
-            backgrounds['layer2'] = scale_bg_preserve_ratio(bg2)
-            backgrounds['layer3'] = scale_bg_preserve_ratio(bg3)
+            for bg in (bg1, bg2, bg3):
+                layers.append(scale_bg_preserve_ratio(bg))
             
         except Exception as e:
             print(f"Ошибка загрузки фона: {e}")
@@ -255,11 +322,11 @@ class Game:
                 color = (color_value, color_value - 10, color_value - 5)
                 pygame.draw.line(background, color, (0, y), (SCREEN_WIDTH, y))
             
-            backgrounds['layer1'] = background
-            backgrounds['layer2'] = background.copy()
-            backgrounds['layer3'] = background.copy()
+            # Непрозрачные копии градиента перекрывают друг друга - виден только ближний слой
+            return ParallaxBackground([(background, PARALLAX_FACTORS[2])], (SCREEN_WIDTH, SCREEN_HEIGHT))
         
-        return backgrounds
+        # Слои идут от дальнего к ближнему
+        return ParallaxBackground(list(zip(layers, PARALLAX_FACTORS)), (SCREEN_WIDTH, SCREEN_HEIGHT))
 
     def create_platforms(self):
         """Создает платформы и препятствия для кооперативного прохождения"""
@@ -386,107 +453,28 @@ class Game:
         if not self.dialog_system.dialog_completed:
             return
             
-        try:
-            pixel_font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 20)
-        except:
-            pixel_font = pygame.font.Font(None, 20)
-        
-        keys_text = pixel_font.render(f"Ключи: {self.collected_keys}/3", True, (255, 255, 255))
+        keys_text = render_text(f"Ключи: {self.collected_keys}/3", 20, (255, 255, 255))
         screen.blit(keys_text, (10, 10))
         
-        potions_text = pixel_font.render(f"Зелья: {self.collected_potions}/3", True, (255, 255, 255))
+        potions_text = render_text(f"Зелья: {self.collected_potions}/3", 20, (255, 255, 255))
         screen.blit(potions_text, (10, 35))
         
         if self.collected_keys == 3 and self.collected_potions == 3:
-            victory_text = pixel_font.render("Все предметы собраны! Найдите выход из сада!", True, (0, 255, 0))
+            victory_text = render_text("Все предметы собраны! Найдите выход из сада!", 20, (0, 255, 0))
             screen.blit(victory_text, (10, SCREEN_HEIGHT - 30))
         else:
-            hint_text = pixel_font.render("Соберите все предметы, чтобы найти выход из сада!", True, (255, 200, 0))
+            hint_text = render_text("Соберите все предметы, чтобы найти выход из сада!", 20, (255, 200, 0))
             screen.blit(hint_text, (10, SCREEN_HEIGHT - 30))
 
     def draw_background_with_parallax(self, screen):
         """Отрисовывает многослойный фон с эффектом параллакса"""
-        parallax_factor_1 = 0.1
-        parallax_factor_2 = 0.3
-        parallax_factor_3 = 0.5
-        parallax_factor_4 = 0.7
-        
-        offset_1 = int(self.camera.scroll_x * parallax_factor_1)
-        offset_2 = int(self.camera.scroll_x * parallax_factor_2)
-        offset_3 = int(self.camera.scroll_x * parallax_factor_3)
-        offset_4 = int(self.camera.scroll_x * parallax_factor_4)
-        
-        screen.fill((0, 0, 0))
-        
-        if 'layer1' in self.background:
-            screen.blit(self.background['layer1'], (-offset_1, 0))
-            if offset_1 > 0:
-                screen.blit(self.background['layer1'], (SCREEN_WIDTH - offset_1, 0))
-        
-        if 'layer2' in self.background:
-            screen.blit(self.background['layer2'], (-offset_2, 0))
-            if offset_2 > 0:
-                screen.blit(self.background['layer2'], (SCREEN_WIDTH - offset_2, 0))
-        
-        if 'layer3' in self.background:
-            screen.blit(self.background['layer3'], (-offset_3, 0))
-            if offset_3 > 0:
-                screen.blit(self.background['layer3'], (SCREEN_WIDTH - offset_3, 0))
-        
-        if 'layer4' in self.background:
-            screen.blit(self.background['layer4'], (-offset_4, 0))
-            if offset_4 > 0:
-                screen.blit(self.background['layer4'], (SCREEN_WIDTH - offset_4, 0))
+        self.background.draw(screen, self.camera.scroll_x)
 
     def draw_victory_screen(self, screen):
         """Отрисовывает экран победы"""
         if not self.victory_achieved:
             return
-            
-        # Белый фон с плавным появлением
-        white_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        white_surface.fill((255, 255, 255))
-        white_alpha = min(255, int(self.victory_timer * 255))
-        white_surface.set_alpha(white_alpha)
-        screen.blit(white_surface, (0, 0))
-        
-        if self.victory_timer > 1:
-            try:
-                font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 48)
-            except:
-                font = pygame.font.Font(None, 48)
-            
-            full_text = "Это была курсовая работа по дисциплине КСиС. Светлана Владимировна, простите за дедлайн."
-            text_progress = min(1.0, (self.victory_timer - 1) * 0.5)
-            visible_chars = int(len(full_text) * text_progress)
-            current_text = full_text[:visible_chars]
-            
-            if current_text:
-                # Разбиваем текст на строки для лучшей читаемости
-                words = current_text.split()
-                lines = []
-                current_line = []
-                
-                for word in words:
-                    current_line.append(word)
-                    test_line = ' '.join(current_line)
-                    test_surface = font.render(test_line, True, (0, 0, 0))
-                    if test_surface.get_width() > SCREEN_WIDTH - 100:  # отступ по 50 пикселей с каждой стороны
-                        current_line.pop()  # убираем последнее слово
-                        lines.append(' '.join(current_line))
-                        current_line = [word]
-                
-                if current_line:
-                    lines.append(' '.join(current_line))
-                
-                # Отрисовываем каждую строку по центру
-                total_height = len(lines) * font.get_linesize()
-                start_y = (SCREEN_HEIGHT - total_height) // 2
-                
-                for i, line in enumerate(lines):
-                    text_surface = font.render(line, True, (0, 0, 0))
-                    text_rect = text_surface.get_rect(center=(SCREEN_WIDTH//2, start_y + i * font.get_linesize()))
-                    screen.blit(text_surface, text_rect)
+        self.victory_screen.draw(screen, self.victory_timer)
 
     def check_victory_condition(self):
         """Проверяет условие победы"""
@@ -515,7 +503,7 @@ class Game:
 
     def check_platform_activation(self):
         """Проверяет активацию подвижных платформ"""
-        triggered_platforms = self.my_player.check_platform_triggers(self.platforms)
+        triggered_platforms = self.my_player.check_platform_triggers(self.world.platforms_in(self.my_player.get_rect()))
         
         for platform in triggered_platforms:
             platform_id = f"{platform.x}_{platform.y}"
@@ -542,15 +530,7 @@ class Game:
         
         if next_dialog == "end":
             self.end_dialog()
-            try:
-                data = pickle.dumps({
-                    "type": "dialog_end",
-                    "dialog_state": self.dialog_state
-                })
-                self.socket.sendto(data, self.other_address)
-            except Exception as e:
-                print(f"Ошибка при отправке завершения диалога: {e}")
-                return
+            return
             
         if next_dialog and next_dialog in self.dialog_system.dialogs:
             next_dialog_data = self.dialog_system.dialogs[next_dialog]
@@ -560,14 +540,10 @@ class Game:
             self.dialog_state["current_speaker"] = next_speaker
             self.dialog_state["is_active"] = True
             
-            try:
-                data = pickle.dumps({
-                    "type": "dialog_update",
-                    "dialog_state": self.dialog_state
-                })
-                self.socket.sendto(data, self.other_address)
-            except Exception as e:
-                print(f"Ошибка при отправке обновления диалога: {e}")
+            self.send_reliable({
+                "type": "dialog_update",
+                "dialog_state": self.dialog_state
+            })
             
             self.dialog_system.reset_state()
             self.dialog_system.start_dialog(next_dialog, self.my_player.character_name)
@@ -585,94 +561,172 @@ class Game:
                 if not data:
                     continue
                     
-                received_data = pickle.loads(data)
-                
-                if received_data.get("type") == "dialog_update":
-                    dialog_state = received_data.get("dialog_state")
-                    if dialog_state:
-                        self.dialog_state.update(dialog_state)
-                        if dialog_state.get("current_dialog_id"):
-                            self.dialog_system.start_dialog(
-                                dialog_state["current_dialog_id"],
-                                self.my_player.character_name
-                            )
-                
-                elif received_data.get("type") == "dialog_end":
-                    self.dialog_system.complete_dialog()
-                    self.dialog_state["is_active"] = False
-                    self.dialog_state["current_dialog_id"] = None
-                    self.dialog_state["current_speaker"] = None
-                    self.dialog_state["dialog_completed"] = True
-                
-                else:
-                    # Обработка обычных игровых данных
-                    if "player" in received_data:
-                        player_data = received_data["player"]
-                        self.other_player.x = player_data["x"]
-                        self.other_player.y = player_data["y"]
-                        self.other_player.facing_right = player_data["facing_right"]
-                        self.other_player.moving = player_data["moving"]
-                        if "current_state" in player_data:
-                            self.other_player.current_state = player_data["current_state"]
-                            if self.other_player.current_state != self.other_player.last_state:
-                                self.other_player.last_state = self.other_player.current_state
-                                self.other_player.sprites[self.other_player.current_state].reset_animation()
-                    
-                    if "collected_keys" in received_data:
-                        for key_index in received_data["collected_keys"]:
-                            if key_index < len(self.animated_keys):
-                                self.animated_keys[key_index].collected = True
-                    
-                    if "collected_potions" in received_data:
-                        for potion_index in received_data["collected_potions"]:
-                            if potion_index < len(self.potions):
-                                self.potions[potion_index].collected = True
-                    
-                    if "counters" in received_data:
-                        counters = received_data["counters"]
-                        if counters["keys"] > self.collected_keys:
-                            self.collected_keys = counters["keys"]
-                        if counters["potions"] > self.collected_potions:
-                            self.collected_potions = counters["potions"]
+                # Сообщения применяются в игровом цикле, между шагами симуляции
+                self.incoming.put(data)
                 
             except:
                 if not self.socket_active or self.is_shutting_down:
                     break
                 continue
 
+    def receive_messages(self):
+        """Забирает сообщения, принятые потоком приема с прошлого кадра"""
+        messages = []
+        while True:
+            try:
+                messages.append(self.incoming.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def handle_message(self, data):
+        """Применяет одно сообщение от другого игрока"""
+        try:
+            received_data = decode_message(data)
+            
+            if received_data.get("type") == "dialog_update":
+                dialog_state = received_data.get("dialog_state")
+                if dialog_state:
+                    self.dialog_state.update(dialog_state)
+                    if dialog_state.get("current_dialog_id"):
+                        self.dialog_system.start_dialog(
+                            dialog_state["current_dialog_id"],
+                            self.my_player.character_name
+                        )
+            
+            elif received_data.get("type") == "dialog_end":
+                self.dialog_system.complete_dialog()
+                self.dialog_state["is_active"] = False
+                self.dialog_state["current_dialog_id"] = None
+                self.dialog_state["current_speaker"] = None
+                self.dialog_state["dialog_completed"] = True
+            
+            elif received_data.get("type") == "pickup":
+                self.apply_pickup(received_data)
+            
+            elif received_data.get("type") == "reliable":
+                # События надежного канала применяются по порядку, ровно один раз
+                for payload in self.reliable.receive(received_data):
+                    self.handle_message(payload)
+                # Подтверждение уйдет со снимком состояния в этом же кадре,
+                # в том числе на повтор: прошлое подтверждение могло потеряться
+                self.net_scheduler.request_send()
+            
+            elif received_data.get("type") == "snapshot":
+                self.snapshot_sender.acknowledge(received_data["ack"], received_data["peer_session"])
+                self.reliable.acknowledge(received_data["reliable_ack"], received_data["peer_session"])
+                peer_session = self.snapshot_receiver.peer_session
+                game_state = self.snapshot_receiver.receive(received_data)
+                if self.snapshot_receiver.peer_session != peer_session:
+                    # Новая игра второго игрока: прежняя шкала времени снимков не годится
+                    self.remote_buffer.reset()
+                if game_state is not None:
+                    self.apply_game_state(game_state)
+            
+            else:
+                self.apply_game_state(received_data)
+        except Exception as e:
+            print(f"Ошибка обработки сообщения: {e}")
+
+    def apply_game_state(self, game_state):
+        """Применяет состояние второго игрока: позицию и собранные предметы"""
+        if "player" in game_state:
+            if "tick" in game_state:
+                # Позиция из снимка применяется с задержкой в update_remote_player
+                self.remote_buffer.push(game_state["tick"] * self.scheduler.step,
+                                        self.sim_tick * self.scheduler.step, game_state["player"])
+            else:
+                self.apply_remote_pose(game_state["player"])
+        
+        if "collected_keys" in game_state:
+            for key_index in game_state["collected_keys"]:
+                if key_index < len(self.animated_keys):
+                    self.animated_keys[key_index].collected = True
+        
+        if "collected_potions" in game_state:
+            for potion_index in game_state["collected_potions"]:
+                if potion_index < len(self.potions):
+                    self.potions[potion_index].collected = True
+        
+        if "counters" in game_state:
+            counters = game_state["counters"]
+            if counters["keys"] > self.collected_keys:
+                self.collected_keys = counters["keys"]
+            if counters["potions"] > self.collected_potions:
+                self.collected_potions = counters["potions"]
+
+    def apply_pickup(self, pickup):
+        """Второй игрок подобрал предмет"""
+        items = self.animated_keys if pickup["kind"] == "key" else self.potions
+        index = pickup["index"]
+        if index >= len(items) or items[index].collected:
+            return
+        items[index].collected = True
+        if pickup["kind"] == "key":
+            self.collected_keys += 1
+        else:
+            self.collected_potions += 1
+
+    def apply_remote_pose(self, player_data):
+        """Ставит второго игрока в позу из состояния"""
+        self.other_player.x = player_data["x"]
+        self.other_player.y = player_data["y"]
+        self.other_player.facing_right = player_data["facing_right"]
+        self.other_player.moving = player_data["moving"]
+        if "current_state" in player_data:
+            self.other_player.current_state = player_data["current_state"]
+            if self.other_player.current_state != self.other_player.last_state:
+                self.other_player.last_state = self.other_player.current_state
+                self.other_player.sprites[self.other_player.current_state].reset_animation()
+
+    def update_remote_player(self):
+        """Шаг второго игрока: поза из буфера снимков на момент с задержкой"""
+        pose = self.remote_buffer.sample(self.sim_tick * self.scheduler.step)
+        if pose is None:
+            # Снимков еще не было - второй игрок просто падает на платформы
+            self.other_player.update()
+            return
+        self.apply_remote_pose(pose)
+
+    def send_reliable(self, message):
+        """Отправка события по надежному каналу: дойдет один раз и по порядку"""
+        try:
+            data = self.reliable.send(message)
+            if self.socket_active:
+                self.socket.sendto(data, self.other_address)
+        except Exception as e:
+            # Событие осталось в канале и уйдет повтором
+            print(f"Ошибка при отправке события: {e}")
+
+    def resend_reliable(self, dt):
+        """Повтор событий, не подтвержденных дольше таймаута"""
+        try:
+            for data in self.reliable.update(dt):
+                self.socket.sendto(data, self.other_address)
+        except socket.error:
+            self.socket_active = False
+        except Exception as e:
+            print(f"Ошибка повтора событий: {e}")
+
     def send_data(self):
         """Отправка данных другому игроку"""
         if not self.socket_active:
             return
             
         try:
-            # Собираем данные о собранных предметах
-            collected_keys_data = []
-            for i, key in enumerate(self.animated_keys):
-                if key.collected:
-                    collected_keys_data.append(i)
-            
-            collected_potions_data = []
-            for i, potion in enumerate(self.potions):
-                if potion.collected:
-                    collected_potions_data.append(i)
-            
-            data = pickle.dumps({
-                "type": "game_state",
+            game_state = {
                 "player": {
                     "x": self.my_player.x,
                     "y": self.my_player.y,
                     "facing_right": self.my_player.facing_right,
                     "moving": self.my_player.moving,
                     "current_state": self.my_player.current_state
-                },
-                "collected_keys": collected_keys_data,
-                "collected_potions": collected_potions_data,
-                "counters": {
-                    "keys": self.collected_keys,
-                    "potions": self.collected_potions
                 }
-            })
+            }
+            # В пакет попадают только поля, изменившиеся с подтвержденного снимка
+            message = self.snapshot_sender.build(game_state, self.snapshot_receiver.latest, self.sim_tick,
+                                                 self.snapshot_receiver.peer_session)
+            message["reliable_ack"] = self.reliable.ack_for(message["peer_session"])
+            data = encode_message(message)
             if self.socket_active:
                 self.socket.sendto(data, self.other_address)
         except socket.error:
@@ -711,15 +765,39 @@ class Game:
             except:
                 pass
         
-    def run(self):
-        """Основной игровой цикл"""
+        # Выгружаем ресурсы уровня
+        ASSET_CACHE.release(self.asset_scope)
+        
+    def run(self, max_ticks=None, recorder=None):
+        """Основной игровой цикл; max_ticks - ограничение числа проходов (для прогонов без игрока),
+        recorder - ReplayRecorder для записи ввода каждого тика"""
         running = True
         last_time = time.time()
+        ticks = 0
         try:
             while running:
-                current_time = time.time()
-                dt = current_time - last_time
-                last_time = current_time
+                if max_ticks is not None and ticks >= max_ticks:
+                    break
+                ticks += 1
+                
+                if self.headless:
+                    # Без вывода кадров каждый проход цикла - ровно один шаг симуляции
+                    dt = self.scheduler.step
+                else:
+                    current_time = time.time()
+                    dt = current_time - last_time
+                    last_time = current_time
+                
+                # Ввод тика: события, клавиши, время кадра и сообщения сети
+                events = self.input.get_events()
+                keys = self.input.get_pressed()
+                dt = self.input.get_dt(dt)
+                messages = self.input.get_messages(self.receive_messages())
+                self.input.check_state(self)
+                if recorder is not None:
+                    recorder.record_tick(self, dt, keys, events, messages)
+                for data in messages:
+                    self.handle_message(data)
                 
                 if self.is_host and self.initial_dialog_timer is not None:
                     self.initial_dialog_timer -= dt
@@ -727,9 +805,7 @@ class Game:
                         self.initial_dialog_timer = None
                         self.start_dialog("start")
 
-                keys = pygame.key.get_pressed()
-
-                for event in pygame.event.get():
+                for event in events:
                     if event.type == pygame.QUIT:
                         running = False
                         self.is_shutting_down = True
@@ -743,100 +819,32 @@ class Game:
                 if not running:
                     break
 
-                allow_movement = not self.dialog_system.is_active
-
-                # Обрабатываем нажатия клавиш
-                if allow_movement:
-                    if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-                        self.my_player.move(-1)
-                    elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-                        self.my_player.move(1)
-                    else:
-                        self.my_player.move(0)
-                        self.my_player.moving = False
-                        self.my_player.current_state = "idle"
-                else:
-                    self.my_player.move(0)
-                    self.my_player.moving = False
-                    self.my_player.current_state = "idle"
-
-                self.my_player._platforms = self.platforms + self.moving_platforms
-                self.other_player._platforms = self.platforms + self.moving_platforms
-                
-                self.my_player.update(self.platforms + self.moving_platforms)
-                self.other_player.update(self.platforms + self.moving_platforms)
-                
-                for key in self.animated_keys:
-                    key.update(dt)
-                
-                for platform in self.moving_platforms:
-                    platform.update()
-                
-                for sign in self.signs:
-                    sign.update([self.my_player, self.other_player])
-                
-                collected = self.my_player.check_collectibles(self.animated_keys)
-                if collected:
-                    self.collected_keys += len(collected)
-                
-                collected = self.my_player.check_collectibles(self.potions)
-                if collected:
-                    self.collected_potions += len(collected)
-                
-                self.check_platform_activation()
-                self.check_victory_condition()
-                
-                if self.initial_dialog_timer is None:
-                    self.check_dialog_trigger()
-                
-                next_x = self.my_player.x
-                next_y = self.my_player.y
-                if keys[pygame.K_LEFT]:
-                    next_x -= self.my_player.move_speed * 5
-                elif keys[pygame.K_RIGHT]:
-                    next_x += self.my_player.move_speed * 5
-                self.camera.update(next_x, next_y)
+                # Мир обновляется фиксированными шагами независимо от частоты кадров
+                for _ in range(self.scheduler.advance(dt)):
+                    self.save_interpolation_state()
+                    self.update_world(keys, self.scheduler.step)
+                # Кадр рисуется между двумя последними шагами симуляции
+                self.interpolate(self.scheduler.alpha)
                 
                 self.dialog_system.update(dt)
                 
                 if self.victory_achieved:
                     self.victory_timer += dt
             
-                if self.socket_active:
+                if self.socket_active and self.net_scheduler.should_send(dt, self.my_player.get_pose()):
                     self.send_data()
+                if self.socket_active:
+                    self.resend_reliable(dt)
             
-                self.draw_background_with_parallax(self.screen)
-                platform_y = SCREEN_HEIGHT - PLATFORM_HEIGHT
-                self.screen.blit(self.platform, (0, platform_y))
-                
-                for platform in self.platforms:
-                    platform.draw(self.screen, self.camera)
-                for platform in self.moving_platforms:
-                    platform.draw(self.screen, self.camera)
-                for collectible in self.animated_keys:
-                    collectible.draw(self.screen, self.camera)
-                for collectible in self.potions:
-                    collectible.draw(self.screen, self.camera)
-                for lamp in self.lamps:
-                    lamp.draw(self.screen, self.camera)
-                for decoration in self.decorations:
-                    decoration.draw(self.screen, self.camera)
-                for sign in self.signs:
-                    sign.draw(self.screen, self.camera)
-                
-                alice = self.my_player if self.my_player.character_name == "alice" else self.other_player
-                rabbit = self.other_player if self.my_player.character_name == "alice" else self.my_player
-                
-                rabbit.draw(self.screen, self.camera)
-                alice.draw(self.screen, self.camera)
-                
-                self.screen.blit(self.shadow, (0, 0))
-                self.dialog_system.draw(self.screen, self.my_player.character_name)
-                self.draw_ui(self.screen)
-                self.draw_victory_screen(self.screen)
-            
-                pygame.display.flip()
-                self.clock.tick(60)
+                # Отрисовка (без окна кадры не выводятся)
+                if not self.headless:
+                    self.renderer.begin_frame(self.get_view_state())
+                    if self.victory_achieved:
+                        self.renderer.invalidate()
+                    if self.renderer.mode == RENDER_MODE_DIRTY:
+                        self.renderer.mark_all(self.get_dirty_rects())
+                    self.renderer.render(self.draw_scene)
+                    self.clock.tick(self.render_fps)
         
         except Exception as e:
             print(f"Ошибка в игровом цикле уровня 2: {e}")
@@ -845,6 +853,130 @@ class Game:
             self.close()
             return self.victory_achieved  # Возвращаем флаг победы
 
+    def update_world(self, keys, step):
+        """Один шаг симуляции мира длиной step секунд"""
+        self.sim_tick += 1
+        allow_movement = not self.dialog_system.is_active
+
+        # Обрабатываем нажатия клавиш
+        if allow_movement:
+            if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+                self.my_player.move(-1)
+            elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+                self.my_player.move(1)
+            else:
+                self.my_player.move(0)
+                self.my_player.moving = False
+                self.my_player.current_state = "idle"
+        else:
+            self.my_player.move(0)
+            self.my_player.moving = False
+            self.my_player.current_state = "idle"
+
+        self.my_player.update()
+        self.update_remote_player()
+        
+        for key in self.animated_keys:
+            key.update(step)
+        
+        for platform in self.moving_platforms:
+            platform.update()
+            self.render_queue.move(platform)
+        self.world.update_moving()
+        
+        for sign in self.signs:
+            sign.update([self.my_player, self.other_player])
+        
+        collected = self.my_player.check_collectibles(self.world.items_in("keys", self.my_player.get_rect()))
+        self.collected_keys += len(collected)
+        for key in collected:
+            self.send_reliable({"type": "pickup", "kind": "key", "index": self.animated_keys.index(key)})
+        
+        collected = self.my_player.check_collectibles(self.world.items_in("potions", self.my_player.get_rect()))
+        self.collected_potions += len(collected)
+        for potion in collected:
+            self.send_reliable({"type": "pickup", "kind": "potion", "index": self.potions.index(potion)})
+        
+        self.check_platform_activation()
+        self.check_victory_condition()
+        
+        if self.initial_dialog_timer is None:
+            self.check_dialog_trigger()
+        
+        next_x = self.my_player.x
+        next_y = self.my_player.y
+        if keys[pygame.K_LEFT]:
+            next_x -= self.my_player.move_speed * 5
+        elif keys[pygame.K_RIGHT]:
+            next_x += self.my_player.move_speed * 5
+        self.camera.update(next_x, next_y)
+
+    def save_interpolation_state(self):
+        """Запоминает положения перед шагом симуляции для сглаживания отрисовки"""
+        self.my_player.save_state()
+        self.other_player.save_state()
+        for platform in self.moving_platforms:
+            platform.save_state()
+        self.camera.save_state()
+
+    def interpolate(self, alpha):
+        """Положения для отрисовки между двумя последними шагами симуляции"""
+        self.my_player.interpolate(alpha)
+        self.other_player.interpolate(alpha)
+        for platform in self.moving_platforms:
+            platform.interpolate(alpha)
+        self.camera.interpolate(alpha)
+
+    def draw_scene(self, screen):
+        """Рисует весь кадр: фон, мир, персонажей и интерфейс"""
+        # Когда заставка победы закрыла экран, сцену под ней не рисуем
+        if self.victory_achieved and self.victory_screen.is_opaque(self.victory_timer):
+            self.draw_victory_screen(screen)
+            return
+        
+        self.draw_background_with_parallax(screen)
+        platform_y = SCREEN_HEIGHT - PLATFORM_HEIGHT
+        screen.blit(self.platform, (0, platform_y))
+
+        self.render_queue.begin(self.camera)
+        self.render_queue.submit(self.ground_layer, LAYER_GROUND)
+        self.render_queue.submit(self.props_layer, LAYER_PROPS)
+
+        alice = self.my_player if self.my_player.character_name == "alice" else self.other_player
+        rabbit = self.other_player if self.my_player.character_name == "alice" else self.my_player
+
+        self.render_queue.submit(rabbit, LAYER_CHARACTERS)
+        self.render_queue.submit(alice, LAYER_CHARACTERS)
+        self.render_queue.draw(screen, self.camera)
+
+        self.lighting.draw(screen, self.camera, self.get_lights())
+        self.dialog_system.draw(screen, self.my_player.character_name)
+        self.draw_ui(screen)
+        self.draw_victory_screen(screen)
+
+    def get_lights(self):
+        """Источники света: фонари и знаки"""
+        return [obj.get_light() for obj in self.lamps + self.signs]
+
+    def get_view_state(self):
+        """Смещение мира и слоев фона; при его изменении кадр перерисовывается целиком"""
+        return (self.camera.apply(0, 0),) + self.background.get_offsets(self.camera.scroll_x)
+
+    def get_dirty_rects(self):
+        """Области экрана, которые могли измениться с прошлого кадра"""
+        rects = [self.my_player.get_screen_rect(self.camera), self.other_player.get_screen_rect(self.camera)]
+        for obj in self.moving_platforms + self.animated_keys + self.potions + self.signs:
+            rects.append(obj.get_screen_rect(self.camera))
+        rects.extend(self.dialog_system.get_dirty_rects())
+        
+        # Интерфейс перерисовываем только при изменении счетчиков
+        ui_state = (self.dialog_system.dialog_completed, self.collected_keys, self.collected_potions)
+        if ui_state != self.ui_state:
+            self.ui_state = ui_state
+            rects.append(pygame.Rect(0, 0, SCREEN_WIDTH, 60))
+            rects.append(pygame.Rect(0, SCREEN_HEIGHT - 30, SCREEN_WIDTH, 30))
+        return rects
+
     def handle_input(self, event):
         """Обработка ввода для диалогов"""
         if not self.dialog_system.is_active:
@@ -904,14 +1036,10 @@ class Game:
             self.dialog_state["current_speaker"] = initial_speaker
             
             # Отправляем сообщение о начале диалога
-            try:
-                data = pickle.dumps({
-                    "type": "dialog_update",
-                    "dialog_state": self.dialog_state
-                })
-                self.socket.sendto(data, self.other_address)
-            except Exception as e:
-                print(f"Ошибка при отправке начала диалога: {e}")
+            self.send_reliable({
+                "type": "dialog_update",
+                "dialog_state": self.dialog_state
+            })
 
     def end_dialog(self):
         """Завершение диалога"""
@@ -922,14 +1050,10 @@ class Game:
         self.dialog_state["current_speaker"] = None
         self.dialog_state["dialog_completed"] = True
         
-        try:
-            data = pickle.dumps({
-                "type": "dialog_end",
-                "dialog_state": self.dialog_state
-            })
-            self.socket.sendto(data, self.other_address)
-        except Exception as e:
-            print(f"Ошибка при отправке завершения диалога: {e}")
+        self.send_reliable({
+            "type": "dialog_end",
+            "dialog_state": self.dialog_state
+        })
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
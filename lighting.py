@@ -0,0 +1,86 @@
+import pygame
+
+from asset_cache import ASSET_CACHE
+
+# Карта освещения хранится в LIGHT_MAP_SCALE раз меньше экрана
+LIGHT_MAP_SCALE = 4
+# Освещенность вне света фонарей (из 255). Карта умножается на кадр и
+# осветлить его не может, поэтому свету фонарей на земле нужен запас
+AMBIENT_LIGHT = 210
+
+LAMP_LIGHT_RADIUS = 120
+LAMP_LIGHT_COLOR = (255, 220, 150)
+SIGN_LIGHT_RADIUS = 64
+
+
+def build_light_mask(radius, color):
+    """Радиальный градиент света в масштабе карты освещения: от color в центре к черному"""
+    low_radius = max(1, radius // LIGHT_MAP_SCALE)
+    mask = pygame.Surface((low_radius * 2, low_radius * 2))
+    mask.fill((0, 0, 0))
+
+    # Рисуем круги от края к центру, яркость растет к центру
+    for r in range(low_radius, 0, -1):
+        intensity = (1 - r / low_radius) ** 0.5
+        current_color = tuple(int(channel * intensity) for channel in color)
+        pygame.draw.circle(mask, current_color, (low_radius, low_radius), r)
+    return mask
+
+
+def get_light_mask(radius, color):
+    """Маска света, общая для всех источников одного радиуса и цвета"""
+    return ASSET_CACHE.get_or_build(("light_mask", radius, tuple(color)),
+                                    lambda: build_light_mask(radius, color),
+                                    scope="global")
+
+
+class LightingSystem:
+    """Освещение кадра одной BLEND_MULT-заливкой.
+
+    Карта освещенности низкого разрешения покрывает весь экран: ambient
+    освещенности, а сверху - затемнение прежним градиентом тени. Поверх
+    нее максимумом (BLEND_RGB_MAX) штампуются готовые маски источников
+    света, карта сглаженно увеличивается до экрана и умножается на кадр.
+    Пока источники на экране не сдвинулись, увеличенная карта не
+    пересобирается.
+    """
+
+    def __init__(self, width, height, shadow_height, shadow_alpha, ambient=AMBIENT_LIGHT,
+                 scale=LIGHT_MAP_SCALE):
+        self.scale = scale
+        low_width = width // scale
+        low_height = -(-height // scale)
+        self.base = pygame.Surface((low_width, low_height))
+
+        # Тот же нелинейный градиент, что и у прежней тени, ниже нее - ambient
+        for y in range(low_height):
+            progress = min(1.0, (y * scale + scale / 2) / shadow_height)
+            alpha = int(shadow_alpha * (1 - progress * progress))
+            light = (255 - alpha) * ambient // 255
+            pygame.draw.line(self.base, (light, light, light), (0, y), (low_width, y))
+
+        self.light_map = self.base.copy()
+        self.upscaled = pygame.Surface((low_width * scale, low_height * scale))
+        self._stamps = None
+
+    def draw(self, screen, camera, lights):
+        """Освещает кадр; lights - список (x, y, радиус, цвет) в мировых координатах"""
+        low_width, low_height = self.base.get_size()
+        stamps = []
+        for x, y, radius, color in lights:
+            screen_x, screen_y = camera.apply(x, y)
+            low_radius = max(1, radius // self.scale)
+            low_x = screen_x // self.scale - low_radius
+            low_y = screen_y // self.scale - low_radius
+            if -2 * low_radius < low_x < low_width and -2 * low_radius < low_y < low_height:
+                stamps.append((low_x, low_y, radius, tuple(color)))
+
+        stamps = tuple(stamps)
+        if stamps != self._stamps:
+            self._stamps = stamps
+            self.light_map.blit(self.base, (0, 0))
+            self.light_map.blits([(get_light_mask(radius, color), (x, y), None, pygame.BLEND_RGB_MAX)
+                                  for x, y, radius, color in stamps], doreturn=False)
+            pygame.transform.smoothscale(self.light_map, self.upscaled.get_size(), self.upscaled)
+
+        screen.blit(self.upscaled, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
@@ -1,11 +1,12 @@
 import pygame
 import sys
 import time
-import pickle
 from story_screen import StoryScreen
 from game import Game
 from level2 import Game as Level2
 from network_manager import NetworkManager
+from renderer import DirtyRectRenderer, RENDER_MODE_DIRTY
+from transitions import FadeTransition
 
 def main():
     pygame.init()
@@ -24,11 +25,10 @@ def main():
     network = NetworkManager("localhost", is_host, story)
     
     clock = pygame.time.Clock()
+    renderer = DirtyRectRenderer(screen)
     running = True
     current_level = 1
-    fade_alpha = 0
-    fade_surface = pygame.Surface((800, 600))
-    fade_surface.fill((0, 0, 0))
+    fade = None
     fading_out = False
     fading_in = False
     
@@ -44,8 +44,10 @@ def main():
                 sys.exit()
         
         story.update(dt)
-        story.draw(screen)
-        pygame.display.flip()
+        renderer.begin_frame(story.get_view_state())
+        if renderer.mode == RENDER_MODE_DIRTY:
+            renderer.mark_all(story.get_dirty_rects())
+        renderer.render(story.draw)
         
         # Если история закончилась, переходим к игре
         if story.current_stage == "game":
@@ -64,34 +66,34 @@ def main():
                     victory = game.run()
                     if victory:
                         fading_out = True
-                        fade_alpha = 0
+                        # Затемняем последний кадр заставки победы
+                        fade = FadeTransition(screen.copy(), fade_out=True)
                 
                 if fading_out:
                     # Отрисовываем затемнение
-                    screen.fill((0, 0, 0))
-                    fade_alpha = min(255, fade_alpha + 5)
-                    fade_surface.set_alpha(fade_alpha)
-                    screen.blit(fade_surface, (0, 0))
+                    fade.update()
+                    fade.draw(screen)
                     pygame.display.flip()
                     
-                    if fade_alpha >= 255:
+                    if fade.done:
                         current_level = 2
                         level2 = Level2("localhost", is_host)
+                        screen = level2.screen
                         fading_out = False
                         fading_in = True
-                        fade_alpha = 255
+                        # Появляется первый кадр второго уровня
+                        level2.draw_scene(screen)
+                        fade = FadeTransition(screen.copy(), fade_out=False)
                         pygame.time.wait(500)  # Небольшая пауза перед началом нового уровня
                     
             elif current_level == 2:
                 if fading_in:
                     # Отрисовываем появление
-                    screen.fill((0, 0, 0))
-                    fade_alpha = max(0, fade_alpha - 5)
-                    fade_surface.set_alpha(fade_alpha)
-                    screen.blit(fade_surface, (0, 0))
+                    fade.update()
+                    fade.draw(screen)
                     pygame.display.flip()
                     
-                    if fade_alpha <= 0:
+                    if fade.done:
                         fading_in = False
                 else:
                     # Запускаем второй уровень
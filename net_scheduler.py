@@ -0,0 +1,50 @@
+# Период отправки состояния по сети, секунды (20 раз в секунду)
+SYNC_INTERVAL = 0.05
+# Даже без изменений состояние уходит не реже раза в HEARTBEAT_INTERVAL:
+# так второй игрок получает подтверждения снимков и знает, что мы на связи
+HEARTBEAT_INTERVAL = 0.5
+
+
+class NetworkScheduler:
+    """Решает, когда отправлять состояние игрока.
+
+    Отправка идет с собственной частотой (sync_interval), не зависящей от
+    частоты кадров, и только если поза игрока изменилась с прошлой
+    отправки. Когда поза перестает меняться, она уходит еще раз: по двум
+    одинаковым снимкам второй игрок видит остановку и не продолжает
+    движение экстраполяцией (см. remote_buffer). request_send() отправляет
+    состояние в этом же кадре - так со снимком уходит подтверждение
+    принятых событий надежного канала (см. reliable).
+    """
+
+    def __init__(self, sync_interval=SYNC_INTERVAL, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.sync_interval = sync_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.accumulator = 0.0
+        self.since_send = 0.0
+        self.last_pose = None
+        self.settled = True
+        self.send_requested = True  # Первое состояние уходит сразу
+
+    def request_send(self):
+        """Отправить состояние в ближайшем кадре, не дожидаясь периода"""
+        self.send_requested = True
+
+    def should_send(self, dt, pose):
+        """Пора ли отправлять состояние; pose - кортеж позы игрока"""
+        self.accumulator += dt
+        self.since_send += dt
+
+        if not self.send_requested:
+            if self.accumulator < self.sync_interval:
+                return False
+            # Накопленное время не переносится дальше одного периода
+            self.accumulator = min(self.accumulator - self.sync_interval, self.sync_interval)
+            if pose == self.last_pose and self.settled and self.since_send < self.heartbeat_interval:
+                return False
+
+        self.settled = pose == self.last_pose
+        self.send_requested = False
+        self.last_pose = pose
+        self.since_send = 0.0
+        return True
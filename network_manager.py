@@ -1,7 +1,8 @@
 import socket
-import pickle
 import threading
 import time
+from protocol import encode_message, decode_message
+from net_scheduler import SYNC_INTERVAL
 
 class NetworkManager:
     def __init__(self, host, is_host, story_screen):
@@ -15,7 +16,7 @@ class NetworkManager:
         self.connection_timeout = 5.0
         self.last_connection_attempt = time.time()
         self.last_sync_time = time.time()
-        self.sync_interval = 0.05
+        self.sync_interval = SYNC_INTERVAL
 
         # Настройка сети
         try:
@@ -50,7 +51,7 @@ class NetworkManager:
     def send_connection_message(self):
         """Отправляет сообщение о подключении"""
         try:
-            data = pickle.dumps({
+            data = encode_message({
                 "type": "connection",
                 "connected": True,
                 "story": {
@@ -77,7 +78,7 @@ class NetworkManager:
             if self.is_host and not self.connection_established:
                 try:
                     # Отправляем подтверждение клиенту с текущим состоянием
-                    confirm_data = pickle.dumps({
+                    confirm_data = encode_message({
                         "type": "connection_confirm",
                         "connected": True,
                         "story": {
@@ -117,7 +118,7 @@ class NetworkManager:
         while True:
             try:
                 data, addr = self.socket.recvfrom(4096)
-                received_data = pickle.loads(data)
+                received_data = decode_message(data)
                 
                 # Обработка сообщений о подключении
                 if received_data.get("type") == "connection":
@@ -0,0 +1,78 @@
+import pygame
+
+
+def is_opaque(surface):
+    """Проверяет, что у поверхности нет прозрачных пикселей"""
+    width, height = surface.get_size()
+    return pygame.mask.from_surface(surface, 254).count() == width * height
+
+
+class ParallaxBackground:
+    """Многослойный фон с параллаксом.
+
+    Слои передаются от дальнего к ближнему парами (картинка, коэффициент).
+    Непрозрачные слои переводятся в формат экрана без альфа-канала, а если
+    дальний слой закрывает весь экран, экран не заливается черным. Соседние
+    слои с одинаковым коэффициентом сдвигаются одинаково и заранее
+    склеиваются в один. Слои шире экрана бесшовно повторяются по модулю
+    своей ширины. Пока камера стоит, собранный кадр фона выводится одним
+    непрозрачным блитом.
+    """
+
+    def __init__(self, layers, size):
+        self.width, self.height = size
+        self.layers = self.prepare_layers(layers)
+        first_image = self.layers[0][0] if self.layers else None
+        self.covers_screen = (first_image is not None and first_image.get_height() >= self.height
+                              and not first_image.get_flags() & pygame.SRCALPHA)
+        self._composite = None
+        self._composite_offsets = None
+        self._last_offsets = None
+
+    def prepare_layers(self, layers):
+        prepared = []
+        for image, factor in layers:
+            if is_opaque(image):
+                image = image.convert()
+
+            previous = prepared[-1] if prepared else None
+            if previous and previous[1] == factor and previous[0].get_size() == image.get_size():
+                merged = previous[0].copy()
+                merged.blit(image, (0, 0))
+                prepared[-1] = (merged, factor)
+            else:
+                prepared.append((image, factor))
+        return prepared
+
+    def get_offsets(self, scroll_x):
+        """Смещения слоев для положения камеры scroll_x"""
+        return tuple(int(scroll_x * factor) % image.get_width() for image, factor in self.layers)
+
+    def draw_layers(self, target, offsets):
+        if not self.covers_screen:
+            target.fill((0, 0, 0))
+
+        for (image, factor), offset in zip(self.layers, offsets):
+            image_width = image.get_width()
+            x = -offset
+            while x < self.width:
+                target.blit(image, (x, 0))
+                x += image_width
+
+    def draw(self, screen, scroll_x):
+        offsets = self.get_offsets(scroll_x)
+        if offsets == self._composite_offsets:
+            screen.blit(self._composite, (0, 0))
+            return
+
+        if offsets == self._last_offsets:
+            # Камера остановилась - собираем фон один раз и дальше выводим готовым
+            if self._composite is None:
+                self._composite = pygame.Surface((self.width, self.height)).convert()
+            self.draw_layers(self._composite, offsets)
+            self._composite_offsets = offsets
+            screen.blit(self._composite, (0, 0))
+            return
+
+        self._last_offsets = offsets
+        self.draw_layers(screen, offsets)
@@ -0,0 +1,368 @@
+import struct
+
+# Двоичный формат сетевых сообщений вместо pickle.
+#
+# Каждое сообщение: заголовок (магия, версия протокола, тип) и полезная
+# нагрузка фиксированной схемы для своего типа. encode_message/decode_message
+# принимают и возвращают те же словари, что раньше уходили в pickle, поэтому
+# обработчики сообщений не меняются. Данные из сети только распаковываются
+# по схеме - произвольный код при разборе не выполняется.
+PROTOCOL_MAGIC = 0xA11C
+PROTOCOL_VERSION = 5
+
+HEADER = struct.Struct("<HBB")            # магия, версия, тип сообщения
+STORY = struct.Struct("<BHf")             # стадия, номер текста, таймер
+CONNECTION = struct.Struct("<BBd")        # подключен, хост, время отправки
+CONFIRM = struct.Struct("<B")             # подключен
+DIALOG_FLAGS = struct.Struct("<B")        # флаги состояния диалога
+STRING_LENGTH = struct.Struct("<B")
+# x, y, флаги, анимация, маски собранных ключей и зелий, счетчики
+GAME_STATE = struct.Struct("<ffBBIIBB")
+# сеанс отправителя, сеанс получателя (как его знает отправитель), номер,
+# базовый номер, подтверждение, подтверждение надежного канала,
+# тик симуляции отправителя, флаги, маска полей
+SNAPSHOT = struct.Struct("<HHHHHHIBB")
+# Поля снимка по битам маски: x, y (16-битные), флаги игрока
+SNAPSHOT_FIELDS = (struct.Struct("<H"), struct.Struct("<H"), struct.Struct("<B"))
+# Событие надежного канала: сеанс отправителя, сеанс получателя, номер,
+# подтверждение, флаги; дальше - вложенное сообщение
+RELIABLE = struct.Struct("<HHHHB")
+PICKUP = struct.Struct("<BB")             # вид предмета, номер предмета
+
+MSG_CONNECTION = 1
+MSG_CONNECTION_CONFIRM = 2
+MSG_STORY_SYNC = 3
+MSG_DIALOG_UPDATE = 4
+MSG_DIALOG_END = 5
+MSG_GAME_STATE = 6
+MSG_SNAPSHOT = 7
+MSG_RELIABLE = 8
+MSG_PICKUP = 9
+
+STORY_STAGES = ("waiting", "ready", "story", "transition", "game")
+PLAYER_STATES = ("idle", "walk")
+PICKUP_KINDS = ("key", "potion")
+
+# Флаги состояния диалога
+DIALOG_ACTIVE = 1
+DIALOG_COMPLETED = 2
+DIALOG_HAS_ID = 4
+DIALOG_HAS_SPEAKER = 8
+
+# Флаги игрока
+PLAYER_FACING_RIGHT = 1
+PLAYER_MOVING = 2
+PLAYER_HAS_STATE = 4
+
+# Индексы предметов передаются битовой маской
+MAX_ITEMS = 32
+
+# Флаги снимка
+SNAPSHOT_HAS_BASELINE = 1
+SNAPSHOT_HAS_ACK = 2
+SNAPSHOT_HAS_RELIABLE_ACK = 4
+SNAPSHOT_HAS_PEER_SESSION = 8
+
+# Флаги события надежного канала
+RELIABLE_HAS_ACK = 1
+RELIABLE_HAS_PEER_SESSION = 2
+
+
+class ProtocolError(Exception):
+    """Сообщение не соответствует схеме протокола"""
+
+
+def pack_string(value):
+    data = value.encode("utf-8")
+    if len(data) > 255:
+        raise ProtocolError(f"Слишком длинная строка: {value[:20]}...")
+    return STRING_LENGTH.pack(len(data)) + data
+
+
+def unpack_string(data, offset):
+    (length,) = STRING_LENGTH.unpack_from(data, offset)
+    offset += STRING_LENGTH.size
+    if offset + length > len(data):
+        raise ProtocolError("Строка выходит за границу сообщения")
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+
+def pack_indices(indices):
+    mask = 0
+    for index in indices:
+        if not 0 <= index < MAX_ITEMS:
+            raise ProtocolError(f"Индекс предмета вне диапазона: {index}")
+        mask |= 1 << index
+    return mask
+
+
+def unpack_indices(mask):
+    indices = []
+    while mask:
+        low_bit = mask & -mask
+        indices.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return indices
+
+
+def encode_story(story):
+    return STORY.pack(STORY_STAGES.index(story.get("stage", "waiting")),
+                      story.get("text_index", 0), story.get("timer", 0))
+
+
+def decode_story(data, offset):
+    stage, text_index, timer = STORY.unpack_from(data, offset)
+    if stage >= len(STORY_STAGES):
+        raise ProtocolError(f"Неизвестная стадия истории: {stage}")
+    return {"stage": STORY_STAGES[stage], "text_index": text_index, "timer": timer}, offset + STORY.size
+
+
+def encode_connection(message):
+    return (CONNECTION.pack(message.get("connected", False), message.get("is_host", False),
+                            message.get("timestamp", 0.0))
+            + encode_story(message.get("story", {})))
+
+
+def decode_connection(data, offset):
+    connected, is_host, timestamp = CONNECTION.unpack_from(data, offset)
+    story, offset = decode_story(data, offset + CONNECTION.size)
+    return {"connected": bool(connected), "is_host": bool(is_host),
+            "timestamp": timestamp, "story": story}, offset
+
+
+def encode_confirm(message):
+    return CONFIRM.pack(message.get("connected", False)) + encode_story(message.get("story", {}))
+
+
+def decode_confirm(data, offset):
+    (connected,) = CONFIRM.unpack_from(data, offset)
+    story, offset = decode_story(data, offset + CONFIRM.size)
+    return {"connected": bool(connected), "story": story}, offset
+
+
+def encode_story_sync(message):
+    return encode_story(message.get("story", {}))
+
+
+def decode_story_sync(data, offset):
+    story, offset = decode_story(data, offset)
+    return {"story": story}, offset
+
+
+def encode_dialog(message):
+    state = message.get("dialog_state", {})
+    flags = 0
+    if state.get("is_active"):
+        flags |= DIALOG_ACTIVE
+    if state.get("dialog_completed"):
+        flags |= DIALOG_COMPLETED
+    payload = b""
+    if state.get("current_dialog_id") is not None:
+        flags |= DIALOG_HAS_ID
+        payload += pack_string(state["current_dialog_id"])
+    if state.get("current_speaker") is not None:
+        flags |= DIALOG_HAS_SPEAKER
+        payload += pack_string(state["current_speaker"])
+    return DIALOG_FLAGS.pack(flags) + payload
+
+
+def decode_dialog(data, offset):
+    (flags,) = DIALOG_FLAGS.unpack_from(data, offset)
+    offset += DIALOG_FLAGS.size
+    dialog_id = speaker = None
+    if flags & DIALOG_HAS_ID:
+        dialog_id, offset = unpack_string(data, offset)
+    if flags & DIALOG_HAS_SPEAKER:
+        speaker, offset = unpack_string(data, offset)
+    return {"dialog_state": {
+        "is_active": bool(flags & DIALOG_ACTIVE),
+        "current_dialog_id": dialog_id,
+        "current_speaker": speaker,
+        "dialog_completed": bool(flags & DIALOG_COMPLETED),
+    }}, offset
+
+
+def encode_game_state(message):
+    player = message["player"]
+    flags = 0
+    if player.get("facing_right"):
+        flags |= PLAYER_FACING_RIGHT
+    if player.get("moving"):
+        flags |= PLAYER_MOVING
+    state = 0
+    if "current_state" in player:
+        flags |= PLAYER_HAS_STATE
+        state = PLAYER_STATES.index(player["current_state"])
+    counters = message.get("counters", {})
+    return GAME_STATE.pack(player["x"], player["y"], flags, state,
+                           pack_indices(message.get("collected_keys", ())),
+                           pack_indices(message.get("collected_potions", ())),
+                           counters.get("keys", 0), counters.get("potions", 0))
+
+
+def decode_game_state(data, offset):
+    x, y, flags, state, keys_mask, potions_mask, keys, potions = GAME_STATE.unpack_from(data, offset)
+    player = {"x": x, "y": y,
+              "facing_right": bool(flags & PLAYER_FACING_RIGHT),
+              "moving": bool(flags & PLAYER_MOVING)}
+    if flags & PLAYER_HAS_STATE:
+        if state >= len(PLAYER_STATES):
+            raise ProtocolError(f"Неизвестное состояние анимации: {state}")
+        player["current_state"] = PLAYER_STATES[state]
+    return {"player": player,
+            "collected_keys": unpack_indices(keys_mask),
+            "collected_potions": unpack_indices(potions_mask),
+            "counters": {"keys": keys, "potions": potions}}, offset + GAME_STATE.size
+
+
+def encode_snapshot(message):
+    flags = 0
+    if message.get("baseline") is not None:
+        flags |= SNAPSHOT_HAS_BASELINE
+    if message.get("ack") is not None:
+        flags |= SNAPSHOT_HAS_ACK
+    if message.get("reliable_ack") is not None:
+        flags |= SNAPSHOT_HAS_RELIABLE_ACK
+    if message.get("peer_session") is not None:
+        flags |= SNAPSHOT_HAS_PEER_SESSION
+    values = message["values"]
+    changed = 0
+    chunks = []
+    for bit, field in enumerate(SNAPSHOT_FIELDS):
+        if bit in values:
+            changed |= 1 << bit
+            chunks.append(field.pack(values[bit]))
+    header = SNAPSHOT.pack(message["session"], message.get("peer_session") or 0,
+                           message["seq"], message.get("baseline") or 0, message.get("ack") or 0,
+                           message.get("reliable_ack") or 0, message.get("tick", 0), flags, changed)
+    return header + b"".join(chunks)
+
+
+def decode_snapshot(data, offset):
+    (session, peer_session, seq, baseline, ack, reliable_ack, tick,
+     flags, changed) = SNAPSHOT.unpack_from(data, offset)
+    offset += SNAPSHOT.size
+    values = {}
+    for bit, field in enumerate(SNAPSHOT_FIELDS):
+        if changed & (1 << bit):
+            (values[bit],) = field.unpack_from(data, offset)
+            offset += field.size
+    return {"session": session,
+            "peer_session": peer_session if flags & SNAPSHOT_HAS_PEER_SESSION else None,
+            "seq": seq,
+            "baseline": baseline if flags & SNAPSHOT_HAS_BASELINE else None,
+            "ack": ack if flags & SNAPSHOT_HAS_ACK else None,
+            "reliable_ack": reliable_ack if flags & SNAPSHOT_HAS_RELIABLE_ACK else None,
+            "tick": tick,
+            "values": values}, offset
+
+
+def encode_reliable(message):
+    flags = 0
+    if message.get("ack") is not None:
+        flags |= RELIABLE_HAS_ACK
+    if message.get("peer_session") is not None:
+        flags |= RELIABLE_HAS_PEER_SESSION
+    return RELIABLE.pack(message["session"], message.get("peer_session") or 0, message["seq"],
+                         message.get("ack") or 0, flags) + message["payload"]
+
+
+def decode_reliable(data, offset):
+    session, peer_session, seq, ack, flags = RELIABLE.unpack_from(data, offset)
+    offset += RELIABLE.size
+    # Вложенное сообщение разбирается отдельно, когда подойдет его очередь
+    return {"session": session,
+            "peer_session": peer_session if flags & RELIABLE_HAS_PEER_SESSION else None,
+            "seq": seq,
+            "ack": ack if flags & RELIABLE_HAS_ACK else None,
+            "payload": bytes(data[offset:])}, len(data)
+
+
+def encode_pickup(message):
+    return PICKUP.pack(PICKUP_KINDS.index(message["kind"]), message["index"])
+
+
+def decode_pickup(data, offset):
+    kind, index = PICKUP.unpack_from(data, offset)
+    if kind >= len(PICKUP_KINDS):
+        raise ProtocolError(f"Неизвестный вид предмета: {kind}")
+    return {"kind": PICKUP_KINDS[kind], "index": index}, offset + PICKUP.size
+
+
+# Схема протокола: имя типа -> (код, кодировщик, декодер)
+SCHEMA = {
+    "connection": (MSG_CONNECTION, encode_connection, decode_connection),
+    "connection_confirm": (MSG_CONNECTION_CONFIRM, encode_confirm, decode_confirm),
+    "story_sync": (MSG_STORY_SYNC, encode_story_sync, decode_story_sync),
+    "dialog_update": (MSG_DIALOG_UPDATE, encode_dialog, decode_dialog),
+    "dialog_end": (MSG_DIALOG_END, encode_dialog, decode_dialog),
+    "game_state": (MSG_GAME_STATE, encode_game_state, decode_game_state),
+    "snapshot": (MSG_SNAPSHOT, encode_snapshot, decode_snapshot),
+    "reliable": (MSG_RELIABLE, encode_reliable, decode_reliable),
+    "pickup": (MSG_PICKUP, encode_pickup, decode_pickup),
+}
+MESSAGE_NAMES = {code: name for name, (code, _, _) in SCHEMA.items()}
+
+
+def encode_message(message):
+    """Словарь сообщения -> байты датаграммы"""
+    name = message.get("type")
+    if name not in SCHEMA:
+        raise ProtocolError(f"Неизвестный тип сообщения: {name}")
+    code, encoder, _ = SCHEMA[name]
+    try:
+        return HEADER.pack(PROTOCOL_MAGIC, PROTOCOL_VERSION, code) + encoder(message)
+    except (struct.error, KeyError, ValueError) as e:
+        raise ProtocolError(f"Сообщение {name} не соответствует схеме: {e}")
+
+
+def decode_message(data):
+    """Байты датаграммы -> словарь сообщения с ключом "type" """
+    try:
+        magic, version, code = HEADER.unpack_from(data, 0)
+        if magic != PROTOCOL_MAGIC:
+            raise ProtocolError("Чужой пакет")
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Версия протокола {version}, ожидается {PROTOCOL_VERSION}")
+        if code not in MESSAGE_NAMES:
+            raise ProtocolError(f"Неизвестный код сообщения: {code}")
+        name = MESSAGE_NAMES[code]
+        message, offset = SCHEMA[name][2](data, HEADER.size)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ProtocolError(f"Поврежденное сообщение: {e}")
+    if offset != len(data):
+        raise ProtocolError("Лишние байты в конце сообщения")
+    message["type"] = name
+    return message
+
+
+def benchmark(iterations=100000):
+    """Сравнивает размер и скорость с прежней передачей через pickle"""
+    import pickle
+    import timeit
+
+    message = {
+        "type": "game_state",
+        "player": {"x": 1234.0, "y": 567.5, "facing_right": True, "moving": True,
+                   "current_state": "walk"},
+        "collected_keys": [0, 2],
+        "collected_potions": [1],
+        "counters": {"keys": 2, "potions": 1},
+    }
+    pickled = pickle.dumps(message)
+    packed = encode_message(message)
+    print(f"Размер сообщения: pickle {len(pickled)} байт, протокол {len(packed)} байт")
+
+    for title, encode, decode, data in (
+        ("pickle", pickle.dumps, pickle.loads, pickled),
+        ("протокол", encode_message, decode_message, packed),
+    ):
+        encode_time = timeit.timeit(lambda: encode(message), number=iterations)
+        decode_time = timeit.timeit(lambda: decode(data), number=iterations)
+        print(f"{title}: кодирование {encode_time / iterations * 1e6:.2f} мкс, "
+              f"разбор {decode_time / iterations * 1e6:.2f} мкс, "
+              f"{iterations / (encode_time + decode_time):.0f} сообщений/с")
+
+
+if __name__ == "__main__":
+    benchmark()
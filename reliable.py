@@ -0,0 +1,129 @@
+from protocol import encode_message
+from snapshot import SEQ_MASK, PeerSession, seq_newer
+
+# Таймаут повтора (RTO) по оценке времени ответа, как в TCP:
+# RTO = SRTT + 4 * RTTVAR, с удвоением при каждом повторе
+INITIAL_RTO = 0.25
+MIN_RTO = 0.05
+MAX_RTO = 2.0
+RTT_GAIN = 0.125
+RTT_VARIANCE_GAIN = 0.25
+# Сколько событий, пришедших раньше своей очереди, держим до недостающего
+RECEIVE_WINDOW = 64
+
+
+class ReliableChannel:
+    """Надежный упорядоченный канал событий поверх UDP.
+
+    Каждое событие (диалог, подбор предмета) получает номер и хранится до
+    подтверждения. Подтверждение - номер последнего события, принятого по
+    порядку; оно приходит в пакетах событий и в снимках состояния. Если
+    подтверждения нет дольше RTO, событие отправляется снова. Принимающая
+    сторона отбрасывает повторы и выдает события строго по порядку.
+
+    Пакеты несут номер сеанса (см. snapshot.PeerSession): события прошлой
+    игры на этом адресе не попадают в новую, а когда второй игрок начинает
+    новый сеанс, канал начинается заново.
+
+    Время канала идет от dt игрового цикла (update), а не от системных
+    часов, поэтому запись и воспроизведение игры остаются детерминированными.
+    """
+
+    def __init__(self, session=0):
+        self.sessions = PeerSession(session)
+        self.time = 0.0
+        self.next_seq = 0
+        self.pending = {}  # номер -> [данные события, время отправки, был ли повтор, rto]
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = INITIAL_RTO
+
+        self.expected = 0  # Номер следующего события от второго игрока
+        self.early = {}
+        self.received_any = False
+
+    @property
+    def ack(self):
+        """Номер последнего события, принятого по порядку, или None"""
+        if not self.received_any:
+            return None
+        return (self.expected - 1) & SEQ_MASK
+
+    def ack_for(self, peer_session):
+        """Подтверждение для пакета, адресованного сеансу peer_session"""
+        return self.ack if peer_session == self.sessions.peer else None
+
+    def reset(self):
+        """Второй игрок начал новый сеанс: события прошлого к нему не относятся"""
+        self.next_seq = 0
+        self.pending = {}
+        self.expected = 0
+        self.early = {}
+        self.received_any = False
+
+    def packet(self, seq):
+        return encode_message({"type": "reliable", "session": self.sessions.session,
+                               "peer_session": self.sessions.peer, "seq": seq, "ack": self.ack,
+                               "payload": self.pending[seq][0]})
+
+    def send(self, message):
+        """Ставит событие в канал и возвращает датаграмму для отправки"""
+        seq = self.next_seq
+        self.next_seq = (self.next_seq + 1) & SEQ_MASK
+        self.pending[seq] = [encode_message(message), self.time, False, self.rto]
+        return self.packet(seq)
+
+    def update(self, dt):
+        """Продвигает время канала; возвращает датаграммы для повтора"""
+        self.time += dt
+        packets = []
+        for seq, entry in self.pending.items():
+            if self.time - entry[1] >= entry[3]:
+                entry[1] = self.time
+                entry[2] = True
+                entry[3] = min(entry[3] * 2, MAX_RTO)
+                packets.append(self.packet(seq))
+        return packets
+
+    def acknowledge(self, ack, session):
+        """Второй игрок принял все события до ack включительно; session - наш
+        сеанс в его пакете"""
+        if ack is None or session != self.sessions.session:
+            return
+        for seq in [seq for seq in self.pending if not seq_newer(seq, ack)]:
+            _, sent_at, retransmitted, _ = self.pending.pop(seq)
+            # По повторно отправленным время ответа не меряем (алгоритм Карна)
+            if not retransmitted:
+                self.update_rto(self.time - sent_at)
+
+    def update_rto(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) * RTT_VARIANCE_GAIN
+            self.srtt += (rtt - self.srtt) * RTT_GAIN
+        self.rto = max(MIN_RTO, min(MAX_RTO, self.srtt + 4 * self.rttvar))
+
+    def receive(self, message):
+        """Пакет "reliable" от второго игрока -> события, готовые по порядку"""
+        peer = self.sessions.peer
+        if not self.sessions.accept(message):
+            return []
+        if peer is not None and self.sessions.peer != peer:
+            self.reset()
+        self.acknowledge(message["ack"], message["peer_session"])
+
+        seq = message["seq"]
+        if seq != self.expected and not seq_newer(seq, self.expected):
+            return []
+        if ((seq - self.expected) & SEQ_MASK) >= RECEIVE_WINDOW:
+            return []
+        self.early[seq] = message["payload"]
+
+        delivered = []
+        while self.expected in self.early:
+            delivered.append(self.early.pop(self.expected))
+            self.expected = (self.expected + 1) & SEQ_MASK
+            self.received_any = True
+        return delivered
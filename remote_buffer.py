@@ -0,0 +1,78 @@
+from collections import deque
+
+from timestep import lerp
+
+# Второй игрок рисуется с этой задержкой, чтобы между снимками было что
+# интерполировать: два периода отправки (net_scheduler.SYNC_INTERVAL)
+INTERPOLATION_DELAY = 0.1
+# При пропуске снимков движение продолжается по последней скорости не дольше
+MAX_EXTRAPOLATION = 0.1
+SNAPSHOT_BUFFER_SIZE = 16
+# Насколько быстро оценка сдвига часов следует за ростом задержки сети
+CLOCK_OFFSET_SMOOTHING = 0.05
+
+
+class SnapshotBuffer:
+    """Кольцевой буфер снимков позы второго игрока с метками времени.
+
+    Время снимка - время симуляции отправителя. Сдвиг между его часами и
+    нашими оценивается по самым быстрым пакетам. Поза берется на момент
+    "сейчас минус delay": между двумя снимками координаты интерполируются,
+    после последнего снимка - недолго экстраполируются по скорости.
+    """
+
+    def __init__(self, delay=INTERPOLATION_DELAY, max_extrapolation=MAX_EXTRAPOLATION,
+                 size=SNAPSHOT_BUFFER_SIZE):
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.snapshots = deque(maxlen=size)
+        self.clock_offset = None
+
+    def reset(self):
+        """Второй игрок начал новый сеанс: его время снимков снова с нуля"""
+        self.snapshots.clear()
+        self.clock_offset = None
+
+    def push(self, remote_time, local_time, pose):
+        """Добавляет снимок: pose - словарь player из game_state"""
+        sample = local_time - remote_time
+        if self.clock_offset is None or sample < self.clock_offset:
+            self.clock_offset = sample
+        else:
+            self.clock_offset += (sample - self.clock_offset) * CLOCK_OFFSET_SMOOTHING
+
+        # Снимки хранятся по возрастанию времени; устаревшие не нужны
+        if self.snapshots and remote_time <= self.snapshots[-1][0]:
+            return
+        self.snapshots.append((remote_time, pose))
+
+    def sample(self, local_time):
+        """Поза на момент отрисовки или None, если снимков еще нет"""
+        if not self.snapshots:
+            return None
+        render_time = local_time - self.clock_offset - self.delay
+
+        first_time, first = self.snapshots[0]
+        if render_time <= first_time:
+            return dict(first)
+
+        previous_time, previous = first_time, first
+        for time, pose in self.snapshots:
+            if time >= render_time:
+                alpha = (render_time - previous_time) / (time - previous_time)
+                result = dict(previous)
+                result["x"] = lerp(previous["x"], pose["x"], alpha)
+                result["y"] = lerp(previous["y"], pose["y"], alpha)
+                return result
+            previous_time, previous = time, pose
+
+        # Новее последнего снимка: продолжаем движение по скорости двух последних
+        last_time, last = self.snapshots[-1]
+        result = dict(last)
+        if len(self.snapshots) > 1:
+            before_time, before = self.snapshots[-2]
+            elapsed = min(render_time - last_time, self.max_extrapolation)
+            span = last_time - before_time
+            result["x"] = last["x"] + (last["x"] - before["x"]) / span * elapsed
+            result["y"] = last["y"] + (last["y"] - before["y"]) / span * elapsed
+        return result
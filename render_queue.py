@@ -0,0 +1,72 @@
+from spatial_grid import SpatialGrid
+
+# Слои отрисовки мира, от дальнего к ближнему
+LAYER_GROUND = 0      # Неподвижные платформы
+LAYER_PLATFORMS = 1   # Подвижные платформы
+LAYER_ITEMS = 2       # Ключи и зелья
+LAYER_PROPS = 3       # Фонари и декорации
+LAYER_SIGNS = 4
+LAYER_CHARACTERS = 5
+
+# Запас вокруг экрана при поиске: спрайты бывают больше rect объекта
+CULL_MARGIN = 64
+
+
+class RenderQueue:
+    """Очередь отрисовки мира с отсечением по сетке.
+
+    Объекты регистрируются со своим слоем в SpatialGrid; каждый кадр
+    запрашиваются только те, что рядом с экраном. Объект отдает спрайты
+    через get_sprites() как список (поверхность, (мировые x, y)), и
+    каждый слой выводится одним вызовом screen.blits. Если get_sprites()
+    возвращает None (например, запасная отрисовка без текстуры), для
+    объекта вызывается его обычный draw.
+    """
+
+    def __init__(self, world_width, world_height):
+        self.grid = SpatialGrid(world_width, world_height)
+        self.layers = {}
+        self._frame = {}
+
+    def add(self, obj, layer):
+        """Регистрирует объект мира в слое"""
+        self.layers[id(obj)] = layer
+        self.grid.insert(obj)
+
+    def remove(self, obj):
+        self.layers.pop(id(obj), None)
+        self.grid.remove(obj)
+
+    def move(self, obj):
+        """Обновляет положение подвижного объекта в сетке"""
+        self.grid.move(obj)
+
+    def begin(self, camera):
+        """Начинает кадр: собирает видимые зарегистрированные объекты"""
+        self._frame = {}
+        view = (int(camera.scroll_x) - CULL_MARGIN, int(camera.scroll_y) - CULL_MARGIN,
+                camera.width + CULL_MARGIN * 2, camera.height + CULL_MARGIN * 2)
+        for obj in self.grid.query(view):
+            self.submit(obj, self.layers[id(obj)])
+
+    def submit(self, obj, layer):
+        """Добавляет объект в кадр вне сетки (например, персонажа)"""
+        self._frame.setdefault(layer, []).append(obj)
+
+    def draw(self, screen, camera):
+        for layer in sorted(self._frame):
+            blits = []
+            for obj in self._frame[layer]:
+                sprites = obj.get_sprites(camera)
+                if sprites is None:
+                    # Сначала выводим накопленное, чтобы сохранить порядок
+                    if blits:
+                        screen.blits(blits, doreturn=False)
+                        blits = []
+                    obj.draw(screen, camera)
+                    continue
+                for surface, (x, y) in sprites:
+                    blits.append((surface, camera.apply(x, y)))
+            if blits:
+                screen.blits(blits, doreturn=False)
+        self._frame = {}
@@ -0,0 +1,99 @@
+import pygame
+
+# Режимы вывода кадра:
+# "full"  - кадр каждый раз рисуется целиком и выводится через display.flip
+# "dirty" - перерисовываются только изменившиеся области (display.update(rects))
+RENDER_MODE_FULL = "full"
+RENDER_MODE_DIRTY = "dirty"
+RENDER_MODE = RENDER_MODE_FULL
+
+# Если грязных областей больше, они объединяются в одну
+MAX_DIRTY_RECTS = 8
+
+# Ограничение частоты кадров отрисовки (0 - без ограничения). Симуляция
+# идет фиксированными шагами, а кадры между шагами сглаживаются интерполяцией
+RENDER_FPS = 144
+
+
+def merge_rects(rects):
+    """Объединяет пересекающиеся прямоугольники"""
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if merged[i].colliderect(rect):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+
+    if len(merged) > MAX_DIRTY_RECTS:
+        merged = [merged[0].unionall(merged[1:])]
+    return merged
+
+
+class DirtyRectRenderer:
+    """Вывод кадра с перерисовкой только изменившихся областей.
+
+    Каждый кадр игра отмечает (mark) экранные прямоугольники всего, что
+    могло измениться: персонажей, анимаций, текста диалога, интерфейса.
+    Сцена рисуется с обрезкой по этим областям (и по областям прошлого
+    кадра, чтобы стереть старое положение объектов), а на экран выводятся
+    только они. Если сменилось состояние камеры (view), кадр
+    перерисовывается целиком. В режиме "full" всегда рисуется весь кадр.
+    """
+
+    def __init__(self, screen, mode=RENDER_MODE):
+        self.screen = screen
+        self.mode = mode
+        self.screen_rect = screen.get_rect()
+        self.full_redraw = True
+        self._view = None
+        self._rects = []
+        self._previous_rects = []
+
+    def begin_frame(self, view=None):
+        """Начинает кадр; view - состояние камеры, при его смене кадр рисуется целиком"""
+        self._rects = []
+        if self.mode != RENDER_MODE_DIRTY or view != self._view:
+            self.full_redraw = True
+        self._view = view
+
+    def invalidate(self):
+        """Перерисовать текущий кадр целиком"""
+        self.full_redraw = True
+
+    def mark(self, rect):
+        """Отмечает область экрана, которую нужно перерисовать"""
+        if self.mode != RENDER_MODE_DIRTY:
+            return
+        rect = self.screen_rect.clip(rect)
+        if rect.width > 0 and rect.height > 0:
+            self._rects.append(rect)
+
+    def mark_all(self, rects):
+        for rect in rects:
+            self.mark(rect)
+
+    def render(self, draw_scene):
+        """Рисует сцену функцией draw_scene(screen) и выводит кадр на экран"""
+        if self.full_redraw:
+            draw_scene(self.screen)
+            pygame.display.flip()
+            self.full_redraw = False
+            self._previous_rects = self._rects
+            return
+
+        rects = self._rects
+        regions = merge_rects(rects + self._previous_rects)
+        self._previous_rects = rects
+        if not regions:
+            return
+
+        for region in regions:
+            self.screen.set_clip(region)
+            draw_scene(self.screen)
+        self.screen.set_clip(None)
+        pygame.display.update(regions)
@@ -0,0 +1,259 @@
+import importlib
+import struct
+import zlib
+
+import pygame
+
+from headless import InputSource, PressedKeys
+from transport import NullTransport
+
+# Формат файла записи:
+#   заголовок | тики подряд | индекс для перемотки | концевик
+# Тик: время кадра, маска зажатых клавиш, события KEYDOWN/QUIT и принятые
+# сетевые сообщения как есть. Сеанс игры пишется в заголовок: записанные
+# сообщения адресованы ему, и при воспроизведении игра получает тот же сеанс. Каждые REPLAY_INDEX_INTERVAL тиков в индекс
+# пишется смещение тика в файле и контрольная сумма состояния игры.
+REPLAY_MAGIC = b"ALRP"
+REPLAY_INDEX_MAGIC = b"ALRI"
+REPLAY_VERSION = 2
+REPLAY_INDEX_INTERVAL = 60
+
+REPLAY_HEADER = struct.Struct("<4sHBHB")  # магия, версия, хост, сеанс игры, длина имени уровня
+TICK_HEADER = struct.Struct("<dBBH")      # dt, маска клавиш, число событий, число сообщений
+EVENT_RECORD = struct.Struct("<BI")       # вид события, клавиша
+MESSAGE_HEADER = struct.Struct("<H")      # длина сообщения
+INDEX_ENTRY = struct.Struct("<IQI")       # тик, смещение в файле, контрольная сумма
+REPLAY_FOOTER = struct.Struct("<QI4s")    # смещение индекса, число записей, магия
+
+# Клавиши, которые игровой цикл читает через get_pressed, по битам маски
+REPLAY_KEYS = (pygame.K_LEFT, pygame.K_a, pygame.K_RIGHT, pygame.K_d)
+
+EVENT_KEYDOWN = 0
+EVENT_QUIT = 1
+
+# Модуль уровня по области ресурсов игры (game.py при запуске напрямую - __main__)
+LEVEL_MODULES = {"level1": "game", "level2": "level2"}
+
+
+class ReplayError(Exception):
+    """Файл записи поврежден или не совпадает с игрой"""
+
+
+def pack_keys(keys):
+    mask = 0
+    for bit, key in enumerate(REPLAY_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+def unpack_keys(mask):
+    return PressedKeys(key for bit, key in enumerate(REPLAY_KEYS) if mask & (1 << bit))
+
+
+def state_checksum(game):
+    """Контрольная сумма состояния мира для проверки детерминизма"""
+    values = []
+    for player in (game.my_player, game.other_player):
+        values.extend((player.x, player.y, player.vel_y))
+    for platform in game.moving_platforms:
+        values.extend((platform.x, platform.y))
+    values.extend((game.collected_keys, game.collected_potions,
+                   game.dialog_system.dialog_completed, game.victory_achieved))
+    return zlib.crc32(repr(values).encode())
+
+
+class ReplayRecorder:
+    """Пишет ввод каждого тика игрового цикла в двоичный файл записи.
+
+    Передается в Game.run(recorder=...); после игры файл закрывается через
+    close(), который дописывает индекс для перемотки.
+    """
+
+    def __init__(self, path, index_interval=REPLAY_INDEX_INTERVAL):
+        self.path = path
+        self.index_interval = index_interval
+        self.file = None
+        self.tick = 0
+        self.index = []
+
+    def start(self, game):
+        level = game.asset_scope.encode()
+        self.file = open(self.path, "wb")
+        self.file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, int(game.is_host),
+                                           game.session, len(level)))
+        self.file.write(level)
+
+    def record_tick(self, game, dt, keys, events, messages):
+        if self.file is None:
+            self.start(game)
+
+        if self.tick % self.index_interval == 0:
+            self.index.append((self.tick, self.file.tell(), state_checksum(game)))
+
+        records = []
+        for event in events:
+            if event.type == pygame.QUIT:
+                records.append(EVENT_RECORD.pack(EVENT_QUIT, 0))
+            elif event.type == pygame.KEYDOWN:
+                records.append(EVENT_RECORD.pack(EVENT_KEYDOWN, event.key))
+
+        chunks = [TICK_HEADER.pack(dt, pack_keys(keys), len(records), len(messages))]
+        chunks.extend(records)
+        for data in messages:
+            chunks.append(MESSAGE_HEADER.pack(len(data)))
+            chunks.append(data)
+        self.file.write(b"".join(chunks))
+        self.tick += 1
+
+    def close(self):
+        if self.file is None:
+            return
+        index_offset = self.file.tell()
+        self.file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in self.index))
+        self.file.write(REPLAY_FOOTER.pack(index_offset, len(self.index), REPLAY_INDEX_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class ReplayReader:
+    """Чтение файла записи: тики по порядку и перемотка по индексу"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+
+        if len(self.data) < REPLAY_HEADER.size + REPLAY_FOOTER.size:
+            raise ReplayError("Файл записи слишком короткий")
+        magic, version, is_host, session, name_length = REPLAY_HEADER.unpack_from(self.data, 0)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ReplayError(f"Неизвестный формат записи: {magic!r} версии {version}")
+        self.is_host = bool(is_host)
+        self.session = session
+        name_start = REPLAY_HEADER.size
+        self.level = self.data[name_start:name_start + name_length].decode()
+        self.ticks_offset = name_start + name_length
+
+        index_offset, count, magic = REPLAY_FOOTER.unpack_from(self.data, len(self.data) - REPLAY_FOOTER.size)
+        if magic != REPLAY_INDEX_MAGIC:
+            raise ReplayError("Запись не завершена: нет индекса")
+        self.ticks_end = index_offset
+        self.index = [INDEX_ENTRY.unpack_from(self.data, index_offset + i * INDEX_ENTRY.size)
+                      for i in range(count)]
+        self.checksums = {tick: checksum for tick, _, checksum in self.index}
+
+        self.offset = self.ticks_offset
+        self.tick = 0
+
+    def seek(self, tick):
+        """Переходит к тику через ближайшую предшествующую запись индекса"""
+        start_tick, offset = 0, self.ticks_offset
+        for entry_tick, entry_offset, _ in self.index:
+            if entry_tick > tick:
+                break
+            start_tick, offset = entry_tick, entry_offset
+        self.tick, self.offset = start_tick, offset
+        while self.tick < tick and self.read_tick() is not None:
+            pass
+
+    def read_tick(self):
+        """Следующий тик как (dt, клавиши, события, сообщения); None в конце записи"""
+        if self.offset >= self.ticks_end:
+            return None
+        data = self.data
+        dt, mask, event_count, message_count = TICK_HEADER.unpack_from(data, self.offset)
+        offset = self.offset + TICK_HEADER.size
+
+        events = []
+        for _ in range(event_count):
+            kind, key = EVENT_RECORD.unpack_from(data, offset)
+            offset += EVENT_RECORD.size
+            if kind == EVENT_QUIT:
+                events.append(pygame.event.Event(pygame.QUIT))
+            else:
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=key))
+
+        messages = []
+        for _ in range(message_count):
+            (length,) = MESSAGE_HEADER.unpack_from(data, offset)
+            offset += MESSAGE_HEADER.size
+            messages.append(data[offset:offset + length])
+            offset += length
+
+        self.offset = offset
+        self.tick += 1
+        return dt, unpack_keys(mask), events, messages
+
+    def count_ticks(self):
+        """Число тиков в записи"""
+        count = 0
+        offset, tick = self.offset, self.tick
+        self.seek(0)
+        while self.read_tick() is not None:
+            count += 1
+        self.offset, self.tick = offset, tick
+        return count
+
+
+class ReplayInput(InputSource):
+    """Ввод из файла записи: клавиши, время кадра и сообщения сети.
+
+    Живые сообщения сети отбрасываются и заменяются записанными. В тиках
+    с записью индекса состояние игры сверяется с контрольной суммой;
+    первое расхождение сохраняется в mismatch.
+    """
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.tick = 0
+        self.frame = None
+        self.mismatch = None
+
+    def get_events(self):
+        self.tick = self.reader.tick
+        self.frame = self.reader.read_tick()
+        if self.frame is None:
+            return [pygame.event.Event(pygame.QUIT)]
+        return self.frame[2]
+
+    def get_pressed(self):
+        return self.frame[1] if self.frame else PressedKeys()
+
+    def get_dt(self, dt):
+        return self.frame[0] if self.frame else dt
+
+    def get_messages(self, messages):
+        return self.frame[3] if self.frame else []
+
+    def check_state(self, game):
+        expected = self.reader.checksums.get(self.tick)
+        if self.mismatch is None and expected is not None and self.frame is not None:
+            actual = state_checksum(game)
+            if actual != expected:
+                self.mismatch = self.tick
+                print(f"Ошибка воспроизведения: состояние разошлось с записью на тике {self.tick}")
+
+
+def record_game(game, path, max_ticks=None):
+    """Запускает уровень с записью ввода в path; возвращает результат run()"""
+    recorder = ReplayRecorder(path)
+    try:
+        return game.run(max_ticks=max_ticks, recorder=recorder)
+    finally:
+        recorder.close()
+
+
+def play_replay(path, headless=True, host="localhost"):
+    """Воспроизводит запись на том уровне, где она была сделана.
+
+    Возвращает ReplayInput: mismatch - первый тик расхождения или None.
+    """
+    reader = ReplayReader(path)
+    if reader.level not in LEVEL_MODULES:
+        raise ReplayError(f"Неизвестный уровень в записи: {reader.level}")
+    game_class = importlib.import_module(LEVEL_MODULES[reader.level]).Game
+    source = ReplayInput(reader)
+    game = game_class(host, reader.is_host, headless=headless,
+                      transport=NullTransport(), input_source=source, session=reader.session)
+    game.run()
+    return source
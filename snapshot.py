@@ -0,0 +1,224 @@
+import os
+
+from protocol import PLAYER_STATES
+
+# Сколько последних снимков помнят обе стороны. Если подтвержденный
+# базовый снимок старше, отправляется полный снимок.
+SNAPSHOT_HISTORY = 32
+SEQ_MASK = 0xFFFF
+
+# Позиции квантуются в 16 бит по размеру мира с запасом по краям:
+# персонаж может ненадолго оказаться за границей мира
+QUANT_MAX = 0xFFFF
+QUANT_MARGIN = 0.5
+
+# Поля снимка в порядке битов маски (см. protocol.SNAPSHOT_FIELDS).
+# Подобранные предметы идут событиями по надежному каналу (reliable.py)
+FIELD_X = 0
+FIELD_Y = 1
+FIELD_FLAGS = 2
+FIELD_COUNT = 3
+
+# Флаги игрока в поле FIELD_FLAGS; номер анимации - в старших битах
+FLAG_FACING_RIGHT = 1
+FLAG_MOVING = 2
+FLAG_HAS_STATE = 4
+STATE_SHIFT = 3
+
+EMPTY_STATE = (0,) * FIELD_COUNT
+
+
+def seq_newer(a, b):
+    """a новее b с учетом переполнения 16-битного номера"""
+    return a != b and ((a - b) & SEQ_MASK) < 0x8000
+
+
+def seq_distance(newer, older):
+    return (newer - older) & SEQ_MASK
+
+
+def new_session():
+    """Случайный номер сеанса для новой игры (модуль random не трогаем,
+    чтобы не сбить его последовательность)"""
+    return int.from_bytes(os.urandom(2), "little")
+
+
+class PeerSession:
+    """Сеанс второго игрока для потока пакетов.
+
+    Каждая игра (уровень) выбирает свой номер сеанса, и номера потоков
+    начинаются с нуля. Пакет несет сеанс отправителя и наш сеанс, каким
+    его знает отправитель. Пакеты, отправленные прошлой игре на этом
+    адресе, и пакеты из сеансов, которые уже сменились, отбрасываются.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.peer = None
+        self.retired = set()
+
+    def accept(self, message):
+        """Принимать ли пакет; при новом сеансе второго игрока меняет peer"""
+        if message["peer_session"] not in (None, self.session):
+            return False
+        session = message["session"]
+        if session == self.peer:
+            return True
+        if session in self.retired:
+            return False
+        if self.peer is not None:
+            self.retired.add(self.peer)
+        self.peer = session
+        return True
+
+
+def quantize(value, size):
+    low = -size * QUANT_MARGIN
+    span = size * (1 + 2 * QUANT_MARGIN)
+    return max(0, min(QUANT_MAX, round((value - low) / span * QUANT_MAX)))
+
+
+def dequantize(value, size):
+    low = -size * QUANT_MARGIN
+    span = size * (1 + 2 * QUANT_MARGIN)
+    return low + value * span / QUANT_MAX
+
+
+class SnapshotSender:
+    """Отправляющая сторона: снимки состояния как разница с подтвержденным.
+
+    Каждый снимок получает номер и запоминается. Второй игрок в своих
+    снимках подтверждает последний принятый номер; следующий снимок
+    кодируется относительно него, и в пакет попадают только изменившиеся
+    поля. Пока подтверждений нет, уходят полные снимки.
+    """
+
+    def __init__(self, world_width, world_height, session=0, history=SNAPSHOT_HISTORY):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.session = session
+        self.history = history
+        self.seq = 0
+        self.sent = {}
+        self.acked = None
+
+    def make_state(self, game_state):
+        """Словарь game_state (как в протоколе) -> квантованный кортеж полей"""
+        player = game_state["player"]
+        flags = 0
+        if player.get("facing_right"):
+            flags |= FLAG_FACING_RIGHT
+        if player.get("moving"):
+            flags |= FLAG_MOVING
+        if "current_state" in player:
+            flags |= FLAG_HAS_STATE | (PLAYER_STATES.index(player["current_state"]) << STATE_SHIFT)
+        return (quantize(player["x"], self.world_width),
+                quantize(player["y"], self.world_height),
+                flags)
+
+    def acknowledge(self, seq, session):
+        """Второй игрок подтвердил прием снимка seq; session - наш сеанс в его пакете"""
+        if session != self.session:
+            # Подтверждение для прошлой игры или второй игрок нас еще не слышал
+            return
+        if seq is None:
+            # Второй игрок знает наш сеанс, но базовых снимков у него нет:
+            # он начал заново, следующий снимок уходит полным
+            self.acked = None
+            return
+        if seq not in self.sent:
+            return
+        if self.acked is None or seq_newer(seq, self.acked):
+            self.acked = seq
+
+    def build(self, game_state, ack=None, tick=0, peer_session=None):
+        """Сообщение "snapshot" для протокола; ack - последний принятый номер
+        из сеанса второго игрока peer_session, tick - тик симуляции, в котором
+        снято состояние"""
+        state = self.make_state(game_state)
+
+        baseline = None
+        if self.acked is not None and seq_distance(self.seq, self.acked) < self.history:
+            baseline = self.acked
+        base_state = self.sent[baseline] if baseline is not None else EMPTY_STATE
+
+        values = {}
+        for field in range(FIELD_COUNT):
+            if baseline is None or state[field] != base_state[field]:
+                values[field] = state[field]
+
+        message = {"type": "snapshot", "session": self.session, "peer_session": peer_session,
+                   "seq": self.seq, "baseline": baseline,
+                   "ack": ack, "tick": tick, "values": values}
+
+        self.sent[self.seq] = state
+        self.sent.pop((self.seq - self.history) & SEQ_MASK, None)
+        if self.acked is not None and self.acked not in self.sent:
+            self.acked = None
+        self.seq = (self.seq + 1) & SEQ_MASK
+        return message
+
+
+class SnapshotReceiver:
+    """Принимающая сторона: восстанавливает снимки по базовым.
+
+    receive() возвращает состояние в виде словаря game_state (с тиком
+    отправителя в "tick") или None, если базовый снимок неизвестен, пакет
+    пришел позже более нового или из другого сеанса. Когда второй игрок
+    начинает новый сеанс (новая игра), история снимков сбрасывается.
+    """
+
+    def __init__(self, world_width, world_height, session=0, history=SNAPSHOT_HISTORY):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.sessions = PeerSession(session)
+        self.history = history
+        self.received = {}
+        self.latest = None
+
+    @property
+    def peer_session(self):
+        return self.sessions.peer
+
+    def receive(self, message):
+        peer = self.sessions.peer
+        if not self.sessions.accept(message):
+            return None
+        if self.sessions.peer != peer:
+            self.received = {}
+            self.latest = None
+
+        seq = message["seq"]
+        baseline = message["baseline"]
+        if baseline is None:
+            base_state = EMPTY_STATE
+        elif baseline in self.received:
+            base_state = self.received[baseline]
+        else:
+            return None
+
+        values = message["values"]
+        state = tuple(values.get(field, base_state[field]) for field in range(FIELD_COUNT))
+
+        self.received[seq] = state
+        if self.latest is not None and not seq_newer(seq, self.latest):
+            return None
+        self.latest = seq
+        for old in [s for s in self.received if seq_distance(seq, s) >= self.history]:
+            del self.received[old]
+        game_state = self.make_game_state(state)
+        game_state["tick"] = message.get("tick", 0)
+        return game_state
+
+    def make_game_state(self, state):
+        """Квантованный кортеж полей -> словарь game_state"""
+        flags = state[FIELD_FLAGS]
+        player = {"x": dequantize(state[FIELD_X], self.world_width),
+                  "y": dequantize(state[FIELD_Y], self.world_height),
+                  "facing_right": bool(flags & FLAG_FACING_RIGHT),
+                  "moving": bool(flags & FLAG_MOVING)}
+        if flags & FLAG_HAS_STATE:
+            index = flags >> STATE_SHIFT
+            if index < len(PLAYER_STATES):
+                player["current_state"] = PLAYER_STATES[index]
+        return {"player": player}
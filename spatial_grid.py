@@ -0,0 +1,75 @@
+import pygame
+
+GRID_CELL_SIZE = 256
+
+
+class SpatialGrid:
+    """Равномерная сетка над миром для быстрого поиска объектов в области.
+
+    Объект хранится во всех ячейках, которые задевает его прямоугольник.
+    Запрос возвращает объекты в порядке добавления, поэтому порядок
+    отрисовки и обхода не зависит от раскладки по ячейкам.
+    """
+
+    def __init__(self, world_width, world_height, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.columns = max(1, -(-world_width // cell_size))
+        self.rows = max(1, -(-world_height // cell_size))
+        self.cells = {}
+        self.entries = {}  # id(obj) -> (порядковый номер, объект, ячейки)
+        self._next_order = 0
+
+    def _cells_for(self, rect):
+        size = self.cell_size
+        # Объекты за границами мира попадают в крайние ячейки
+        first_x = min(max(rect.left // size, 0), self.columns - 1)
+        last_x = min(max((rect.right - 1) // size, 0), self.columns - 1)
+        first_y = min(max(rect.top // size, 0), self.rows - 1)
+        last_y = min(max((rect.bottom - 1) // size, 0), self.rows - 1)
+        return [(x, y) for y in range(first_y, last_y + 1) for x in range(first_x, last_x + 1)]
+
+    def insert(self, obj, rect=None):
+        if id(obj) in self.entries:
+            self.move(obj, rect)
+            return
+        rect = pygame.Rect(rect if rect is not None else obj.rect)
+        cells = self._cells_for(rect)
+        self.entries[id(obj)] = (self._next_order, obj, cells)
+        self._next_order += 1
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(obj)
+
+    def remove(self, obj):
+        entry = self.entries.pop(id(obj), None)
+        if entry is None:
+            return
+        for cell in entry[2]:
+            self.cells[cell].remove(obj)
+
+    def move(self, obj, rect=None):
+        """Обновляет ячейки объекта; если ячейки не изменились, ничего не делает"""
+        entry = self.entries.get(id(obj))
+        if entry is None:
+            self.insert(obj, rect)
+            return
+        order, _, old_cells = entry
+        cells = self._cells_for(pygame.Rect(rect if rect is not None else obj.rect))
+        if cells == old_cells:
+            return
+        for cell in old_cells:
+            self.cells[cell].remove(obj)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(obj)
+        self.entries[id(obj)] = (order, obj, cells)
+
+    def query(self, rect):
+        """Объекты, чьи ячейки задевают rect, в порядке добавления"""
+        found = {}
+        for cell in self._cells_for(pygame.Rect(rect)):
+            for obj in self.cells.get(cell, ()):
+                found[id(obj)] = obj
+        entries = self.entries
+        return sorted(found.values(), key=lambda obj: entries[id(obj)][0])
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,153 @@
+"""Атлас спрайтов персонажей и анимированных ключей.
+
+Кадры Алисы, Кролика и ключей заранее масштабируются до игровых размеров
+и упаковываются в одну картинку с JSON-индексом. Сборка атласа:
+
+    python sprite_atlas.py
+
+Если атлас не собран или устарел, игра загружает кадры по отдельности.
+"""
+import os
+import json
+import pygame
+
+from asset_cache import ASSET_CACHE
+
+ATLAS_DIR = os.path.join("assets", "atlas")
+ATLAS_IMAGE = os.path.join(ATLAS_DIR, "sprites.png")
+ATLAS_INDEX = os.path.join(ATLAS_DIR, "sprites.json")
+ATLAS_MAX_WIDTH = 2048
+ATLAS_PADDING = 1
+
+
+def fit_frame(frame, size):
+    """Вписывает кадр в size с сохранением пропорций и центрирует его"""
+    source_ratio = frame.get_width() / frame.get_height()
+    target_ratio = size[0] / size[1]
+
+    if source_ratio > target_ratio:
+        new_width = size[0]
+        new_height = int(new_width / source_ratio)
+    else:
+        new_height = size[1]
+        new_width = int(new_height * source_ratio)
+
+    scaled = pygame.transform.smoothscale(frame, (new_width, new_height))
+
+    final = pygame.Surface(size, pygame.SRCALPHA)
+    final.blit(scaled, ((size[0] - new_width) // 2, (size[1] - new_height) // 2))
+    return final
+
+
+def scale_to_height(frame, height):
+    """Масштабирует кадр до высоты height с сохранением пропорций"""
+    aspect_ratio = frame.get_width() / frame.get_height()
+    return pygame.transform.scale(frame, (int(height * aspect_ratio), height))
+
+
+class SpriteAtlas:
+    def __init__(self, image, index):
+        self.image = image
+        self.sprites = index.get("sprites", {})
+
+    def get_frames(self, name, size=None, height=None):
+        """Возвращает кадры спрайта как подповерхности атласа.
+
+        Если размеры в индексе не совпадают с ожидаемыми (атлас собран
+        со старыми настройками), возвращает None.
+        """
+        entry = self.sprites.get(name)
+        if not entry:
+            return None
+        if size is not None and tuple(entry.get("size", ())) != tuple(size):
+            return None
+        if height is not None and entry.get("height") != height:
+            return None
+        return [self.image.subsurface(pygame.Rect(rect)) for rect in entry["frames"]]
+
+
+_atlas = None
+_atlas_loaded = False
+
+
+def get_atlas():
+    """Загружает атлас один раз на процесс; None, если он не собран"""
+    global _atlas, _atlas_loaded
+    if not _atlas_loaded:
+        _atlas_loaded = True
+        try:
+            with open(ATLAS_INDEX, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            image = ASSET_CACHE.load_image(ATLAS_IMAGE, scope="global")
+            _atlas = SpriteAtlas(image, index)
+        except Exception as e:
+            print(f"Атлас спрайтов недоступен, кадры загружаются по отдельности: {e}")
+            _atlas = None
+    return _atlas
+
+
+def get_atlas_frames(name, size=None, height=None):
+    """Кадры спрайта из атласа или None, если их там нет"""
+    atlas = get_atlas()
+    if atlas is None:
+        return None
+    return atlas.get_frames(name, size=size, height=height)
+
+
+def pack_frames(groups):
+    """Упаковывает кадры по полкам и возвращает (картинку атласа, индекс)"""
+    sprites = {}
+    blits = []
+    x = y = shelf_height = 0
+    atlas_width = 0
+
+    for name, frames, meta in groups:
+        rects = []
+        for frame in frames:
+            width, height = frame.get_size()
+            if x + width > ATLAS_MAX_WIDTH:
+                x = 0
+                y += shelf_height + ATLAS_PADDING
+                shelf_height = 0
+            rects.append([x, y, width, height])
+            blits.append((frame, (x, y)))
+            x += width + ATLAS_PADDING
+            shelf_height = max(shelf_height, height)
+            atlas_width = max(atlas_width, x)
+        sprites[name] = dict(meta, frames=rects)
+
+    image = pygame.Surface((max(1, atlas_width), max(1, y + shelf_height)), pygame.SRCALPHA)
+    image.blits(blits, doreturn=False)
+    return image, {"image": os.path.basename(ATLAS_IMAGE), "sprites": sprites}
+
+
+def build_atlas():
+    """Собирает атлас из исходных кадров"""
+    from game import SPRITE_CONFIG, KEY_ANIMATIONS, KEY_HEIGHT, load_sprite_frames, load_key_frames
+
+    groups = []
+    for character_name, states in SPRITE_CONFIG.items():
+        for state, config in states.items():
+            frames = load_sprite_frames(character_name, state)
+            groups.append((f"{character_name}/{state}", frames, {"size": list(config["size"])}))
+
+    for key_type in KEY_ANIMATIONS:
+        frames = load_key_frames(key_type)
+        groups.append((f"key/{key_type}", frames, {"height": KEY_HEIGHT}))
+
+    image, index = pack_frames(groups)
+
+    os.makedirs(ATLAS_DIR, exist_ok=True)
+    pygame.image.save(image, ATLAS_IMAGE)
+    with open(ATLAS_INDEX, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+
+    frames_count = sum(len(entry["frames"]) for entry in index["sprites"].values())
+    print(f"Атлас сохранен: {ATLAS_IMAGE} {image.get_size()}, кадров: {frames_count}")
+
+
+if __name__ == "__main__":
+    pygame.init()
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    build_atlas()
+    pygame.quit()
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+
+import pygame
+
+CHUNK_SIZE = 512
+# Запас вокруг чанка: платформы рисуют текстуру на 20 пикселей выше своего rect
+CHUNK_MARGIN = 32
+MAX_CHUNKS = 24
+
+
+class ChunkCamera:
+    """Камера, переводящая мировые координаты в координаты одного чанка"""
+    def __init__(self, x, y):
+        self.scroll_x = x
+        self.scroll_y = y
+
+    def apply(self, x, y):
+        return round(x - self.scroll_x), round(y - self.scroll_y)
+
+
+class StaticLayerCache:
+    """Слой неподвижных объектов, заранее собранный в чанки мира.
+
+    Чанки CHUNK_SIZE x CHUNK_SIZE строятся при первом попадании в кадр:
+    объекты рисуются в них своим же draw через ChunkCamera. Каждый кадр
+    на экран выводятся только 2-4 чанка под камерой, сколько бы объектов
+    ни было на уровне. Давно не видимые чанки вытесняются (LRU).
+    """
+
+    def __init__(self, objects, chunk_size=CHUNK_SIZE, max_chunks=MAX_CHUNKS):
+        self.objects = list(objects)
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self._chunks = OrderedDict()
+
+    def build_chunk(self, chunk_x, chunk_y):
+        """Рисует объекты, задевающие чанк; None, если чанк пустой"""
+        left = chunk_x * self.chunk_size
+        top = chunk_y * self.chunk_size
+        area = pygame.Rect(left, top, self.chunk_size, self.chunk_size).inflate(CHUNK_MARGIN * 2, CHUNK_MARGIN * 2)
+
+        objects = [obj for obj in self.objects if obj.rect.colliderect(area)]
+        if not objects:
+            return None
+
+        surface = pygame.Surface((self.chunk_size, self.chunk_size), pygame.SRCALPHA)
+        chunk_camera = ChunkCamera(left, top)
+        for obj in objects:
+            obj.draw(surface, chunk_camera)
+        return surface
+
+    def get_chunk(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        if key in self._chunks:
+            self._chunks.move_to_end(key)
+            return self._chunks[key]
+
+        chunk = self.build_chunk(chunk_x, chunk_y)
+        self._chunks[key] = chunk
+        if len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def get_sprites(self, camera):
+        """Чанки под камерой как (поверхность, мировые координаты)"""
+        size = self.chunk_size
+        first_x = int(camera.scroll_x // size)
+        first_y = int(camera.scroll_y // size)
+        last_x = int((camera.scroll_x + camera.width) // size)
+        last_y = int((camera.scroll_y + camera.height) // size)
+
+        sprites = []
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                chunk = self.get_chunk(chunk_x, chunk_y)
+                if chunk is not None:
+                    sprites.append((chunk, (chunk_x * size, chunk_y * size)))
+        return sprites
+
+    def draw(self, screen, camera):
+        """Выводит чанки, попадающие в видимую область камеры"""
+        screen.blits([(chunk, camera.apply(x, y)) for chunk, (x, y) in self.get_sprites(camera)],
+                     doreturn=False)
+
+    def invalidate(self, rect=None):
+        """Сбрасывает чанки, задевающие rect (или все), чтобы перерисовать их"""
+        if rect is None:
+            self._chunks.clear()
+            return
+        area = pygame.Rect(rect).inflate(CHUNK_MARGIN * 2, CHUNK_MARGIN * 2)
+        size = self.chunk_size
+        for key in list(self._chunks):
+            if area.colliderect((key[0] * size, key[1] * size, size, size)):
+                del self._chunks[key]
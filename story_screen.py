@@ -1,14 +1,21 @@
 import pygame
 import socket
-import pickle
 import threading
 import sys
 import os
 import time
 import pygame.mixer  # Добавляем импорт для звука
+from fonts import get_font, get_glyph_atlas
+from text_layout import TextLayout
+from protocol import encode_message, decode_message
+from net_scheduler import SYNC_INTERVAL
 
 # Инициализация звуковой подсистемы
-pygame.mixer.init()
+# Без звукового устройства (сервер сборки) игра работает без звука
+try:
+    pygame.mixer.init()
+except pygame.error as e:
+    print(f"Ошибка инициализации звука: {e}")
 
 # Константы
 SCREEN_WIDTH = 800
@@ -40,6 +47,7 @@ class StoryScreen:
         self.text_box_width = SCREEN_WIDTH - 100
         self.text_box_height = 150
         self.transition_delay = 1.0
+        self.drawn_state = None
         
         # Инициализация музыки
         try:
@@ -103,16 +111,7 @@ class StoryScreen:
         if self.current_stage in ["waiting", "ready"]:
             screen.fill((0, 0, 0))
             
-            # Выбираем текст в зависимости от стадии
-            current_text = self.ready_text if self.current_stage == "ready" else self.lobby_text
-            
-            # Вычисляем видимую часть текста
-            visible_chars = int(len(current_text) * self.lobby_text_progress)
-            display_text = current_text[:visible_chars]
-            
-            # Добавляем анимированные точки только для waiting
-            if self.current_stage == "waiting":
-                display_text += "." * self.dots_count
+            display_text = self.get_lobby_text()
             
             # Разбиваем текст на строки
             lines = self.wrap_text(display_text, self.text_box_width)
@@ -120,9 +119,7 @@ class StoryScreen:
             # Отрисовываем каждую строку
             y = SCREEN_HEIGHT//2 - (len(lines) * 30)//2
             for line in lines:
-                text = self.font.render(line, True, (255, 255, 255))
-                text_rect = text.get_rect(center=(SCREEN_WIDTH//2, y))
-                screen.blit(text, text_rect)
+                self.glyphs.draw_centered(screen, line, (SCREEN_WIDTH//2, y))
                 y += 30
             
         elif self.current_stage in ["story", "transition"]:
@@ -130,19 +127,11 @@ class StoryScreen:
                 screen.blit(self.story_images[self.current_text_index], (0, 0))
                 
             if self.current_text_index < len(self.story_texts):
-                full_text = self.story_texts[self.current_text_index]
-                text_progress = min(1.0, (self.story_timer * self.text_speed))
-                visible_chars = int(len(full_text) * text_progress)
-                current_text = full_text[:visible_chars]
+                current_text = self.get_story_text()
                 
                 if current_text:
                     # Создаем полупрозрачный фон для текста
-                    bg_rect = pygame.Rect(
-                        (SCREEN_WIDTH - self.text_box_width)//2,
-                        SCREEN_HEIGHT - self.text_box_height - 20,
-                        self.text_box_width,
-                        self.text_box_height
-                    )
+                    bg_rect = self.get_text_box_rect()
                     bg_surface = pygame.Surface((bg_rect.width, bg_rect.height), pygame.SRCALPHA)
                     bg_surface.fill((0, 0, 0, 180))
                     screen.blit(bg_surface, bg_rect)
@@ -153,18 +142,66 @@ class StoryScreen:
                     # Отрисовываем каждую строку
                     y = bg_rect.y + 20
                     for line in lines:
-                        text = self.font.render(line, True, (255, 255, 255))
-                        text.set_alpha(self.text_alpha)
-                        text_rect = text.get_rect(center=(SCREEN_WIDTH//2, y))
-                        screen.blit(text, text_rect)
+                        self.glyphs.draw_centered(screen, line, (SCREEN_WIDTH//2, y), alpha=self.text_alpha)
                         y += 30
 
+    def get_lobby_text(self):
+        """Видимая часть текста ожидания"""
+        # Выбираем текст в зависимости от стадии
+        current_text = self.ready_text if self.current_stage == "ready" else self.lobby_text
+        
+        # Вычисляем видимую часть текста
+        visible_chars = int(len(current_text) * self.lobby_text_progress)
+        display_text = current_text[:visible_chars]
+        
+        # Добавляем анимированные точки только для waiting
+        if self.current_stage == "waiting":
+            display_text += "." * self.dots_count
+        return display_text
+
+    def get_story_text(self):
+        """Видимая часть текста текущей сцены истории"""
+        if self.current_text_index >= len(self.story_texts):
+            return ""
+        full_text = self.story_texts[self.current_text_index]
+        text_progress = min(1.0, (self.story_timer * self.text_speed))
+        visible_chars = int(len(full_text) * text_progress)
+        return full_text[:visible_chars]
+
+    def get_text_box_rect(self):
+        """Рамка текста поверх картинки истории"""
+        return pygame.Rect(
+            (SCREEN_WIDTH - self.text_box_width)//2,
+            SCREEN_HEIGHT - self.text_box_height - 20,
+            self.text_box_width,
+            self.text_box_height
+        )
+
+    def get_view_state(self):
+        """Фон экрана: при его смене кадр перерисовывается целиком"""
+        if self.current_stage in ["waiting", "ready"]:
+            return self.current_stage
+        return self.current_text_index
+
+    def get_dirty_rects(self):
+        """Область текста, если он изменился с прошлого вызова"""
+        if self.current_stage in ["waiting", "ready"]:
+            state = (self.current_stage, self.get_lobby_text())
+            rect = pygame.Rect(0, SCREEN_HEIGHT//2 - 120, SCREEN_WIDTH, 240)
+        else:
+            state = (self.current_text_index, self.get_story_text(), self.text_alpha)
+            rect = self.get_text_box_rect()
+        
+        if state == self.drawn_state:
+            return []
+        self.drawn_state = state
+        return [rect]
+
     def load_resources(self):
         """Загружает шрифт и картинки для истории"""
-        try:
-            self.font = pygame.font.Font(os.path.join("assets", "fonts", "visitor2.otf"), 36)
-        except:
-            self.font = pygame.font.Font(None, 36)
+        self.font = get_font(36)
+        self.layout = TextLayout(self.font)
+        self.glyphs = get_glyph_atlas(36, (255, 255, 255))
             
         # Загружаем картинки для истории
         try:
@@ -193,30 +230,7 @@ class StoryScreen:
 
     def wrap_text(self, text, max_width):
         """Разбивает текст на строки, чтобы он помещался в заданную ширину"""
-        words = text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            # Пробуем добавить следующее слово
-            test_line = ' '.join(current_line + [word])
-            test_surface = self.font.render(test_line, True, (255, 255, 255))
-            
-            # Если текст не помещается, начинаем новую строку
-            if test_surface.get_width() > max_width:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                    current_line = [word]
-                else:
-                    lines.append(word)
-            else:
-                current_line.append(word)
-        
-        # Добавляем последнюю строку
-        if current_line:
-            lines.append(' '.join(current_line))
-        
-        return lines
+        return self.layout.wrap(text, max_width)
 
     def set_initial_stage(self, is_host):
         """Устанавливает начальное состояние в зависимости от роли"""
@@ -242,7 +256,7 @@ class NetworkManager:
         self.connection_timeout = 5.0
         self.last_connection_attempt = time.time()
         self.last_sync_time = time.time()
-        self.sync_interval = 0.05
+        self.sync_interval = SYNC_INTERVAL
 
         # Устанавливаем начальное состояние
         self.story_screen.set_initial_stage(is_host)
@@ -280,7 +294,7 @@ class NetworkManager:
     def send_connection_message(self):
         """Отправляет сообщение о подключении"""
         try:
-            data = pickle.dumps({
+            data = encode_message({
                 "type": "connection",
                 "connected": True,
                 "story": {
@@ -307,7 +321,7 @@ class NetworkManager:
             if self.is_host and not self.connection_established:
                 try:
                     # Отправляем подтверждение клиенту
-                    confirm_data = pickle.dumps({
+                    confirm_data = encode_message({
                         "type": "connection_confirm",
                         "connected": True,
                         "story": {
@@ -342,7 +356,7 @@ class NetworkManager:
         while True:
             try:
                 data, addr = self.socket.recvfrom(4096)
-                received_data = pickle.loads(data)
+                received_data = decode_message(data)
                 
                 # Обработка сообщений о подключении
                 if received_data.get("type") == "connection":
@@ -361,7 +375,7 @@ class NetworkManager:
                         self.story_screen.lobby_text_progress = 0
                         
                         # Отправляем ответное подтверждение
-                        confirm_data = pickle.dumps({
+                        confirm_data = encode_message({
                             "type": "connection_confirm",
                             "connected": True,
                             "story": {
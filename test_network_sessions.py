@@ -0,0 +1,165 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from protocol import encode_message, decode_message
+from snapshot import SnapshotSender, SnapshotReceiver
+from reliable import ReliableChannel
+from transport import NullTransport
+
+# Проверка перезапуска игры на том же адресе (переход с уровня на уровень):
+# пакеты прошлой игры не должны мешать потоку новой.
+# Запуск: python -m pytest test_network_sessions.py или python test_network_sessions.py
+
+WORLD = (3000, 1000)
+OLD_SESSION = 101
+NEW_SESSION = 202
+MY_SESSION = 303
+
+
+def player_state(x):
+    return {"player": {"x": x, "y": 500.0, "facing_right": True, "moving": True}}
+
+
+def wire(message):
+    """Сообщение через кодирование протокола, как по сети"""
+    return decode_message(encode_message(message))
+
+
+def exchange(sender, receiver, x):
+    """Один снимок от sender к receiver и подтверждение обратно"""
+    message = wire(sender.build(player_state(x), peer_session=MY_SESSION))
+    game_state = receiver.receive(message)
+    sender.acknowledge(receiver.latest, receiver.peer_session)
+    return message, game_state
+
+
+def feed(game, sender, x, tick):
+    """Снимок от sender в игру game через handle_message и шаг второго игрока"""
+    game.sim_tick += 1
+    message = sender.build(player_state(x), tick=tick, peer_session=game.session)
+    game.handle_message(encode_message(message))
+    game.update_remote_player()
+
+
+def test_snapshot_stream_survives_sender_restart():
+    receiver = SnapshotReceiver(*WORLD, session=MY_SESSION)
+
+    old_sender = SnapshotSender(*WORLD, session=OLD_SESSION)
+    for i in range(1200):
+        late, _ = exchange(old_sender, receiver, 100.0 + i)
+
+    # Новая игра второго игрока снова считает снимки с нуля
+    new_sender = SnapshotSender(*WORLD, session=NEW_SESSION)
+    for i in range(10):
+        _, game_state = exchange(new_sender, receiver, 50.0 + i)
+        assert game_state is not None
+        assert abs(game_state["player"]["x"] - (50.0 + i)) < 1
+    # После первых подтверждений снимки снова идут разницей с базовым
+    assert new_sender.acked is not None
+
+    # Опоздавший снимок прошлой игры отбрасывается и не сбивает поток
+    assert receiver.receive(late) is None
+    _, game_state = exchange(new_sender, receiver, 70.0)
+    assert game_state is not None
+
+    # В игре поза второго игрока берется из буфера интерполяции:
+    # его шкала времени тоже начинается заново
+    import game
+    remote = game.Game("127.0.0.1", False, headless=True, transport=NullTransport())
+    try:
+        old_sender = SnapshotSender(game.WORLD_WIDTH, game.WORLD_HEIGHT, session=OLD_SESSION)
+        for tick in range(3000):
+            feed(remote, old_sender, 1000.0 + tick * 0.5, tick)
+        assert remote.other_player.x > 2000
+
+        new_sender = SnapshotSender(game.WORLD_WIDTH, game.WORLD_HEIGHT, session=NEW_SESSION)
+        for tick in range(30):
+            feed(remote, new_sender, 300.0, tick)
+        assert abs(remote.other_player.x - 300.0) < 1
+    finally:
+        remote.close()
+
+
+def test_snapshot_from_previous_game_is_dropped():
+    # Снимок, отправленный прошлой игре на этом адресе, пришел в новую первым
+    old_sender = SnapshotSender(*WORLD, session=OLD_SESSION)
+    for _ in range(500):
+        old_sender.build(player_state(100.0), peer_session=MY_SESSION)
+    late = wire(old_sender.build(player_state(100.0), peer_session=MY_SESSION))
+
+    receiver = SnapshotReceiver(*WORLD, session=MY_SESSION + 1)
+    assert receiver.receive(late) is None
+
+    new_sender = SnapshotSender(*WORLD, session=NEW_SESSION)
+    message = wire(new_sender.build(player_state(60.0)))
+    assert receiver.receive(message) is not None
+
+    # Подтверждение для другого сеанса не принимается отправителем
+    new_sender.acknowledge(message["seq"], OLD_SESSION)
+    assert new_sender.acked is None
+
+
+def pickup(index):
+    return {"type": "pickup", "kind": "potion", "index": index}
+
+
+def deliver(packet, channel):
+    """Пакет через протокол в канал -> номера доставленных предметов"""
+    return [decode_message(payload)["index"] for payload in channel.receive(decode_message(packet))]
+
+
+def test_reliable_packet_from_previous_game_is_dropped():
+    # Прошлая игра второго игрока успела отправить события 0..9 нашей прошлой игре
+    old_peer = ReliableChannel(OLD_SESSION)
+    old_me = ReliableChannel(MY_SESSION)
+    old_peer.receive(decode_message(old_me.send(pickup(0))))
+    old_packets = [old_peer.send(pickup(31)) for _ in range(10)]
+    for packet in old_packets:
+        deliver(packet, old_me)
+    late = old_packets[5]
+
+    # Новые игры с обеих сторон: номера событий снова с нуля
+    me = ReliableChannel(MY_SESSION + 1)
+    peer = ReliableChannel(NEW_SESSION)
+    delivered = []
+    for index in range(10):
+        packet = peer.send(pickup(index))
+        if index == 4:
+            # Опоздавший пакет прошлой игры с тем же номером 5
+            delivered += deliver(late, me)
+        delivered += deliver(packet, me)
+    assert delivered == list(range(10))
+
+
+def test_reliable_channel_restarts_with_peer():
+    me = ReliableChannel(MY_SESSION)
+    old_peer = ReliableChannel(OLD_SESSION)
+    for index in range(7):
+        assert deliver(old_peer.send(pickup(index)), me) == [index]
+    # Наше событие прошлому сеансу, так и не подтвержденное
+    me.send(pickup(20))
+    stale = old_peer.send(pickup(8))
+
+    # Второй игрок начал заново: канал сбрасывается, номера с нуля
+    new_peer = ReliableChannel(NEW_SESSION)
+    assert deliver(new_peer.send(pickup(0)), me) == [0]
+    assert me.pending == {}
+    assert deliver(new_peer.send(pickup(1)), me) == [1]
+    # Повтор из сменившегося сеанса не доставляется
+    assert deliver(stale, me) == []
+
+    # Подтверждение возвращается новому сеансу
+    packet = decode_message(me.send(pickup(2)))
+    new_peer.receive(packet)
+    assert new_peer.pending == {}
+    assert deliver(new_peer.send(pickup(2)), me) == [2]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import time
+
+# Запись игры с живым вторым игроком и ее воспроизведение: принятые пакеты
+# адресованы сеансу записанной игры, и воспроизведение должно их принять.
+# Запуск: python -m pytest test_replay.py или python test_replay.py
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+
+from headless import PressedKeys, ScriptedInput
+from replay import ReplayReader, record_game, play_replay
+from transport import LoopbackTransport
+
+RECORD_TICKS = 200
+# Через 2 секунды хост начинает диалог, и событие по надежному каналу
+# сообщает второму игроку сеанс хоста. Подбор после этого адресован ему.
+PICKUP_TICK = 150
+
+
+def step_peer(peer, tick):
+    """Тик второго игрока вручную: принять пакеты, сделать шаг, отправить"""
+    for data in peer.receive_messages():
+        peer.handle_message(data)
+    step = peer.scheduler.step
+    peer.update_world(PressedKeys([pygame.K_RIGHT]), step)
+    if tick == PICKUP_TICK:
+        # Подбор ключа уходит событием по надежному каналу
+        peer.animated_keys[0].collected = True
+        peer.collected_keys += 1
+        peer.send_reliable({"type": "pickup", "kind": "key", "index": 0})
+    if peer.net_scheduler.should_send(step, peer.my_player.get_pose()):
+        peer.send_data()
+    peer.resend_reliable(step)
+
+
+def record_with_peer(module, path):
+    """Записывает хоста, пока второй игрок идет вправо и подбирает ключ"""
+    host_transport, peer_transport = LoopbackTransport.pair()
+    peer = module.Game("127.0.0.1", False, headless=True, transport=peer_transport)
+
+    def script(tick):
+        if tick >= RECORD_TICKS:
+            return None
+        step_peer(peer, tick)
+        # Даем потокам приема доставить пакеты
+        time.sleep(0.002)
+        return (), ()
+
+    host = module.Game("127.0.0.1", True, headless=True, transport=host_transport,
+                       input_source=ScriptedInput(script))
+    host.dialog_system.is_active = peer.dialog_system.is_active = False
+    start_x = host.other_player.x
+    try:
+        record_game(host, path)
+    finally:
+        peer.close()
+    assert host.other_player.x != start_x, "снимки второго игрока не дошли до хоста"
+    assert host.animated_keys[0].collected, "подбор не дошел до хоста"
+    assert host.collected_keys == peer.collected_keys
+    return host
+
+
+def check_replay(module):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"{module.__name__}.rpl")
+        host = record_with_peer(module, path)
+        assert ReplayReader(path).session == host.session
+        source = play_replay(path)
+        assert source.mismatch is None
+    return host
+
+
+def test_replay_accepts_recorded_snapshots_and_pickups():
+    import game
+    import level2
+    for module in (game, level2):
+        check_replay(module)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+
+LAYOUT_CACHE_SIZE = 256
+
+
+class TextLayout:
+    """Перенос текста по словам для одного шрифта.
+
+    Ширина строк считается через font.size, ширины слов кэшируются, а
+    готовый перенос запоминается для каждой пары (text, max_width).
+    Когда текст только дописывается (эффект печатной машинки), перенос
+    продолжается со строки, в которой было последнее слово прошлого текста.
+    """
+
+    def __init__(self, font, cache_size=LAYOUT_CACHE_SIZE):
+        self.font = font
+        self.cache_size = cache_size
+        self.space_width = font.size(" ")[0]
+        self._word_widths = {}
+        self._layouts = OrderedDict()
+        self._last_layouts = {}
+
+    def word_width(self, word):
+        width = self._word_widths.get(word)
+        if width is None:
+            width = self.font.size(word)[0]
+            self._word_widths[word] = width
+        return width
+
+    def wrap(self, text, max_width):
+        """Разбивает текст на строки не шире max_width"""
+        key = (text, max_width)
+        lines = self._layouts.get(key)
+        if lines is not None:
+            self._layouts.move_to_end(key)
+            return lines
+
+        words = text.split()
+        lines = []
+        line_starts = []
+        start = 0
+
+        previous = self._last_layouts.get(max_width)
+        if previous and previous[1] and text.startswith(previous[0]):
+            _, previous_words, previous_lines, previous_starts = previous
+            # Последнее слово могло дописаться - переносим заново его строку
+            last_word = len(previous_words) - 1
+            line_index = len(previous_starts) - 1
+            while line_index > 0 and previous_starts[line_index] > last_word:
+                line_index -= 1
+            lines = previous_lines[:line_index]
+            line_starts = previous_starts[:line_index]
+            start = previous_starts[line_index] if previous_starts else 0
+
+        self._wrap_words(words, start, max_width, lines, line_starts)
+
+        self._last_layouts[max_width] = (text, words, lines, line_starts)
+        self._layouts[key] = lines
+        if len(self._layouts) > self.cache_size:
+            self._layouts.popitem(last=False)
+        return lines
+
+    def _wrap_words(self, words, start, max_width, lines, line_starts):
+        current_line = []
+        current_width = 0
+        current_start = start
+
+        for i in range(start, len(words)):
+            word = words[i]
+            width = self.word_width(word)
+            test_width = current_width + self.space_width + width if current_line else width
+
+            if test_width <= max_width:
+                if not current_line:
+                    current_start = i
+                current_line.append(word)
+                current_width = test_width
+            elif current_line:
+                lines.append(' '.join(current_line))
+                line_starts.append(current_start)
+                current_line = [word]
+                current_width = width
+                current_start = i
+            else:
+                # Слово шире строки - выводим его отдельной строкой
+                lines.append(word)
+                line_starts.append(i)
+
+        if current_line:
+            lines.append(' '.join(current_line))
+            line_starts.append(current_start)
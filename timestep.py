@@ -0,0 +1,54 @@
+SIMULATION_RATE = 60
+FIXED_DT = 1.0 / SIMULATION_RATE
+# Больше шагов за кадр не выполняем, иначе медленный кадр тянет за собой следующие
+MAX_STEPS_PER_FRAME = 5
+# Скачок больше этого расстояния (телепорт, поправка по сети) не сглаживается
+INTERPOLATION_SNAP_DISTANCE = 200
+
+
+class FixedStepScheduler:
+    """Накопитель времени для симуляции с фиксированным шагом.
+
+    Кадр добавляет прошедшее время, а мир обновляется целым числом шагов
+    по step секунд, поэтому физика не зависит от частоты кадров. Если
+    кадр затянулся дольше max_steps шагов, остаток времени отбрасывается:
+    игра замедляется, но не уходит в "спираль смерти".
+    """
+
+    def __init__(self, step=FIXED_DT, max_steps=MAX_STEPS_PER_FRAME):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.dropped_time = 0.0  # Сколько времени отброшено из-за лимита шагов
+
+    def advance(self, dt):
+        """Добавляет время кадра и возвращает число шагов симуляции"""
+        self.accumulator += max(0.0, dt)
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            dropped = (steps - self.max_steps) * self.step
+            self.dropped_time += dropped
+            self.accumulator -= dropped
+            steps = self.max_steps
+        self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self):
+        """Доля следующего шага, уже накопленная к моменту отрисовки (0..1)"""
+        return min(1.0, self.accumulator / self.step)
+
+    def reset(self):
+        self.accumulator = 0.0
+
+
+def lerp(start, end, alpha):
+    """Линейная интерполяция между start и end"""
+    return start + (end - start) * alpha
+
+
+def interpolate_position(prev_x, prev_y, x, y, alpha):
+    """Положение между двумя шагами симуляции; далекие скачки не сглаживаются"""
+    if abs(x - prev_x) > INTERPOLATION_SNAP_DISTANCE or abs(y - prev_y) > INTERPOLATION_SNAP_DISTANCE:
+        return x, y
+    return lerp(prev_x, x, alpha), lerp(prev_y, y, alpha)
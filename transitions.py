@@ -0,0 +1,103 @@
+import pygame
+
+from fonts import get_font, get_glyph_atlas
+from text_layout import TextLayout
+
+VICTORY_FONT_SIZE = 48
+VICTORY_TEXT_COLOR = (0, 0, 0)
+FADE_STEP = 5  # Изменение прозрачности затемнения за кадр
+
+
+class VictoryScreen:
+    """Финальная заставка уровня: белый фон, печатаемый текст и картинка.
+
+    Поверхности готовятся один раз при создании уровня; во время показа
+    у них меняется только прозрачность, новых поверхностей не создается.
+    """
+
+    def __init__(self, size, text, image=None, wrap_width=None,
+                 text_delay=1.0, text_speed=0.5, image_delay=4.0):
+        self.width, self.height = size
+        self.text = text
+        self.wrap_width = wrap_width
+        self.text_delay = text_delay
+        self.text_speed = text_speed
+        self.image_delay = image_delay
+
+        self.white = pygame.Surface(size).convert()
+        self.white.fill((255, 255, 255))
+
+        # Картинка заранее приводится к размеру экрана и формату дисплея
+        self.image = None
+        if image is not None:
+            if image.get_size() != size:
+                image = pygame.transform.scale(image, size)
+            self.image = image.convert_alpha()
+
+        font = get_font(VICTORY_FONT_SIZE)
+        self.line_height = font.get_linesize()
+        self.layout = TextLayout(font)
+        self.glyphs = get_glyph_atlas(VICTORY_FONT_SIZE, VICTORY_TEXT_COLOR)
+        # Все глифы текста попадают в атлас заранее
+        self.glyphs.size(text)
+
+    def get_visible_text(self, timer):
+        """Напечатанная к моменту timer часть текста"""
+        if timer <= self.text_delay:
+            return ""
+        text_progress = min(1.0, (timer - self.text_delay) * self.text_speed)
+        return self.text[:int(len(self.text) * text_progress)]
+
+    def is_opaque(self, timer):
+        """Белый фон уже полностью закрыл сцену"""
+        return timer >= 1.0
+
+    def draw(self, screen, timer):
+        # Белый фон с плавным появлением
+        self.white.set_alpha(min(255, int(timer * 255)))
+        screen.blit(self.white, (0, 0))
+
+        current_text = self.get_visible_text(timer)
+        if current_text:
+            if self.wrap_width:
+                lines = self.layout.wrap(current_text, self.wrap_width)
+            else:
+                lines = [current_text]
+
+            # Строки центрируются по горизонтали, блок строк - по вертикали
+            center_y = self.height // 2 - (len(lines) - 1) * self.line_height // 2
+            for i, line in enumerate(lines):
+                self.glyphs.draw_centered(screen, line, (self.width // 2, center_y + i * self.line_height))
+
+        # Картинка плавно появляется после текста
+        if timer > self.image_delay and self.image:
+            self.image.set_alpha(min(255, int((timer - self.image_delay) * 255)))
+            screen.blit(self.image, (0, 0))
+
+
+class FadeTransition:
+    """Плавное затемнение (или появление) сцены.
+
+    Кадр сцены снимается один раз, затемнение - одна поверхность, у
+    которой каждый кадр меняется только прозрачность.
+    """
+
+    def __init__(self, scene, fade_out=True, color=(0, 0, 0), step=FADE_STEP):
+        self.scene = scene
+        self.overlay = pygame.Surface(scene.get_size()).convert()
+        self.overlay.fill(color)
+        self.alpha = 0 if fade_out else 255
+        self.target_alpha = 255 if fade_out else 0
+        self.step = step if fade_out else -step
+
+    @property
+    def done(self):
+        return self.alpha == self.target_alpha
+
+    def update(self):
+        self.alpha = max(0, min(255, self.alpha + self.step))
+
+    def draw(self, screen):
+        screen.blit(self.scene, (0, 0))
+        self.overlay.set_alpha(self.alpha)
+        screen.blit(self.overlay, (0, 0))
@@ -0,0 +1,96 @@
+import queue
+import socket
+import time
+
+HOST_PORT = 5000
+CLIENT_PORT = 5001
+SOCKET_TIMEOUT = 0.1
+
+
+def create_udp_socket(host, is_host):
+    """UDP-сокет игрока и адрес второго игрока"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if is_host:
+        sock.bind((host, HOST_PORT))
+        other_address = (host, CLIENT_PORT)
+    else:
+        sock.bind((host, CLIENT_PORT))
+        other_address = (host, HOST_PORT)
+    sock.settimeout(SOCKET_TIMEOUT)
+    return sock, other_address
+
+
+class NullTransport:
+    """Транспорт без сети: отправка ничего не делает, прием всегда пуст.
+
+    Повторяет нужную игре часть интерфейса UDP-сокета (sendto, recvfrom,
+    settimeout, shutdown, close), поэтому подставляется вместо него.
+    """
+
+    def __init__(self, timeout=SOCKET_TIMEOUT):
+        self.timeout = timeout
+        self.closed = False
+        self.sent_packets = 0
+        self.sent_bytes = 0
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def sendto(self, data, address):
+        self.sent_packets += 1
+        self.sent_bytes += len(data)
+        return len(data)
+
+    def recvfrom(self, bufsize):
+        if self.closed:
+            raise OSError("Транспорт закрыт")
+        # Ведем себя как сокет с таймаутом, чтобы поток приема не крутился впустую
+        if self.timeout:
+            time.sleep(self.timeout)
+        raise socket.timeout()
+
+    def shutdown(self, how):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+class LoopbackTransport(NullTransport):
+    """Транспорт в памяти: пакеты сразу попадают во входную очередь пары.
+
+    Пара создается через LoopbackTransport.pair() - так два экземпляра
+    Game обмениваются данными в одном процессе без сокетов.
+    """
+
+    def __init__(self, address, timeout=SOCKET_TIMEOUT):
+        super().__init__(timeout)
+        self.address = address
+        self.inbox = queue.Queue()
+        self.peer = None
+
+    @classmethod
+    def pair(cls, host="127.0.0.1"):
+        host_end = cls((host, HOST_PORT))
+        client_end = cls((host, CLIENT_PORT))
+        host_end.peer = client_end
+        client_end.peer = host_end
+        return host_end, client_end
+
+    def sendto(self, data, address):
+        super().sendto(data, address)
+        if self.peer is not None and not self.peer.closed:
+            self.peer.inbox.put((bytes(data), self.address))
+        return len(data)
+
+    def recvfrom(self, bufsize):
+        if self.closed:
+            raise OSError("Транспорт закрыт")
+        try:
+            if self.timeout:
+                data, address = self.inbox.get(timeout=self.timeout)
+            else:
+                data, address = self.inbox.get_nowait()
+        except queue.Empty:
+            raise socket.timeout()
+        return data[:bufsize], address